@@ -0,0 +1,451 @@
+"""
+Continuous batching for concurrent CodingBot users (opt-in).
+
+Each Streamlit session used to load its own Llama, or queue behind a shared
+one: N users meant N copies of the weights or N answers one after another,
+with aggregate tokens/s flat and latency growing with every user in line.
+BatchScheduler loads the model once and serves every session from one
+llama.cpp context with MAX_CONCURRENCY sequence slots:
+
+- a single decode loop builds one llama_batch per step holding the next token
+  of every running answer plus prompt chunks of newly admitted requests, so a
+  new request joins the in-flight batch at the next token instead of waiting
+  for the running answers to finish (continuous batching);
+- decoding N sequences in one batch costs little more than decoding one (the
+  weights are read once per step), so tokens/s grows with concurrency;
+- waiting requests are queued per user and admitted round-robin, so one user
+  sending five questions cannot hold every slot;
+- KV cache space is reserved per request (prompt + max_tokens) at admission;
+  a request that does not fit waits for a slot to finish.
+
+Metrics: batch_queue_depth, batch_active_sequences, batch_queue_wait,
+batch_request_latency, batch_decode_step and batch_decode_tokens_per_second,
+plus the usual llm_* request metrics under the request's route.
+
+    python batching.py bench --model Qwen2.5-Coder-32B-Instruct-Q4_K_M.gguf --users 1 2 4 8
+"""
+import argparse
+import codecs
+import ctypes
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+import llama_cpp
+from llama_cpp import Llama
+from llama_cpp._internals import LlamaBatch, LlamaContext
+from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+
+from hw_profile import llama_settings
+from telemetry import METRICS
+
+DEFAULT_BATCHING = {
+    "ENABLED": False,
+    "MAX_CONCURRENCY": 4,  # sequence slots decoded together
+    "N_CTX": 32768,        # KV cache shared by all slots; each request reserves prompt + max_tokens
+    "MAX_QUEUE": 32,       # waiting requests across all users; further submits raise SchedulerBusy
+    "SEED": 0,
+}
+
+# Sampling defaults of Llama.create_chat_completion
+TOP_K, TOP_P, MIN_P = 40, 0.95, 0.05
+
+_DONE = object()
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised by BatchScheduler.submit when MAX_QUEUE requests are already waiting."""
+
+
+class BatchRequest:
+    """One submitted chat completion; iterate stream() for its text pieces."""
+
+    def __init__(self, user_id: str, tokens: list, max_tokens: int, temperature: float, route: str):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.route = route
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.generated = 0
+        self.finish_reason = None
+        self.closed = threading.Event()  # set when the consumer stops reading
+        self._out = queue.Queue()
+
+    @property
+    def reserved(self) -> int:
+        return len(self.tokens) + self.max_tokens
+
+    def stream(self):
+        """Yield generated text as it is decoded; closing the generator frees the slot."""
+        try:
+            while True:
+                item = self._out.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self.closed.set()
+
+
+class _Sequence:
+    """Decode state of an admitted request in its slot."""
+
+    def __init__(self, request: BatchRequest, slot: int, sampler):
+        self.request = request
+        self.slot = slot
+        self.sampler = sampler
+        self.pending = list(request.tokens)  # prompt tokens not yet in the KV cache
+        self.n_past = 0
+        self.last_token = None
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+class BatchScheduler:
+    def __init__(self, model_path: str, settings: dict = None):
+        self.settings = {**DEFAULT_BATCHING, **(settings or {})}
+        self.max_concurrency = max(1, int(self.settings["MAX_CONCURRENCY"]))
+        params = llama_settings(model_path)
+        n_ctx = min(int(self.settings["N_CTX"]), params.pop("n_ctx", self.settings["N_CTX"]))
+        self.n_batch = max(int(params.get("n_batch", 512)), self.max_concurrency)
+
+        # The Llama object provides weights, tokenizer and chat template; its own context stays tiny
+        with METRICS.timer("llm_model_load", route="batch_scheduler"):
+            self.llm = Llama(model_path=model_path, n_ctx=512, verbose=False, **params)
+        ctx_params = llama_cpp.llama_context_params.from_buffer_copy(self.llm.context_params)
+        ctx_params.n_ctx = n_ctx
+        ctx_params.n_batch = self.n_batch
+        ctx_params.n_ubatch = min(self.n_batch, int(params.get("n_ubatch", 512)))
+        ctx_params.n_seq_max = self.max_concurrency
+        ctx_params.kv_unified = True  # slots share the cache, a long answer can use what short ones leave
+        self._ctx = LlamaContext(model=self.llm._model, params=ctx_params, verbose=False)
+        self._batch = LlamaBatch(n_tokens=self.n_batch, embd=0, n_seq_max=1, verbose=False)
+        self._memory = llama_cpp.llama_get_memory(self._ctx.ctx)
+        self._vocab = self.llm._model.vocab
+        self.n_ctx = llama_cpp.llama_n_ctx(self._ctx.ctx)
+
+        template = self.llm.metadata.get("tokenizer.chat_template")
+        if not template:
+            raise ValueError(f"{model_path} has no tokenizer.chat_template")
+        eos, bos = self.llm.token_eos(), self.llm.token_bos()
+        self._formatter = Jinja2ChatFormatter(
+            template=template,
+            eos_token=self.llm._model.token_get_text(eos) if eos != -1 else "",
+            bos_token=self.llm._model.token_get_text(bos) if bos != -1 else "",
+            stop_token_ids=[eos],
+        )
+
+        self._cond = threading.Condition()
+        self._waiting = OrderedDict()  # user_id -> deque of BatchRequest, in round-robin order
+        self._active = []
+        self._free_slots = list(range(self.max_concurrency))
+        self._reserved = 0
+        self._seed = itertools.count(int(self.settings["SEED"]))
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    # -----------------------------------------------------------------------
+    # Submission
+    # -----------------------------------------------------------------------
+
+    def tokenize_chat(self, messages: list) -> list:
+        result = self._formatter(messages=messages)
+        return self.llm.tokenize(result.prompt.encode("utf-8"), add_bos=not result.added_special, special=True)
+
+    def submit(self, user_id: str, messages: list, max_tokens: int = 2048, temperature: float = 0.2,
+               route: str = "coding_chat") -> BatchRequest:
+        """Queue a chat completion for `user_id`; read the answer from request.stream()."""
+        tokens = self.tokenize_chat(messages)
+        if len(tokens) >= self.n_ctx:
+            raise ValueError(f"Prompt of {len(tokens)} tokens does not fit the {self.n_ctx}-token context")
+        request = BatchRequest(user_id, tokens, min(int(max_tokens), self.n_ctx - len(tokens)), temperature, route)
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("BatchScheduler is closed")
+            if self.queue_depth >= int(self.settings["MAX_QUEUE"]):
+                METRICS.inc("batch_rejected_total", route=route)
+                raise SchedulerBusy(f"{self.queue_depth} requests already waiting")
+            self._waiting.setdefault(user_id, deque()).append(request)
+            METRICS.set_gauge("batch_queue_depth", self.queue_depth)
+            self._cond.notify()
+        return request
+
+    def generate(self, user_id: str, messages: list, **kwargs):
+        """submit() and stream the answer."""
+        return self.submit(user_id, messages, **kwargs).stream()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+
+    # -----------------------------------------------------------------------
+    # Decode loop
+    # -----------------------------------------------------------------------
+
+    def _next_request(self):
+        """Round-robin over users: take the head of the first user's queue, move that user to the back."""
+        for user_id in list(self._waiting):
+            requests = self._waiting[user_id]
+            while requests and requests[0].closed.is_set():
+                self._finish_unstarted(requests.popleft())
+            if not requests:
+                del self._waiting[user_id]
+                continue
+            if self._reserved + requests[0].reserved > self.n_ctx:
+                return None  # keep arrival fairness: wait for KV space instead of skipping ahead
+            request = requests.popleft()
+            self._waiting.move_to_end(user_id)
+            if not requests:
+                del self._waiting[user_id]
+            return request
+        return None
+
+    def _finish_unstarted(self, request: BatchRequest) -> None:
+        request.finish_reason = "cancelled"
+        request._out.put(_DONE)
+        METRICS.inc("batch_finished_total", reason="cancelled")
+
+    def _admit(self) -> None:
+        while self._free_slots:
+            request = self._next_request()
+            if request is None:
+                break
+            request.started_at = time.perf_counter()
+            self._reserved += request.reserved
+            self._active.append(_Sequence(request, self._free_slots.pop(0), self._sampler(request.temperature)))
+            METRICS.observe("batch_queue_wait", request.started_at - request.submitted_at, route=request.route)
+        METRICS.set_gauge("batch_queue_depth", self.queue_depth)
+        METRICS.set_gauge("batch_active_sequences", len(self._active))
+
+    def _sampler(self, temperature: float):
+        chain = llama_cpp.llama_sampler_chain_init(llama_cpp.llama_sampler_chain_default_params())
+        if temperature <= 0:
+            llama_cpp.llama_sampler_chain_add(chain, llama_cpp.llama_sampler_init_greedy())
+        else:
+            llama_cpp.llama_sampler_chain_add(chain, llama_cpp.llama_sampler_init_top_k(TOP_K))
+            llama_cpp.llama_sampler_chain_add(chain, llama_cpp.llama_sampler_init_top_p(TOP_P, 1))
+            llama_cpp.llama_sampler_chain_add(chain, llama_cpp.llama_sampler_init_min_p(MIN_P, 1))
+            llama_cpp.llama_sampler_chain_add(chain, llama_cpp.llama_sampler_init_temp(temperature))
+            llama_cpp.llama_sampler_chain_add(chain, llama_cpp.llama_sampler_init_dist(next(self._seed)))
+        return chain
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping and not self._active and not self._waiting:
+                    self._cond.wait()
+                if self._stopping:
+                    break
+                self._admit()
+            for seq in [s for s in self._active if s.request.closed.is_set()]:
+                self._release(seq, "cancelled")
+            if self._active:
+                try:
+                    self._step()
+                except Exception as e:
+                    for seq in list(self._active):
+                        self._release(seq, "error", e)
+        for seq in list(self._active):
+            self._release(seq, "cancelled")
+        with self._cond:
+            for requests in self._waiting.values():
+                for request in requests:
+                    self._finish_unstarted(request)
+            self._waiting.clear()
+
+    def _step(self) -> None:
+        """One llama_decode: the next token of every decoding sequence, then prompt chunks."""
+        batch = self._batch.batch
+        batch.n_tokens = 0
+        rows = []
+
+        def add(token: int, pos: int, seq: _Sequence, logits: bool) -> None:
+            i = batch.n_tokens
+            batch.token[i] = token
+            batch.pos[i] = pos
+            batch.n_seq_id[i] = 1
+            batch.seq_id[i][0] = seq.slot
+            batch.logits[i] = logits
+            batch.n_tokens += 1
+            if logits:
+                rows.append((seq, i))
+
+        # Running answers first, so admitting a long prompt never stalls their next token
+        for seq in self._active:
+            if not seq.pending:
+                add(seq.last_token, seq.n_past, seq, True)
+                seq.n_past += 1
+        for seq in self._active:
+            budget = self.n_batch - batch.n_tokens
+            if not seq.pending or budget <= 0:
+                continue
+            chunk, seq.pending = seq.pending[:budget], seq.pending[budget:]
+            for j, token in enumerate(chunk):
+                add(token, seq.n_past + j, seq, not seq.pending and j == len(chunk) - 1)
+            seq.n_past += len(chunk)
+
+        t0 = time.perf_counter()
+        rc = llama_cpp.llama_decode(self._ctx.ctx, batch)
+        if rc != 0:
+            raise RuntimeError(f"llama_decode returned {rc}")
+        seconds = time.perf_counter() - t0
+        METRICS.observe("batch_decode_step", seconds)
+        if seconds > 0 and rows:
+            METRICS.set_gauge("batch_decode_tokens_per_second", len(rows) / seconds)
+
+        for seq, i in rows:
+            token = llama_cpp.llama_sampler_sample(seq.sampler, self._ctx.ctx, i)
+            request = seq.request
+            if llama_cpp.llama_vocab_is_eog(self._vocab, token):
+                self._release(seq, "stop")
+                continue
+            request.generated += 1
+            if request.first_token_at is None:
+                request.first_token_at = time.perf_counter()
+            text = seq.decoder.decode(self._piece(token))
+            if text:
+                request._out.put(text)
+            seq.last_token = token
+            if request.generated >= request.max_tokens:
+                self._release(seq, "length")
+
+    def _piece(self, token: int) -> bytes:
+        buf = ctypes.create_string_buffer(64)
+        n = llama_cpp.llama_token_to_piece(self._vocab, token, buf, len(buf), 0, False)
+        if n < 0:
+            buf = ctypes.create_string_buffer(-n)
+            n = llama_cpp.llama_token_to_piece(self._vocab, token, buf, len(buf), 0, False)
+        return buf.raw[:n]
+
+    def _release(self, seq: _Sequence, reason: str, error: BaseException = None) -> None:
+        """Free the slot and its KV cells, then finish the request."""
+        llama_cpp.llama_memory_seq_rm(self._memory, seq.slot, -1, -1)
+        llama_cpp.llama_sampler_free(seq.sampler)
+        request = seq.request
+        tail = seq.decoder.decode(b"", final=True)
+        if tail:
+            request._out.put(tail)
+        request.finish_reason = reason
+        request.finished_at = time.perf_counter()
+        request._out.put(error if error is not None else _DONE)
+        with self._cond:
+            self._active.remove(seq)
+            self._free_slots.append(seq.slot)
+            self._reserved -= request.reserved
+            METRICS.set_gauge("batch_active_sequences", len(self._active))
+        self._record(request)
+
+    def _record(self, request: BatchRequest) -> None:
+        route = request.route
+        latency = request.finished_at - request.submitted_at
+        METRICS.inc("batch_finished_total", reason=request.finish_reason)
+        METRICS.observe("batch_request_latency", latency, route=route)
+        METRICS.inc("llm_requests_total", route=route)
+        METRICS.inc("llm_prompt_tokens_total", len(request.tokens), route=route)
+        METRICS.inc("llm_generated_tokens_total", request.generated, route=route)
+        METRICS.observe("llm_generation", latency, route=route)
+        if request.first_token_at is not None:
+            # Measured from submission: queueing and prefill are both part of what the user waits for
+            ttft = request.first_token_at - request.submitted_at
+            METRICS.observe("llm_time_to_first_token", ttft, route=route)
+            METRICS.inc("llm_prefill_seconds_total", ttft, route=route)
+            METRICS.inc("llm_decode_seconds_total", request.finished_at - request.first_token_at, route=route)
+            METRICS.inc("llm_decode_tokens_total", request.generated - 1, route=route)
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def bench(model_path: str, users: list, requests_per_user: int = 2, max_tokens: int = 64,
+          settings: dict = None) -> list:
+    """
+    For each concurrency level, submit requests_per_user questions from each
+    of n users at once and measure aggregate tokens/s and latency percentiles.
+    """
+    prompts = [
+        "Write a pandas function computing a rolling Sharpe ratio.",
+        "Explain the difference between VaR and expected shortfall.",
+        "How do I vectorise a loop over numpy arrays?",
+        "Write a Black-Scholes call price function in Python.",
+    ]
+    results = []
+    for n in users:
+        scheduler = BatchScheduler(model_path, {**(settings or {}), "MAX_CONCURRENCY": n,
+                                                "MAX_QUEUE": n * requests_per_user})
+        try:
+            latencies, tokens = [], 0
+            lock = threading.Lock()
+
+            def user(u: int) -> None:
+                nonlocal tokens
+                for r in range(requests_per_user):
+                    messages = [{"role": "user", "content": prompts[(u + r) % len(prompts)]}]
+                    request = scheduler.submit(f"user-{u}", messages, max_tokens=max_tokens, temperature=0)
+                    for _ in request.stream():
+                        pass
+                    with lock:
+                        latencies.append(request.finished_at - request.submitted_at)
+                        tokens += request.generated
+
+            t0 = time.perf_counter()
+            threads = [threading.Thread(target=user, args=(u,)) for u in range(n)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - t0
+        finally:
+            scheduler.close()
+        latencies.sort()
+        row = {
+            "users": n,
+            "requests": len(latencies),
+            "tokens": tokens,
+            "wall_s": round(wall, 3),
+            "tokens_per_s": round(tokens / wall, 2) if wall else 0.0,
+            "p50_s": round(latencies[len(latencies) // 2], 3),
+            "p95_s": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+        }
+        print(f"[INFO] users={n:<3} {row['tokens_per_s']:>8.1f} tok/s  p50 {row['p50_s']:.2f}s  "
+              f"p95 {row['p95_s']:.2f}s  ({row['requests']} requests, {row['tokens']} tokens)")
+        results.append(row)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark continuous batching at several concurrency levels")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="Aggregate tokens/s and latency per number of concurrent users")
+    p_bench.add_argument("--model", required=True, help="GGUF model file")
+    p_bench.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8])
+    p_bench.add_argument("--requests-per-user", type=int, default=2)
+    p_bench.add_argument("--max-tokens", type=int, default=64)
+    p_bench.add_argument("--n-ctx", type=int, default=DEFAULT_BATCHING["N_CTX"])
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"[ERROR] Model not found: {os.path.abspath(args.model)}")
+        return 1
+    bench(args.model, args.users, args.requests_per_user, args.max_tokens, {"N_CTX": args.n_ctx})
+    print("[OK] Benchmark finished")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,39 @@
+"""
+Cooperative cancellation for streamed llama.cpp completions.
+
+create_chat_completion(stream=True) decodes one token per iteration, so a
+completion stops as soon as its iterator is closed. cancellable() wraps the
+stream and checks a threading.Event before handing out each decoded chunk:
+once the event is set (a Stop button, a closed session, a shutdown) the
+stream is closed and the model is free for the next request.
+
+Tokens decoded so far stay in the model's KV cache. The bots keep the
+partial answer in their history, so the next prompt starts with exactly
+those tokens and llama.cpp reuses the cached prefix instead of re-evaluating
+the conversation.
+"""
+import threading
+
+from telemetry import METRICS
+
+
+class GenerationCancelled(RuntimeError):
+    """Raised by cancellable(raise_on_cancel=True) when the cancel event was set."""
+
+
+def cancellable(stream, cancel: threading.Event, route: str, raise_on_cancel: bool = False):
+    """
+    Yield chunks from `stream` until `cancel` is set (checked between decoded
+    tokens), then close it. With raise_on_cancel the caller gets
+    GenerationCancelled instead of a quietly shortened stream.
+    """
+    try:
+        for chunk in stream:
+            if cancel.is_set():
+                METRICS.inc("llm_cancelled_total", route=route)
+                if raise_on_cancel:
+                    raise GenerationCancelled(f"{route} generation cancelled")
+                return
+            yield chunk
+    finally:
+        stream.close()
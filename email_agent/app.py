@@ -12,6 +12,9 @@ import streamlit as st
 
 from main import load_config, download_google_sheet_to_xlsx, ReportGenerator, get_creds
 from send_emails import send_emails_to_leads, verify_email_status, get_email_content, format_email_content
+from lead_loader import load_leads
+from export_service import FORMATS, ensure_snapshot, export
+from lead_history import LeadHistory, history_settings
 
 
 def load_email_config(config_file: str = "config.json") -> dict:
@@ -21,8 +24,8 @@ def load_email_config(config_file: str = "config.json") -> dict:
     return config
 
 
-def get_leads_dataframe(date_str: str = None) -> pd.DataFrame:
-    """Download and load leads from sheet."""
+def get_leads_dataframe(date_str: str = None, consumer: str = "all") -> pd.DataFrame:
+    """Download and load leads from sheet (only `consumer`'s columns, see lead_loader)."""
     if date_str is None:
         date_str = datetime.now().strftime("%d%m%Y")
     
@@ -31,8 +34,8 @@ def get_leads_dataframe(date_str: str = None) -> pd.DataFrame:
     output_prefix = config.get("OUTPUT_PREFIX", "leads_")
     xlsx_path = output_dir / f"{output_prefix}{date_str}.xlsx"
     
-    download_google_sheet_to_xlsx(config["SPREADSHEET_ID"], xlsx_path)
-    df = pd.read_excel(xlsx_path)
+    download_google_sheet_to_xlsx(config["SPREADSHEET_ID"], xlsx_path, campaign_config=config)
+    df = load_leads(xlsx_path, config, consumer=consumer)
     return df, xlsx_path
 
 
@@ -43,7 +46,7 @@ def display_leads_table():
     date_str = datetime.now().strftime("%d%m%Y")
     
     try:
-        df, _ = get_leads_dataframe(date_str)
+        df, _ = get_leads_dataframe(date_str, consumer="dashboard")
         config = load_config()
         
         # Get column names
@@ -123,7 +126,8 @@ def verify_status():
                 with col2:
                     st.metric("Delivered", result['delivered'])
                 with col3:
-                    st.metric("Bounced", result['bounced'])
+                    st.metric("Bounced", result['bounced'], delta=f"{result['new_bounces']} new from Gmail",
+                              delta_color="off")
                 
                 if result['bounce_details']:
                     st.subheader("Bounce Details")
@@ -208,39 +212,121 @@ def generate_report():
 
 
 def download_data():
-    """Download the leads data."""
+    """Download the leads data (built on request from the local snapshot, see export_service)."""
     st.header("⬇️ Download Data")
     
     date_str = datetime.now().strftime("%d%m%Y")
+    config = load_config()
     
     try:
-        df, xlsx_path = get_leads_dataframe(date_str)
+        refresh = st.button("Refresh from Google Sheets", key="refresh_snapshot_btn")
+        xlsx_path, meta = ensure_snapshot(config, date_str, refresh=refresh)
+        st.caption(f"Snapshot {xlsx_path.name}, pulled {meta['downloaded_at']} "
+                   f"(revision {meta['content_hash'][:12]})")
         
-        # Convert to CSV
-        csv = df.to_csv(index=False)
+        labels = {"CSV": "csv", "Parquet": "parquet", "Excel": "xlsx"}
+        choice = st.radio("Format", list(labels), horizontal=True)
+        fmt = labels[choice]
         
-        col1, col2 = st.columns(2)
+        # Nothing is built until asked for; a finished export is reused until the sheet changes
+        prepared = st.session_state.get("export")
+        if st.button(f"Prepare {choice}", key="prepare_export_btn"):
+            with st.spinner(f"Building {choice} export..."):
+                prepared = {"fmt": fmt, "path": str(export(xlsx_path, fmt, meta, config)),
+                            "revision": meta["content_hash"]}
+            st.session_state["export"] = prepared
+        
+        if prepared and prepared["fmt"] == fmt and prepared["revision"] == meta["content_hash"]:
+            path = Path(prepared["path"])
+            with open(path, "rb") as f:
+                st.download_button(
+                    label=f"Download as {choice} ({path.stat().st_size / 1e6:.1f} MB)",
+                    data=f,
+                    file_name=f"leads_{date_str}.{fmt}",
+                    mime=FORMATS[fmt]
+                )
+        
+    except Exception as e:
+        st.error(f"Error downloading data: {e}")
+
+
+@st.cache_resource
+def get_lead_history(db_file: str) -> LeadHistory:
+    """One connection to the history DB per dashboard process."""
+    return LeadHistory(db_file)
+
+
+def lead_history_page():
+    """Bounce history across every daily snapshot and report (see lead_history.py)."""
+    st.header("📈 Lead History")
+    
+    config = load_config()
+    settings = history_settings(config)
+    if not settings["ENABLED"]:
+        st.info("LEAD_HISTORY is disabled in config.json")
+        return
+    
+    try:
+        history = get_lead_history(settings["DB_FILE"])
+        
+        if st.button("Ingest new snapshots and reports", key="history_ingest_btn"):
+            with st.spinner("Reading new and changed files..."):
+                counts = history.ingest(config)
+            st.success(f"✓ {counts['sheet']} sheets, {counts['bounce_log']} bounce logs, "
+                       f"{counts['report']} reports ({counts['rows']} rows)")
         
+        summary = history.summary()
+        if not summary["sends"]:
+            st.info("No history yet - ingest the snapshots first")
+            return
+        st.caption(f"{summary['sends']} sends from {summary['first_day']} to {summary['last_day']}")
+        
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.download_button(
-                label="Download as CSV",
-                data=csv,
-                file_name=f"leads_{date_str}.csv",
-                mime="text/csv"
-            )
+            days = st.selectbox("Window", [7, 30, 90, 180, 365], index=2, format_func=lambda d: f"Last {d} days")
+        with col2:
+            company = st.selectbox("Company", ["All"] + history.companies())
+        with col3:
+            bounce_code = st.text_input("Bounce code", placeholder='5.1.1, or a prefix like "5.1."')
+        company = None if company == "All" else company
+        bounce_code = bounce_code.strip() or None
         
+        trend = history.trend(days, company, bounce_code)
+        total_sends, total_bounces = int(trend["sends"].sum()), int(trend["bounces"].sum())
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Sends", total_sends)
         with col2:
-            # Excel download
-            excel_bytes = pd.ExcelFile(xlsx_path).book
-            st.download_button(
-                label="Download as Excel",
-                data=open(xlsx_path, "rb").read(),
-                file_name=f"leads_{date_str}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            st.metric("Bounces", total_bounces)
+        with col3:
+            st.metric("Bounce Rate", f"{total_bounces / total_sends:.1%}" if total_sends else "-")
+        
+        st.subheader("Daily Bounces")
+        st.line_chart(trend.set_index("day")[["sends", "bounces"]])
         
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("By Company")
+            by_company = history.bounce_counts(days, company, bounce_code, by="company")
+            st.dataframe(by_company.sort_values("bounces", ascending=False), width='stretch', hide_index=True)
+        with col2:
+            st.subheader("By Bounce Code")
+            by_code = history.bounce_counts(days, company, bounce_code, by="bounce_code")
+            st.dataframe(by_code[by_code["bounces"] > 0], width='stretch', hide_index=True)
+        
+        st.subheader("Lead Lookup")
+        email = st.text_input("Email", key="history_email")
+        if email:
+            sends, entries = history.lead(email)
+            if sends.empty and entries.empty:
+                st.info(f"No history for {email}")
+            else:
+                st.dataframe(sends, width='stretch', hide_index=True)
+                if not entries.empty:
+                    st.dataframe(entries, width='stretch', hide_index=True)
+    
     except Exception as e:
-        st.error(f"Error downloading data: {e}")
+        st.error(f"Error loading lead history: {e}")
 
 
 def main():
@@ -258,7 +344,7 @@ def main():
         
         page = st.radio(
             "Navigation",
-            ["Dashboard", "Send Emails", "Verify Status", "Generate Report", "Download Data"]
+            ["Dashboard", "Send Emails", "Verify Status", "Generate Report", "Download Data", "History"]
         )
         
         st.markdown("---")
@@ -284,6 +370,8 @@ def main():
         generate_report()
     elif page == "Download Data":
         download_data()
+    elif page == "History":
+        lead_history_page()
     
     # Footer
     st.markdown("---")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+N campaigns as N separate processes (one config.json each, the old way)
+against N campaigns in one process (CAMPAIGNS + campaigns.run_campaigns).
+
+Each case runs the send and report stages for every campaign against the
+fakes (no Google APIs, no GGUF model) and records wall time, model loads and
+peak RSS. The stub model sleeps --load-s on construction, so the saving from
+sharing one model shows up next to the overlap of pulls/sends.
+
+Usage (from email_agent/):
+    python benchmarks/bench_campaigns.py --campaigns 1 2 4 --leads 200
+    python benchmarks/bench_campaigns.py --campaigns 4 --load-s 20 --gmail-latency-ms 80
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from queue import Empty
+from unittest import mock
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(AGENT_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from run_pipeline import _prepare_workdir  # noqa: E402
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_child(campaign_ids: list, params: dict, out_queue) -> None:
+    """Child process: send + report for campaign_ids (one campaign = the old single-sheet config)."""
+    from fakes import FakeGmailService, FakeSheetsService, make_fake_llama, make_lead_rows
+
+    date_str = datetime.now().strftime("%d%m%Y")
+    workdir = Path(tempfile.mkdtemp(prefix="email_agent_campaign_bench_"))
+    try:
+        _prepare_workdir(workdir, date_str, gmail_pull=False)
+        config = json.loads((workdir / "config.json").read_text(encoding="utf-8"))
+        if len(campaign_ids) > 1:
+            config["CAMPAIGNS"] = [{"CAMPAIGN_ID": c, "SPREADSHEET_ID": f"sheet-{c}"} for c in campaign_ids]
+            config["EMAIL_CONFIG"]["PIPELINE_WORKERS"] = len(campaign_ids)
+        (workdir / "config.json").write_text(json.dumps(config, indent=2), encoding="utf-8")
+        os.chdir(workdir)
+
+        import main
+        import send_emails
+        import bounce_ingest
+        import bounce_clustering
+        from campaigns import run_campaigns
+
+        rows = make_lead_rows(params["leads"], bounce_rate=params["bounce_rate"], seed=params["seed"])
+        sheets = FakeSheetsService({"Sheet1": rows}, latency_s=params["sheets_latency_ms"] / 1000)
+        gmail = FakeGmailService(latency_s=params["gmail_latency_ms"] / 1000, seed=params["seed"])
+        base_llama = make_fake_llama(params["tokens_per_sec"], params["completion_tokens"])
+
+        class SlowLoadLlama(base_llama):
+            def __init__(self, *args, **kwargs):
+                time.sleep(params["load_s"])
+                super().__init__(*args, **kwargs)
+
+        def fake_service(api, version, scopes):
+            return sheets if api == "sheets" else gmail
+
+        stages = {}
+        with contextlib.redirect_stdout(open(os.devnull, "w")), \
+                mock.patch.object(main, "google_service", fake_service), \
+                mock.patch.object(send_emails, "google_service", fake_service), \
+                mock.patch.object(bounce_ingest, "google_service", fake_service), \
+                mock.patch.object(main, "Llama", SlowLoadLlama), \
+                mock.patch.object(bounce_clustering, "Llama", SlowLoadLlama):
+            for stage in ("send", "report"):
+                t0 = time.perf_counter()
+                results = run_campaigns(stage, date_str)
+                stages[stage] = round(time.perf_counter() - t0, 4)
+                errors = {c: r["error"] for c, r in results.items() if isinstance(r, dict) and r.get("error")}
+                if errors:
+                    raise RuntimeError(f"{stage} failed: {errors}")
+
+        out_queue.put({
+            "stages": stages,
+            "model_loads": SlowLoadLlama.instances,
+            "summaries": SlowLoadLlama.completions,
+            "sent": gmail.sent,
+            "peak_rss_mb": _peak_rss_mb(),
+        })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_processes(groups: list, params: dict) -> list:
+    """Start one child per group at once and wait for all of them."""
+    ctx = mp.get_context("spawn")
+    children = []
+    for ids in groups:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_child, args=(ids, params, queue))
+        proc.start()
+        children.append((proc, queue))
+
+    results = []
+    for proc, queue in children:
+        while True:
+            try:
+                results.append(queue.get(timeout=1.0))
+                break
+            except Empty:
+                if not proc.is_alive():
+                    raise RuntimeError(f"Campaign benchmark child exited with code {proc.exitcode}")
+        proc.join()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Multi-campaign runtime benchmark")
+    parser.add_argument("--campaigns", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--leads", type=int, default=200, help="Leads per campaign sheet")
+    parser.add_argument("--bounce-rate", type=float, default=0.05)
+    parser.add_argument("--load-s", type=float, default=5.0, help="Stub model load time")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0, help="Stub Llama decode speed")
+    parser.add_argument("--completion-tokens", type=int, default=48)
+    parser.add_argument("--gmail-latency-ms", type=float, default=20.0)
+    parser.add_argument("--sheets-latency-ms", type=float, default=200.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    params = {
+        "leads": args.leads, "bounce_rate": args.bounce_rate, "load_s": args.load_s,
+        "tokens_per_sec": args.tokens_per_sec, "completion_tokens": args.completion_tokens,
+        "gmail_latency_ms": args.gmail_latency_ms, "sheets_latency_ms": args.sheets_latency_ms,
+        "seed": args.seed,
+    }
+
+    runs = []
+    for n in args.campaigns:
+        ids = [f"c{i}" for i in range(n)]
+        for mode, groups in (("processes", [[c] for c in ids]), ("shared", [ids])):
+            t0 = time.perf_counter()
+            children = _run_processes(groups, params)
+            wall = time.perf_counter() - t0
+            run = {
+                "campaigns": n,
+                "mode": mode,
+                "wall_s": round(wall, 3),
+                "model_loads": sum(c["model_loads"] for c in children),
+                "summaries": sum(c["summaries"] for c in children),
+                "sent": sum(c["sent"] for c in children),
+                "peak_rss_mb": round(sum(c["peak_rss_mb"] for c in children), 1),
+                "stages": [c["stages"] for c in children],
+            }
+            runs.append(run)
+            print(f"[OK] {n} campaigns {mode:<9} {run['wall_s']:>8.2f}s  model loads {run['model_loads']}  "
+                  f"summaries {run['summaries']}  RSS {run['peak_rss_mb']} MB")
+
+    results = {
+        "benchmark": "campaigns",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": {"node": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "params": params,
+        "runs": runs,
+    }
+    output = args.output or BENCH_DIR / "results" / f"campaigns_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"[OK] Results written: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
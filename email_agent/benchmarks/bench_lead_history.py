@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Bounce questions over many daily snapshots: scanning every leads_DDMMYYYY.xlsx
+with load_leads (the old way) against the lead_history SQLite store.
+
+Writes --days daily snapshots of --rows sends each; every snapshot also
+carries the previous day's sends, as the real sheet keeps older rows, so the
+store has to merge repeats. Records the cold ingest, a no-op re-ingest and
+the wall time of each query through both paths.
+
+Usage (from email_agent/):
+    python benchmarks/bench_lead_history.py --days 90 --rows 2000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(AGENT_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from run_pipeline import _prepare_workdir  # noqa: E402
+
+
+def _write_snapshots(output_dir: Path, days: int, rows: int, seed: int) -> None:
+    from openpyxl import Workbook
+    from fakes import COMPANIES, LEAD_HEADER, _lead_row
+    import pytz
+
+    now = datetime.now(pytz.timezone("Asia/Kolkata"))
+    by_day = []
+    for day in range(days):
+        rng = random.Random(seed * 100003 + day)
+        sent_on = now - timedelta(days=days - 1 - day)
+        day_rows = []
+        for i in range(rows):
+            row = _lead_row(day * rows + i, rng, sent_on, bounce_rate=0.05)
+            row[3] = COMPANIES[rng.randrange(len(COMPANIES))]
+            day_rows.append(row)
+        by_day.append(day_rows)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        ws.append(LEAD_HEADER)
+        for row in (by_day[day - 1] if day else []) + day_rows:
+            ws.append(row)
+        wb.save(output_dir / f"leads_{sent_on:%d%m%Y}.xlsx")
+
+
+def _scan(config: dict, output_dir: Path, days: int, company: str, code: str) -> int:
+    """The old way: open every snapshot, keep each send once, count the matching bounces."""
+    import pandas as pd
+    from lead_loader import TIMEZONE, load_leads
+
+    since = (pd.Timestamp.now(tz=TIMEZONE).normalize() - pd.Timedelta(days=days - 1))
+    frames = [load_leads(p, config, consumer="history") for p in sorted(output_dir.glob("leads_*.xlsx"))]
+    df = pd.concat(frames).drop_duplicates(["email", "sent_at"], keep="last")
+    hits = (df["sent_at"] >= since) & (df["company"] == company) & (df["bounce_code"] == code)
+    return int(hits.sum())
+
+
+def _timed(fn, repeat: int) -> tuple:
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(times), 2), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Lead history store benchmark")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--rows", type=int, default=2000, help="New sends per daily snapshot")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per store query (median reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="email_agent_history_bench_") as tmp:
+        workdir = Path(tmp)
+        _prepare_workdir(workdir, datetime.now().strftime("%d%m%Y"), gmail_pull=False)
+        output_dir = workdir / "leads_agent_excel_files"
+        output_dir.mkdir()
+        t0 = time.perf_counter()
+        _write_snapshots(output_dir, args.days, args.rows, args.seed)
+        print(f"[INFO] Wrote {args.days} snapshots of {2 * args.rows} rows in {time.perf_counter() - t0:.1f}s")
+
+        os.chdir(workdir)
+        from lead_history import LeadHistory
+
+        config = json.loads((workdir / "config.json").read_text(encoding="utf-8"))
+        history = LeadHistory.from_config(config)
+        t0 = time.perf_counter()
+        ingested = history.ingest(config)
+        cold_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        history.ingest(config)
+        warm_s = time.perf_counter() - t0
+        print(f"[OK] Ingest {cold_s:.1f}s ({ingested['rows']} rows), re-ingest {warm_s * 1000:.0f} ms")
+
+        email = history.query("SELECT email FROM sends LIMIT 1")["email"][0]
+        queries = {
+            "bounces_30d_company_code": lambda: int(history.bounce_counts(30, "ACME", "5.1.1")["bounces"][0]),
+            "bounces_90d_by_company": lambda: len(history.bounce_counts(90, by="company")),
+            "trend_90d": lambda: len(history.trend(90)),
+            "trend_90d_code_prefix": lambda: len(history.trend(90, bounce_code="5.")),
+            "lead_lookup": lambda: len(history.lead(email)[0]),
+        }
+        runs = []
+        for name, fn in queries.items():
+            ms, result = _timed(fn, args.repeat)
+            runs.append({"case": name, "path": "store", "ms": ms, "result": result})
+            print(f"[OK] {name:<26} {ms:>9.2f} ms  -> {result}")
+        ms, result = _timed(lambda: _scan(config, output_dir, 30, "ACME", "5.1.1"), 1)
+        runs.append({"case": "bounces_30d_company_code", "path": "scan", "ms": ms, "result": result})
+        print(f"[OK] {'scan all snapshots':<26} {ms:>9.2f} ms  -> {result}")
+        db_mb = Path(config.get("LEAD_HISTORY", {}).get("DB_FILE", "leads_agent_excel_files/lead_history.sqlite")).stat().st_size / 1e6
+        history.close()
+        os.chdir(AGENT_DIR)
+
+    results = {
+        "benchmark": "lead_history",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": {"node": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "params": {"days": args.days, "rows": args.rows, "repeat": args.repeat, "seed": args.seed},
+        "ingest": {"cold_s": round(cold_s, 2), "warm_ms": round(warm_s * 1000, 1), "rows": ingested["rows"],
+                   "db_mb": round(db_mb, 1)},
+        "runs": runs,
+    }
+    output = args.output or BENCH_DIR / "results" / f"lead_history_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"[OK] Results written: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
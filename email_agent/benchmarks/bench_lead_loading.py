@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Memory and time of loading a lead sheet: pd.read_excel (the old path) against
+lead_loader.load_leads for each consumer projection.
+
+Every case runs in a fresh process so peak RSS is not shared between them.
+
+Usage (from email_agent/):
+    python benchmarks/bench_lead_loading.py --rows 500000
+    python benchmarks/bench_lead_loading.py --rows 100000 --consumers send report
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(AGENT_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _write_sheet(path: Path, rows: int, seed: int) -> None:
+    from openpyxl import Workbook
+    from fakes import make_lead_rows
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    for row in make_lead_rows(rows, bounce_rate=0.02, seed=seed):
+        ws.append(row)
+    wb.save(path)
+
+
+def _run_case(case: str, xlsx_path: str, out_queue) -> None:
+    """Child process: load once and report wall time, peak RSS and frame size."""
+    import pandas as pd
+    from lead_loader import load_leads
+
+    before = _rss_mb()
+    t0 = time.perf_counter()
+    if case == "read_excel":
+        df = pd.read_excel(xlsx_path)
+        df["sent_at"] = pd.to_datetime(df["sent_at"], errors="coerce", utc=True)
+        df["verified_at"] = pd.to_datetime(df["verified_at"], errors="coerce", utc=True)
+    else:
+        df = load_leads(Path(xlsx_path), {}, consumer=case)
+    wall = time.perf_counter() - t0
+    out_queue.put({
+        "case": case,
+        "wall_s": round(wall, 3),
+        "peak_rss_mb": round(_rss_mb(), 1),
+        "load_rss_mb": round(_rss_mb() - before, 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / (1024 * 1024), 1),
+        "columns": len(df.columns),
+        "rows": len(df),
+    })
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Lead sheet loading memory benchmark")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--consumers", nargs="+", default=["send", "verify", "report", "all"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="email_agent_load_bench_") as tmp:
+        xlsx_path = Path(tmp) / "leads.xlsx"
+        t0 = time.perf_counter()
+        _write_sheet(xlsx_path, args.rows, args.seed)
+        print(f"[INFO] Wrote {args.rows} rows ({xlsx_path.stat().st_size / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f}s")
+
+        for case in ["read_excel"] + args.consumers:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_case, args=(case, str(xlsx_path), queue))
+            proc.start()
+            run = queue.get()
+            proc.join()
+            runs.append(run)
+            print(f"[OK] {case:<10} {run['wall_s']:>7.2f}s  peak RSS {run['peak_rss_mb']:>7.1f} MB  "
+                  f"(+{run['load_rss_mb']:.1f} MB)  frame {run['frame_mb']:>6.1f} MB  {run['columns']} cols")
+
+    results = {
+        "benchmark": "lead_loading",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": {"node": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "params": {"rows": args.rows, "seed": args.seed},
+        "runs": runs,
+    }
+    output = args.output or BENCH_DIR / "results" / f"lead_loading_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"[OK] Results written: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
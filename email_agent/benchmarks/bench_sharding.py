@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Report throughput against the number of shard workers (REPORT_SHARDS.WORKERS).
+
+Summarises the same set of failed leads with K = 1, 2, 4, ... worker processes
+and records wall time, leads/s and generated tokens/s per K. With --model the
+real GGUF is used (the meaningful run on a many-core box); without it a stub
+Llama at --tokens-per-sec measures the sharding overhead only.
+
+Usage (from email_agent/):
+    python benchmarks/bench_sharding.py --model ../Qwen2.5-Coder-32B-Instruct-Q4_K_M.gguf --workers 1 2 4 8 --leads 64
+    python benchmarks/bench_sharding.py --workers 1 2 4 --pin numa
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(AGENT_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from run_pipeline import _prepare_workdir  # noqa: E402
+
+
+def _install_fake_llama(tokens_per_sec: float, completion_tokens: int) -> None:
+    """worker_setup hook: swap llama_cpp.Llama for the stub in a shard worker (main and bounce_clustering)."""
+    import bounce_clustering
+    import main
+    from fakes import make_fake_llama
+    main.Llama = bounce_clustering.Llama = make_fake_llama(tokens_per_sec, completion_tokens)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report sharding throughput benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--leads", type=int, default=32, help="Failed leads to summarise per run")
+    parser.add_argument("--model", type=Path, default=None, help="Real GGUF; omit to use the stub Llama")
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--pin", choices=["cores", "numa", "none"], default="cores")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="Stub Llama decode speed")
+    parser.add_argument("--completion-tokens", type=int, default=48, help="Tokens per stub summary")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    date_str = datetime.now().strftime("%d%m%Y")
+    workdir = Path(tempfile.mkdtemp(prefix="email_agent_shard_bench_"))
+    model_path = str(args.model.resolve()) if args.model else str(workdir / "model.gguf")
+    worker_setup = None if args.model else functools.partial(
+        _install_fake_llama, args.tokens_per_sec, args.completion_tokens)
+
+    runs = []
+    try:
+        _prepare_workdir(workdir, date_str, gmail_pull=False)
+        os.chdir(workdir)
+
+        import pandas as pd
+        import main
+        from fakes import make_lead_rows
+        from report_sharding import summarize_sharded
+
+        rows = make_lead_rows(args.leads, bounce_rate=1.0, seed=args.seed)
+        filtered = pd.DataFrame(rows[1:], columns=rows[0])
+
+        for k in args.workers:
+            main.METRICS.reset()
+            shards = {"WORKERS": k, "THREADS_PER_WORKER": args.threads_per_worker, "PIN": args.pin}
+            t0 = time.perf_counter()
+            summaries = summarize_sharded(filtered, model_path, shards=shards, worker_setup=worker_setup)
+            wall = time.perf_counter() - t0
+            generated = main.METRICS.counter_total("llm_generated_tokens_total")
+            run = {
+                "workers": k,
+                "leads": len(summaries),
+                "wall_s": round(wall, 4),
+                "leads_per_s": round(len(summaries) / wall, 3),
+                "generated_tokens_per_s": round(generated / wall, 2),
+                "model_load_s": main.METRICS.summary()["timers"].get("llm_model_load", {}),
+            }
+            runs.append(run)
+            print(f"[OK] K={k:<3} {run['wall_s']:>8.2f}s  {run['leads_per_s']:>8.3f} leads/s  "
+                  f"{run['generated_tokens_per_s']:>9.2f} tok/s")
+    finally:
+        os.chdir(AGENT_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = runs[0]["leads_per_s"] if runs else 0
+    for run in runs:
+        run["speedup"] = round(run["leads_per_s"] / base, 2) if base else 0.0
+
+    results = {
+        "benchmark": "report_sharding",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": {"node": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "params": {"leads": args.leads, "model": str(args.model) if args.model else "stub",
+                   "pin": args.pin, "threads_per_worker": args.threads_per_worker,
+                   "tokens_per_sec": args.tokens_per_sec, "completion_tokens": args.completion_tokens},
+        "runs": runs,
+    }
+    output = args.output or BENCH_DIR / "results" / f"sharding_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"[OK] Results written: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
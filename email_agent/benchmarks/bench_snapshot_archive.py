@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Disk use of --days daily snapshots of a slowly changing sheet: one full
+leads_DDMMYYYY.xlsx per day (the old way) against SNAPSHOT_ARCHIVE.
+
+Each day the fake sheet changes a little (--edit-rate of the rows get a
+bounce code, --new-rows leads are appended) and goes through the real
+download path (main.download_google_sheet_to_xlsx), which archives it and
+evicts older xlsx. Records the bytes of both layouts, the archive time per
+download, and the time to materialise the oldest and newest day again,
+checking that every day comes back identical to what was downloaded.
+
+Usage (from email_agent/):
+    python benchmarks/bench_snapshot_archive.py --days 30 --rows 20000
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(AGENT_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from run_pipeline import _prepare_workdir  # noqa: E402
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _first_tab(path: Path) -> list:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return [tuple(v for v in row) for row in wb.worksheets[0].iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Snapshot archive disk/time benchmark")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--edit-rate", type=float, default=0.01, help="Rows changed per day")
+    parser.add_argument("--new-rows", type=int, default=200, help="Rows appended per day")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    from fakes import BOUNCES, FakeSheetsService, make_lead_rows
+
+    rng = random.Random(args.seed)
+    rows = make_lead_rows(args.rows, bounce_rate=0.02, seed=args.seed)
+    today = datetime.now()
+    with tempfile.TemporaryDirectory(prefix="email_agent_archive_bench_") as tmp:
+        workdir = Path(tmp)
+        _prepare_workdir(workdir, today.strftime("%d%m%Y"), gmail_pull=False,
+                         overrides={"SNAPSHOT_ARCHIVE": {"ENABLED": True}})
+        os.chdir(workdir)
+        import main
+        from snapshot_archive import SnapshotArchive, snapshot_path
+
+        plain_dir = workdir / "plain"
+        plain_dir.mkdir()
+        sheets = FakeSheetsService({"Sheet1": rows})
+        archive_s, stems = [], []
+        with contextlib.redirect_stdout(open(os.devnull, "w")), \
+                mock.patch.object(main, "google_service", lambda api, version, scopes: sheets):
+            for day in range(args.days):
+                if day:
+                    for i in rng.sample(range(1, len(rows)), int(len(rows) * args.edit_rate)):
+                        code, reason = BOUNCES[rng.randrange(len(BOUNCES))]
+                        rows[i] = (list(rows[i]) + [""] * 10)[:10]
+                        rows[i][4], rows[i][7], rows[i][8] = "FAILED", code, reason.format(email=rows[i][1])
+                    rows += make_lead_rows(args.new_rows, seed=args.seed * 1000 + day)[1:]
+                stem = f"{main.OUTPUT_PREFIX}{today - timedelta(days=args.days - 1 - day):%d%m%Y}"
+                xlsx_path = main.OUTPUT_DIR / f"{stem}.xlsx"
+                main.METRICS.reset()
+                main.download_google_sheet_to_xlsx(main.SPREADSHEET_ID, xlsx_path)
+                archive_s.append(main.METRICS.summary()["timers"]["snapshot_archive"]["all"]["total_s"])
+                shutil.copy(xlsx_path, plain_dir / xlsx_path.name)
+                stems.append(stem)
+
+        config = main.config
+        archive = SnapshotArchive.for_output_dir(main.OUTPUT_DIR, config)
+        plain_bytes = _dir_bytes(plain_dir)
+        archive_bytes = _dir_bytes(archive.root)
+        kept_bytes = sum(p.stat().st_size for p in main.OUTPUT_DIR.glob("*.xlsx"))
+
+        materialise_s = {}
+        for label, stem in (("oldest", stems[0]), ("newest", stems[-1])):
+            (main.OUTPUT_DIR / f"{stem}.xlsx").unlink(missing_ok=True)
+            t0 = time.perf_counter()
+            snapshot_path(main.OUTPUT_DIR, stem, config)
+            materialise_s[label] = round(time.perf_counter() - t0, 2)
+        identical = all(_first_tab(snapshot_path(main.OUTPUT_DIR, stem, config)) == _first_tab(plain_dir / f"{stem}.xlsx")
+                        for stem in stems)
+        versions = archive.stats()
+        os.chdir(AGENT_DIR)
+
+    print(f"[OK] {args.days} days x {args.rows}+ rows: xlsx {plain_bytes / 1e6:.1f} MB, "
+          f"archive {archive_bytes / 1e6:.1f} MB + kept xlsx {kept_bytes / 1e6:.1f} MB")
+    print(f"[OK] Archive per download: median {sorted(archive_s)[len(archive_s) // 2]:.2f}s; "
+          f"materialise oldest {materialise_s['oldest']}s, newest {materialise_s['newest']}s; "
+          f"identical: {identical}")
+    results = {
+        "benchmark": "snapshot_archive",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": {"node": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "params": {"days": args.days, "rows": args.rows, "edit_rate": args.edit_rate, "new_rows": args.new_rows,
+                   "seed": args.seed},
+        "plain_bytes": plain_bytes,
+        "archive_bytes": archive_bytes,
+        "kept_xlsx_bytes": kept_bytes,
+        "archive_s": [round(s, 3) for s in archive_s],
+        "materialise_s": materialise_s,
+        "identical": identical,
+        "versions": versions,
+    }
+    output = args.output or BENCH_DIR / "results" / f"snapshot_archive_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"[OK] Results written: {output}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,395 @@
+"""
+Local stand-ins for the Google Sheets / Gmail services and llama_cpp.Llama.
+
+They mimic just enough of the googleapiclient resource API
+(service.spreadsheets().values().get(...).execute(), ...) and of
+Llama.create_chat_completion(stream=True) for the pipeline code to run
+unchanged against them.
+"""
+import base64
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from email import message_from_bytes
+
+import httplib2
+import pytz
+from googleapiclient.errors import HttpError
+
+LEAD_HEADER = [
+    "lead_id", "email", "first_name", "company", "status", "sent_at",
+    "gmail_msg_id", "bounce_code", "bounce_reason", "verified_at",
+]
+
+# Several wordings per cause, some naming the recipient ({email}), as real MTAs do
+BOUNCES = [
+    ("5.1.1", "550 5.1.1 The email account that you tried to reach does not exist."),
+    ("5.1.1", "550 5.1.1 <{email}>: Recipient address rejected: User unknown in virtual mailbox table"),
+    ("5.2.2", "552 5.2.2 The recipient's inbox is out of storage space and inactive."),
+    ("5.2.2", "552 5.2.2 Mailbox full: quota exceeded for {email}"),
+    ("5.4.1", "550 5.4.1 Recipient address rejected: Access denied."),
+    ("5.7.1", "550 5.7.1 Message rejected due to local policy."),
+    ("5.7.1", "550 5.7.1 Message rejected as spam by content filtering policy."),
+]
+
+FIRST_NAMES = ["Alice", "Bob", "Chloe", "David", "Eva", "Frank", "Grace", "Henry", "Ivy", "Jack"]
+COMPANIES = ["ACME", "GLOBEX", "TECHCORP", "STARTUPX", "GLOBALINK", "INNOVA", "ZENTITH", "NEXGEN"]
+
+
+def _lead_row(i: int, rng: random.Random, now: datetime, bounce_rate: float) -> list:
+    sent_at = now - timedelta(minutes=rng.randint(30, 23 * 60))
+    verified_at = sent_at + timedelta(minutes=15)
+    first_name = FIRST_NAMES[i % len(FIRST_NAMES)]
+    row = [
+        str(i),
+        f"{first_name.lower()}.{i}@example.com",
+        first_name,
+        COMPANIES[i % len(COMPANIES)],
+        "VERIFIED",
+        sent_at.isoformat(timespec="seconds"),
+        f"{rng.getrandbits(64):016x}",
+        "",
+        "",
+        verified_at.isoformat(timespec="seconds"),
+    ]
+    if rng.random() < bounce_rate:
+        code, reason = BOUNCES[rng.randrange(len(BOUNCES))]
+        row[4], row[7], row[8] = "FAILED", code, reason.format(email=row[1])
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def make_lead_rows(n: int, bounce_rate: float = 0.02, seed: int = 0) -> list:
+    """
+    Synthetic lead tab as the Sheets values API returns it: header row plus
+    n rows of strings, with trailing empty cells dropped.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(pytz.timezone("Asia/Kolkata"))
+    return [list(LEAD_HEADER)] + [_lead_row(i, rng, now, bounce_rate) for i in range(1, n + 1)]
+
+
+class LeadRows:
+    """
+    make_lead_rows() generated on demand, for sheets too large to hold in the
+    benchmark process (FakeSheetsService serves slices of it). Row i is
+    seeded from (seed, i), so any slice is reproducible.
+    """
+
+    def __init__(self, n: int, bounce_rate: float = 0.02, seed: int = 0):
+        self.n = n
+        self.bounce_rate = bounce_rate
+        self.seed = seed
+        self.now = datetime.now(pytz.timezone("Asia/Kolkata"))
+
+    def __len__(self) -> int:
+        return self.n + 1
+
+    def __getitem__(self, rows: slice) -> list:
+        start, stop, _ = rows.indices(len(self))
+        return [list(LEAD_HEADER) if i == 0 else
+                _lead_row(i, random.Random(self.seed * 1_000_003 + i), self.now, self.bounce_rate)
+                for i in range(start, stop)]
+
+
+def make_dsn(sender: str, recipient: str, code: str, reason: str) -> bytes:
+    """RFC 3464 multipart/report bounce, as Gmail's mailer-daemon sends them."""
+    return (
+        "From: Mail Delivery Subsystem <mailer-daemon@googlemail.com>\r\n"
+        f"To: {sender}\r\n"
+        "Subject: Delivery Status Notification (Failure)\r\n"
+        "MIME-Version: 1.0\r\n"
+        'Content-Type: multipart/report; report-type=delivery-status; boundary="b1"\r\n'
+        "\r\n"
+        "--b1\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        "\r\n"
+        f"Your message wasn't delivered to {recipient}.\r\n"
+        "\r\n"
+        "--b1\r\n"
+        "Content-Type: message/delivery-status\r\n"
+        "\r\n"
+        "Reporting-MTA: dns; googlemail.com\r\n"
+        "\r\n"
+        f"Final-Recipient: rfc822; {recipient}\r\n"
+        "Action: failed\r\n"
+        f"Status: {code}\r\n"
+        f"Diagnostic-Code: smtp; {reason}\r\n"
+        "\r\n"
+        "--b1--\r\n"
+    ).encode()
+
+
+class _Request:
+    """Deferred call with googleapiclient's HttpRequest.execute() shape."""
+
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, num_retries: int = 0):
+        return self._fn()
+
+
+def _http_error(status: int, reason: str) -> HttpError:
+    resp = httplib2.Response({"status": str(status)})
+    resp.reason = reason
+    return HttpError(resp, f'{{"error": {{"code": {status}, "message": "{reason}"}}}}'.encode())
+
+
+class _Values:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId: str, range: str, **kwargs):
+        def run():
+            self._service._call("values.get")
+            # "Title" or a row range "'Title'!start:end" (paged downloads)
+            title, _, rows = range.partition("!")
+            if title.startswith("'"):
+                title = title[1:-1].replace("''", "'")
+            tab = self._service.tabs[title]
+            start, _, end = rows.partition(":")
+            values = tab[int(start) - 1:int(end)] if rows else tab[0:len(tab)]
+            return {"range": range, "values": values}
+        return _Request(run)
+
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId: str, **kwargs):
+        def run():
+            self._service._call("spreadsheets.get")
+            return {
+                "spreadsheetId": spreadsheetId,
+                "sheets": [{"properties": {"title": t, "gridProperties": {"rowCount": len(rows)}}}
+                           for t, rows in self._service.tabs.items()],
+            }
+        return _Request(run)
+
+    def values(self):
+        return _Values(self._service)
+
+
+class FakeSheetsService:
+    """Serves fixed tabs ({title: values or LeadRows}) with an optional per-call latency."""
+
+    def __init__(self, tabs: dict, latency_s: float = 0.0):
+        self.tabs = tabs
+        self.latency_s = latency_s
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, method: str) -> None:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+
+class _Messages:
+    def __init__(self, service):
+        self._service = service
+
+    def send(self, userId: str, body: dict):
+        def run():
+            self._service._call("messages.send", quota=True)
+            with self._service._lock:
+                self._service.sent += 1
+                msg_id = f"{self._service.sent:016x}"
+                bounce = self._service._rng.random() < self._service.dsn_rate
+            if bounce:
+                to = message_from_bytes(base64.urlsafe_b64decode(body["raw"]))["To"]
+                self._service._deliver_dsn(to)
+            return {"id": msg_id, "labelIds": ["SENT"]}
+        return _Request(run)
+
+    def get(self, userId: str, id: str, format: str = "full", **kwargs):
+        def run():
+            self._service._call("messages.get")
+            inbox = self._service.inbox.get(id)
+            if inbox is None:
+                return {"id": id, "snippet": "Address not found. Your message wasn't delivered."}
+            if format == "raw":
+                return {"id": id, "internalDate": inbox["internalDate"],
+                        "raw": base64.urlsafe_b64encode(inbox["raw"]).decode()}
+            return {"id": id, "internalDate": inbox["internalDate"],
+                    "payload": {"headers": [{"name": "From", "value": inbox["from"]}]}}
+        return _Request(run)
+
+    def list(self, userId: str, q: str = "", pageToken: str = None, **kwargs):
+        def run():
+            self._service._call("messages.list")
+            ids = [m for m, inbox in self._service.inbox.items() if "mailer-daemon" in inbox["from"]]
+            return {"messages": [{"id": m} for m in ids], "resultSizeEstimate": len(ids)}
+        return _Request(run)
+
+
+class _History:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId: str, startHistoryId: str, pageToken: str = None, **kwargs):
+        def run():
+            self._service._call("history.list")
+            start = int(startHistoryId)
+            added = [(hid, m) for m, hid in self._service.history if hid > start]
+            return {
+                "history": [{"id": str(hid), "messagesAdded": [{"message": {"id": m, "labelIds": ["INBOX"]}}]}
+                            for hid, m in added],
+                "historyId": str(self._service.history_id),
+            }
+        return _Request(run)
+
+
+class _Users:
+    def __init__(self, service):
+        self._service = service
+
+    def getProfile(self, userId: str):
+        def run():
+            self._service._call("users.getProfile")
+            return {"emailAddress": self._service.sender, "historyId": str(self._service.history_id)}
+        return _Request(run)
+
+    def messages(self):
+        return _Messages(self._service)
+
+    def history(self):
+        return _History(self._service)
+
+
+class FakeGmailService:
+    """
+    Gmail stand-in with a per-call latency, a probability that a quota-counted
+    call fails with HTTP 429 rateLimitExceeded, and a probability that a sent
+    message bounces (a mailer-daemon DSN lands in the inbox and mailbox history).
+    """
+
+    def __init__(self, latency_s: float = 0.0, quota_error_rate: float = 0.0,
+                 sender: str = "bench@example.com", seed: int = 0, dsn_rate: float = 0.0):
+        self.latency_s = latency_s
+        self.quota_error_rate = quota_error_rate
+        self.dsn_rate = dsn_rate
+        self.sender = sender
+        self.sent = 0
+        self.quota_errors = 0
+        self.calls = {}
+        self.inbox = {}      # id -> {"from", "raw", "internalDate"}
+        self.history = []    # [(id, historyId)]
+        self.history_id = 1
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _deliver_dsn(self, recipient: str) -> None:
+        code, reason = BOUNCES[self._rng.randrange(len(BOUNCES))]
+        raw = make_dsn(self.sender, recipient, code, reason.format(email=recipient))
+        with self._lock:
+            self.history_id += 1
+            msg_id = f"dsn{self.history_id:013x}"
+            self.inbox[msg_id] = {"from": "Mail Delivery Subsystem <mailer-daemon@googlemail.com>",
+                                  "raw": raw, "internalDate": str(int(time.time() * 1000))}
+            self.history.append((msg_id, self.history_id))
+
+    def _call(self, method: str, quota: bool = False) -> None:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            fail = quota and self._rng.random() < self.quota_error_rate
+            if fail:
+                self.quota_errors += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if fail:
+            raise _http_error(429, "rateLimitExceeded")
+
+    def users(self):
+        return _Users(self)
+
+
+STRUCTURED_ANSWER = ('{"cause": "The recipient mailbox does not exist at the destination server.", '
+                     '"category": "invalid_address", "action": "Remove the address from the lead list."}')
+
+
+class FakeLlama:
+    """
+    llama_cpp.Llama stand-in that streams `completion_tokens` one-word tokens
+    at `tokens_per_sec` (or STRUCTURED_ANSWER when a grammar is passed), and
+    hashed bag-of-words vectors from embed(). Configure via make_fake_llama().
+    """
+
+    tokens_per_sec = 200.0
+    completion_tokens = 48
+    instances = 0
+    embedding_instances = 0
+    completions = 0
+    embeddings = 0
+
+    def __init__(self, model_path: str, **kwargs):
+        self.model_path = model_path
+        self.kwargs = kwargs
+        if kwargs.get("embedding"):
+            type(self).embedding_instances += 1
+        else:
+            type(self).instances += 1
+
+    def embed(self, input, normalize: bool = False, truncate: bool = True, return_count: bool = False):
+        texts = [input] if isinstance(input, str) else list(input)
+        type(self).embeddings += len(texts)
+        vectors = []
+        for text in texts:
+            vec = [0.0] * 64
+            for word in text.lower().split():
+                vec[zlib.crc32(word.encode()) % 64] += 1.0
+            norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+            vectors.append([v / norm for v in vec] if normalize else vec)
+        return vectors[0] if isinstance(input, str) else vectors
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list:
+        return list(range(len(text.split()) + int(add_bos)))
+
+    def create_chat_completion(self, messages, stream: bool = False, max_tokens: int = 2048, grammar=None, **kwargs):
+        type(self).completions += 1
+        delay = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        if grammar is not None:
+            # Grammar-constrained: a closed JSON object, one word per token
+            words = STRUCTURED_ANSWER.split(" ")
+            n = min(len(words), max_tokens)
+            words = [words[0]] + [" " + w for w in words[1:]]
+        else:
+            n = min(self.completion_tokens, max_tokens)
+            words = [" " + w for w in " ".join(m["content"] for m in messages if m["role"] == "user").split()] or [" ok"]
+
+        def gen():
+            yield {"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}
+            for i in range(n):
+                if delay:
+                    time.sleep(delay)
+                yield {"choices": [{"index": 0, "delta": {"content": words[i % len(words)]},
+                                    "finish_reason": None}]}
+            yield {"choices": [{"index": 0, "delta": {}, "finish_reason": "length"}]}
+
+        if stream:
+            return gen()
+        text = "".join(c["choices"][0]["delta"].get("content", "") for c in gen())
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "length"}]}
+
+
+def make_fake_llama(tokens_per_sec: float, completion_tokens: int) -> type:
+    """Return a FakeLlama subclass with its own speed and counters."""
+    return type("FakeLlama", (FakeLlama,), {
+        "tokens_per_sec": tokens_per_sec,
+        "completion_tokens": completion_tokens,
+        "instances": 0,
+        "embedding_instances": 0,
+        "completions": 0,
+        "embeddings": 0,
+    })
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end pipeline benchmark.
+
+Drives download_google_sheet_to_xlsx, send_emails_to_leads, verify_email_status
+and ReportGenerator.generate_report_from_xlsx against the local fakes in
+fakes.py (no Google APIs, no GGUF model) and records wall time, peak RSS and a
+per-stage breakdown to a JSON file. The report runs a second time over the
+same window (report_rerun) to measure reuse of stored summaries.
+
+Each lead count runs in its own process (so peak RSS is per run) inside a
+throwaway working directory with a generated config.json.
+
+Usage (from email_agent/):
+    python benchmarks/run_pipeline.py --sizes 1000 10000 100000
+    python benchmarks/run_pipeline.py --sizes 1000 --baseline benchmarks/results/pipeline_<ts>.json
+    python benchmarks/run_pipeline.py --sizes 2000 --gmail-latency-ms 100 --no-clustering --no-prefetch
+    python benchmarks/run_pipeline.py --streaming --sizes 1000 100000 1000000
+
+The fake sheet's rows are generated on demand (fakes.LeadRows), so peak RSS
+is the pipeline's own; with --streaming (STREAMING, streaming.py) it should
+stay flat as the sheet grows.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from queue import Empty
+from unittest import mock
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _prepare_workdir(workdir: Path, date_str: str, gmail_pull: bool, overrides: dict = None) -> None:
+    config = {
+        "MODEL_PATH": "model.gguf",
+        "SCOPES": ["https://www.googleapis.com/auth/spreadsheets.readonly"],
+        "CREDENTIALS_JSON": "credentials.json",
+        "TOKEN_JSON": "token.json",
+        "SPREADSHEET_ID": "benchmark-sheet",
+        "OUTPUT_DIR": "leads_agent_excel_files",
+        "OUTPUT_PREFIX": "leads_",
+        "COL_SENT_AT": "sent_at",
+        "COL_VERIFIED_AT": "verified_at",
+        "COL_BOUNCE_REASON": "bounce_reason",
+        "ENABLE_GMAIL_PULL": gmail_pull,
+        "GMAIL_SCOPES": ["https://www.googleapis.com/auth/gmail.readonly"],
+        "COL_GMAIL_MSG_ID": "gmail_msg_id",
+        "MAX_GMAIL_BODY_CHARS": 2500,
+        "EMAIL_CONFIG": {"EMAIL_COLUMN": "email"},
+        # The fakes do not meter quota units (--quota-error-rate models 429s instead)
+        "GMAIL_QUOTA": {"ENABLED": False},
+        **(overrides or {}),
+    }
+    (workdir / "config.json").write_text(json.dumps(config, indent=2), encoding="utf-8")
+    (workdir / "model.gguf").write_bytes(b"")
+    (workdir / "email_to_send").mkdir()
+    shutil.copy(AGENT_DIR / "email_to_send" / "email_08022026.txt",
+                workdir / "email_to_send" / f"email_{date_str}.txt")
+
+
+def _run_size(n_leads: int, params: dict, out_queue) -> None:
+    """Child process: run every stage once for n_leads and report back."""
+    sys.path.insert(0, str(AGENT_DIR))
+    sys.path.insert(0, str(BENCH_DIR))
+    from fakes import FakeGmailService, FakeSheetsService, LeadRows, make_fake_llama
+
+    date_str = datetime.now().strftime("%d%m%Y")
+    workdir = Path(tempfile.mkdtemp(prefix="email_agent_bench_"))
+    try:
+        _prepare_workdir(workdir, date_str, params["gmail_pull"], overrides={
+            "REPORT_PREFETCH": {"ENABLED": params["prefetch"]},
+            "BOUNCE_CLUSTERING": {"ENABLED": params["clustering"]},
+            "STREAMING": {"ENABLED": params["streaming"]},
+        })
+        os.chdir(workdir)
+
+        import main
+        import send_emails
+        import bounce_ingest
+        import bounce_clustering
+        from streaming import download_page_rows
+
+        rows = LeadRows(n_leads, bounce_rate=params["bounce_rate"], seed=params["seed"])
+        sheets = FakeSheetsService({"Sheet1": rows}, latency_s=params["sheets_latency_ms"] / 1000)
+        gmail = FakeGmailService(latency_s=params["gmail_latency_ms"] / 1000,
+                                 quota_error_rate=params["quota_error_rate"], seed=params["seed"],
+                                 dsn_rate=params["dsn_rate"])
+        fake_llama = make_fake_llama(params["tokens_per_sec"], params["completion_tokens"])
+
+        def fake_service(api, version, scopes):
+            return sheets if api == "sheets" else gmail
+
+        stages = {}
+        xlsx_path = main.OUTPUT_DIR / f"{main.OUTPUT_PREFIX}{date_str}.xlsx"
+
+        def run_stage(name, fn):
+            t0 = time.perf_counter()
+            out = fn()
+            stages[name] = {"wall_s": round(time.perf_counter() - t0, 4), "peak_rss_mb": _peak_rss_mb()}
+            return out
+
+        quiet = contextlib.nullcontext() if params["verbose"] else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with quiet, \
+                mock.patch.object(main, "google_service", fake_service), \
+                mock.patch.object(send_emails, "google_service", fake_service), \
+                mock.patch.object(bounce_ingest, "google_service", fake_service), \
+                mock.patch.object(main, "Llama", fake_llama), \
+                mock.patch.object(bounce_clustering, "Llama", fake_llama):
+            t_start = time.perf_counter()
+            run_stage("download", lambda: main.download_google_sheet_to_xlsx(
+                main.SPREADSHEET_ID, xlsx_path, page_rows=download_page_rows(main.config)))
+            sent = run_stage("send", lambda: send_emails.send_emails_to_leads(date_str))
+            verified = run_stage("verify", lambda: send_emails.verify_email_status(date_str))
+            gen = main.ReportGenerator(os.path.abspath(main.MODEL_PATH))
+            run_stage("report", lambda: gen.generate_report_from_xlsx(xlsx_path, date_str))
+            total = time.perf_counter() - t_start
+            summaries = fake_llama.completions
+            # Same window again: stored summaries are reused (report_state.py)
+            run_stage("report_rerun", lambda: gen.generate_report_from_xlsx(xlsx_path, date_str))
+
+        stages["send"].update({"sent": sent["success"], "failed": sent["failed"]})
+        stages["verify"].update({"bounced": int(verified["bounced"]), "new_bounces": verified["new_bounces"]})
+        stages["report"].update({"summaries": summaries, "model_loads": fake_llama.instances,
+                                 "embeddings": fake_llama.embeddings})
+        stages["report_rerun"]["summaries"] = fake_llama.completions - summaries
+
+        out_queue.put({
+            "leads": n_leads,
+            "total_wall_s": round(total, 4),
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": stages,
+            "api_calls": {"sheets": sheets.calls, "gmail": gmail.calls, "gmail_quota_errors": gmail.quota_errors},
+            "telemetry": main.METRICS.summary(),
+        })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _compare(results: dict, baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    old_runs = {r["leads"]: r for r in baseline.get("runs", [])}
+    print(f"\nCompared with {baseline_path}:")
+    for run in results["runs"]:
+        old = old_runs.get(run["leads"])
+        if old is None:
+            continue
+        for name, stage in run["stages"].items():
+            old_stage = old["stages"].get(name)
+            if old_stage and old_stage["wall_s"] > 0:
+                ratio = stage["wall_s"] / old_stage["wall_s"]
+                print(f"  {run['leads']:>8} {name:<10} {old_stage['wall_s']:>9.3f}s -> {stage['wall_s']:>9.3f}s  x{ratio:.2f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline email_agent pipeline benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--bounce-rate", type=float, default=0.02)
+    parser.add_argument("--tokens-per-sec", type=float, default=2000.0, help="Stub Llama decode speed")
+    parser.add_argument("--completion-tokens", type=int, default=48, help="Tokens per stub summary")
+    parser.add_argument("--gmail-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sheets-latency-ms", type=float, default=0.0)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--dsn-rate", type=float, default=0.01, help="Share of sends that bounce with a Gmail DSN")
+    parser.add_argument("--no-gmail-pull", action="store_true", help="Skip Gmail fetches in the report")
+    parser.add_argument("--no-prefetch", action="store_true", help="Fetch Gmail excerpts inline (REPORT_PREFETCH off)")
+    parser.add_argument("--no-clustering", action="store_true", help="Summarise every failed lead (BOUNCE_CLUSTERING off)")
+    parser.add_argument("--streaming", action="store_true", help="Page and chunk the sheet (STREAMING on)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own output")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    params = {
+        "bounce_rate": args.bounce_rate,
+        "tokens_per_sec": args.tokens_per_sec,
+        "completion_tokens": args.completion_tokens,
+        "gmail_latency_ms": args.gmail_latency_ms,
+        "sheets_latency_ms": args.sheets_latency_ms,
+        "quota_error_rate": args.quota_error_rate,
+        "dsn_rate": args.dsn_rate,
+        "gmail_pull": not args.no_gmail_pull,
+        "prefetch": not args.no_prefetch,
+        "clustering": not args.no_clustering,
+        "streaming": args.streaming,
+        "seed": args.seed,
+        "verbose": args.verbose,
+    }
+
+    ctx = mp.get_context("spawn")
+    runs = []
+    for n in args.sizes:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_size, args=(n, params, queue))
+        proc.start()
+        while True:
+            try:
+                run = queue.get(timeout=1.0)
+                break
+            except Empty:
+                if not proc.is_alive():
+                    raise RuntimeError(f"Benchmark run for {n} leads exited with code {proc.exitcode}")
+        proc.join()
+        runs.append(run)
+        breakdown = "  ".join(f"{k}={v['wall_s']:.2f}s" for k, v in run["stages"].items())
+        print(f"[OK] {n:>8} leads: {run['total_wall_s']:.2f}s, peak RSS {run['peak_rss_mb']} MB  ({breakdown})")
+
+    results = {
+        "benchmark": "pipeline",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": {"node": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "params": params,
+        "runs": runs,
+    }
+
+    output = args.output or BENCH_DIR / "results" / f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"[OK] Results written: {output}")
+
+    if args.baseline:
+        _compare(results, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+"""
+Semantic clustering of bounce reasons, so each distinct cause is summarised once.
+
+Bounce texts for the same cause differ in wording ("mailbox full", "inbox is
+out of storage space", "quota exceeded") and usually embed the recipient's
+address, so an exact-match cache misses them. Before the report summarises
+the failed leads:
+
+1. each lead's bounce_code + bounce_reason is normalised (addresses and long
+   numbers masked, whitespace collapsed) and identical texts are merged;
+2. leads are partitioned by bounce_code: a 5.1.1 and a 5.2.2 never share a
+   cluster however alike their wording, and a code with a single distinct
+   text needs no embedding;
+3. the remaining texts are embedded with a GGUF in embedding mode
+   (EMBEDDING_MODEL_PATH, e.g. a small bge/nomic/e5 GGUF, or the report model
+   itself when unset), mean-pooled and L2-normalised;
+4. within each code, texts are grouped greedily: a text joins the most
+   similar cluster leader if that cosine similarity is at least THRESHOLD,
+   otherwise it leads a new cluster.
+
+The report then summarises one representative lead per cluster and renders
+that summary for every member, so LLM calls scale with the number of distinct
+causes rather than the number of leads. Only structured summaries
+(STRUCTURED_SUMMARY) are clustered: their prompt holds just the delivery
+facts, with no lead identity that would be wrong for the other members.
+
+Clustering is off unless EMBEDDING_MODEL_PATH is set: embedding with the
+report model would load a second copy of it just for this.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from llama_cpp import LLAMA_POOLING_TYPE_MEAN, Llama
+
+from telemetry import METRICS
+
+DEFAULT_BOUNCE_CLUSTERING = {
+    "ENABLED": None,               # None = on when EMBEDDING_MODEL_PATH is set
+    "THRESHOLD": 0.9,              # cosine similarity to join a cluster
+    "EMBEDDING_MODEL_PATH": None,  # None = the report model (MODEL_PATH)
+    "N_CTX": 512,                  # bounce texts are short
+}
+
+def clustering_settings(section: dict) -> dict:
+    """A BOUNCE_CLUSTERING config section over the defaults, with ENABLED resolved to a bool."""
+    settings = {**DEFAULT_BOUNCE_CLUSTERING, **(section or {})}
+    if settings["ENABLED"] is None:
+        settings["ENABLED"] = bool(settings["EMBEDDING_MODEL_PATH"])
+    return settings
+
+
+ADDRESS = re.compile(r"<?[\w.+-]+@[\w-]+(\.[\w-]+)+>?")
+NUMBER = re.compile(r"\b\d{5,}\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_reason(bounce_code, bounce_reason) -> str:
+    """'5.2.2' + '552 ... alice@x.com ... id 123456' -> '5.2.2 552 ... <address> ... id <n>'"""
+    parts = [str(v) for v in (bounce_code, bounce_reason) if not pd.isna(v) and str(v).strip()]
+    text = ADDRESS.sub("<address>", " ".join(parts))
+    text = NUMBER.sub("<n>", text)
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+class BounceEmbedder:
+    """Llama(embedding=True) with mean pooling; embed() returns unit-length rows."""
+
+    def __init__(self, model_path: str, n_ctx: int = 512):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Embedding model not found: {os.path.abspath(model_path)}")
+        from hw_profile import llama_settings
+
+        settings = llama_settings(model_path)
+        settings.pop("n_ctx", None)
+        settings["n_batch"] = settings["n_ubatch"] = max(settings.get("n_batch", 512), n_ctx)
+        with METRICS.timer("llm_model_load", route="bounce_embedding"):
+            self.llm = Llama(
+                model_path=model_path,
+                n_ctx=n_ctx,
+                embedding=True,
+                pooling_type=LLAMA_POOLING_TYPE_MEAN,
+                verbose=False,
+                **settings
+            )
+
+    def embed(self, texts: list) -> np.ndarray:
+        with METRICS.timer("bounce_embedding"):
+            vectors = np.asarray(self.llm.embed(texts, normalize=True), dtype=np.float32)
+        METRICS.inc("bounce_embeddings_total", len(texts))
+        return vectors
+
+
+_embedders = {}
+
+
+def shared_embedder(model_path: str, n_ctx: int = 512) -> BounceEmbedder:
+    """One BounceEmbedder per model file for the process (reports/campaigns reuse it)."""
+    key = (os.path.abspath(model_path), n_ctx)
+    if key not in _embedders:
+        _embedders[key] = BounceEmbedder(model_path, n_ctx=n_ctx)
+    return _embedders[key]
+
+
+def cluster_vectors(vectors: np.ndarray, threshold: float) -> list:
+    """
+    Greedy leader clustering of unit vectors: each row joins the most similar
+    existing leader if that similarity is >= threshold, else leads a new
+    cluster. Returns one cluster label per row.
+    """
+    labels, leaders = [], []
+    for vector in vectors:
+        if leaders:
+            sims = np.stack(leaders) @ vector
+            best = int(np.argmax(sims))
+            if sims[best] >= threshold:
+                labels.append(best)
+                continue
+        leaders.append(vector)
+        labels.append(len(leaders) - 1)
+    return labels
+
+
+def cluster_leads(filtered, col_bounce_reason: str, embed, threshold: float) -> list:
+    """
+    Group the rows of `filtered` by bounce cause, never across bounce codes.
+    `embed` maps a list of texts to unit vectors (BounceEmbedder.embed; called
+    once, with the texts of codes that have two or more distinct texts).
+    Returns a list of clusters, each a list of index labels of `filtered`, in
+    order of first appearance.
+    """
+    codes, texts = [], []
+    for _, row in filtered.iterrows():
+        code = row.get("bounce_code")
+        codes.append("" if pd.isna(code) else str(code).strip())
+        texts.append(normalize_reason(code, row.get(col_bounce_reason)))
+    # Distinct texts per code; identical texts need no embedding, a code with one text none at all
+    by_code = {}
+    for code, text in zip(codes, texts):
+        by_code.setdefault(code, {})[text] = None
+    to_embed = [(code, text) for code, unique in by_code.items() if len(unique) > 1 for text in unique]
+    vectors = dict(zip(to_embed, embed([text for _, text in to_embed]))) if to_embed else {}
+
+    label_of = {}
+    for code, unique in by_code.items():
+        unique = list(unique)
+        if len(unique) > 1:
+            labels = cluster_vectors(np.stack([vectors[code, text] for text in unique]), threshold)
+        else:
+            labels = [0]
+        label_of.update({(code, text): (code, label) for text, label in zip(unique, labels)})
+
+    clusters = {}
+    for index, code, text in zip(filtered.index, codes, texts):
+        clusters.setdefault(label_of[code, text], []).append(index)
+    METRICS.set_gauge("report_bounce_clusters", len(clusters))
+    METRICS.inc("report_leads_fanned_out_total", len(filtered) - len(clusters))
+    return list(clusters.values())
@@ -0,0 +1,374 @@
+"""
+Incremental bounce detection from Gmail delivery status notifications (DSNs).
+
+The verify stage used to count whatever was already in the sheet's
+bounce_reason column. Instead, this module:
+
+1. resumes from the last Gmail historyId (bounce_state.json) and lists only
+   messages added to the INBOX since then (users.history.list), falling back
+   to a bounded mailer-daemon search on first run or when the historyId has
+   expired;
+2. keeps only mailer-daemon / postmaster messages and parses their DSN
+   (message/delivery-status: Final-Recipient, Action, Status, Diagnostic-Code);
+3. joins each failed recipient against the send journal by email through a
+   dict index, so the cost is O(new messages), not O(all leads);
+4. appends the bounce rows to bounce_log.jsonl, which verify and the report
+   merge into the sheet data (merge_bounce_log, matched by gmail_msg_id).
+
+The send journal (send_journal_DDMMYYYY.jsonl) is appended by
+send_emails_to_leads, one line per sent message with its Gmail id.
+"""
+import base64
+import json
+import re
+import threading
+from datetime import datetime, timedelta
+from email import message_from_bytes, policy
+from pathlib import Path
+
+import pandas as pd
+import pytz
+from googleapiclient.errors import HttpError
+
+from main import GMAIL_SCOPES, execute_api, google_service
+from lead_loader import parse_timestamps
+from telemetry import METRICS
+
+DEFAULT_BOUNCE_INGEST = {
+    "ENABLED": True,
+    "STATE_FILE": "bounce_state.json",
+    "LOG_FILE": "bounce_log.jsonl",
+    "FALLBACK_DAYS": 7,  # search window when there is no usable historyId
+    "JOURNAL_DAYS": 7,   # send journals indexed for matching
+}
+
+IST = pytz.timezone("Asia/Kolkata")
+DSN_QUERY = "from:(mailer-daemon OR postmaster)"
+DSN_SENDER = re.compile(r"mailer-daemon|postmaster", re.IGNORECASE)
+STATUS_CODE = re.compile(r"\b([245]\.\d{1,3}\.\d{1,3})\b")
+
+
+def bounce_settings(config: dict) -> dict:
+    settings = {**DEFAULT_BOUNCE_INGEST, **config.get("BOUNCE_INGEST", {})}
+    output_dir = Path(config.get("OUTPUT_DIR", "leads_agent_excel_files"))
+    settings["STATE_FILE"] = output_dir / settings["STATE_FILE"]
+    settings["LOG_FILE"] = output_dir / settings["LOG_FILE"]
+    settings["OUTPUT_DIR"] = output_dir
+    return settings
+
+
+# ---------------------------------------------------------------------------
+# Send journal
+# ---------------------------------------------------------------------------
+
+def journal_path(output_dir: Path, date_str: str) -> Path:
+    return Path(output_dir) / f"send_journal_{date_str}.jsonl"
+
+
+def append_journal(path: Path, entries: list) -> None:
+    if not entries:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+
+def _iter_jsonl(path: Path):
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_jsonl(path: Path) -> list:
+    return list(_iter_jsonl(path))
+
+
+def journal_recipients(path: Path) -> set:
+    """Lower-cased addresses already sent to in one send journal."""
+    return {entry["email"] for entry in _iter_jsonl(path)}
+
+
+def load_journal_index(output_dir: Path, days: int, emails: set = None) -> dict:
+    """
+    email (lower-cased) -> latest journal entry over the last `days` send
+    journals. With `emails`, only those addresses are kept, so the index
+    grows with the bounces being matched rather than with the sends.
+    """
+    index = {}
+    today = datetime.now()
+    for offset in range(days, -1, -1):
+        date_str = (today - timedelta(days=offset)).strftime("%d%m%Y")
+        for entry in _iter_jsonl(journal_path(output_dir, date_str)):
+            email = str(entry["email"]).strip().lower()
+            if emails is None or email in emails:
+                index[email] = entry
+    return index
+
+
+# ---------------------------------------------------------------------------
+# DSN parsing
+# ---------------------------------------------------------------------------
+
+def _address(field) -> str:
+    """'rfc822; user@example.com' -> 'user@example.com'"""
+    return str(field or "").split(";", 1)[-1].strip().strip("<>").lower()
+
+
+def parse_dsn(raw: bytes) -> list:
+    """
+    Failed recipients in a bounce message:
+    [{"email", "status", "diagnostic", "action"}]. Uses the
+    message/delivery-status part (RFC 3464) when present, otherwise the
+    X-Failed-Recipients header and the first status code in the text.
+    """
+    msg = message_from_bytes(raw, policy=policy.default)
+    failures = []
+    for part in msg.walk():
+        if part.get_content_type() != "message/delivery-status":
+            continue
+        for block in part.get_payload():
+            recipient = block.get("Final-Recipient") or block.get("Original-Recipient")
+            if not recipient:
+                continue
+            action = str(block.get("Action", "failed")).strip().lower()
+            if action != "failed":
+                continue  # delayed / delivered / relayed are not bounces
+            failures.append({
+                "email": _address(recipient),
+                "status": str(block.get("Status", "")).strip(),
+                # 'smtp; 550 5.1.1 ...' -> '550 5.1.1 ...'
+                "diagnostic": str(block.get("Diagnostic-Code", "")).split(";", 1)[-1].strip(),
+                "action": action,
+            })
+    if failures:
+        return failures
+
+    recipients = [r.strip().lower() for r in str(msg.get("X-Failed-Recipients", "")).split(",") if r.strip()]
+    if not recipients:
+        return []
+    body = msg.get_body(preferencelist=("plain",))
+    text = body.get_content() if body is not None else ""
+    code = STATUS_CODE.search(text)
+    reason = next((line.strip() for line in text.splitlines() if code and code.group(1) in line), "")
+    return [{"email": r, "status": code.group(1) if code else "", "diagnostic": reason, "action": "failed"}
+            for r in recipients]
+
+
+# ---------------------------------------------------------------------------
+# Gmail listing
+# ---------------------------------------------------------------------------
+
+def _history_message_ids(gmail, start_history_id: str) -> tuple:
+    """(message ids added to INBOX since start_history_id, latest historyId)."""
+    ids, page_token, latest = [], None, start_history_id
+    while True:
+        resp = execute_api(gmail.users().history().list(
+            userId="me", startHistoryId=start_history_id, historyTypes=["messageAdded"],
+            labelId="INBOX", pageToken=page_token,
+        ), "gmail", "history.list")
+        for record in resp.get("history", []):
+            ids += [added["message"]["id"] for added in record.get("messagesAdded", [])]
+        latest = resp.get("historyId", latest)
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return ids, latest
+
+
+def _search_message_ids(gmail, days: int) -> list:
+    ids, page_token = [], None
+    while True:
+        resp = execute_api(gmail.users().messages().list(
+            userId="me", q=f"{DSN_QUERY} newer_than:{days}d", pageToken=page_token,
+        ), "gmail", "messages.list")
+        ids += [m["id"] for m in resp.get("messages", [])]
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return ids
+
+
+def _is_dsn(gmail, message_id: str) -> bool:
+    meta = execute_api(gmail.users().messages().get(
+        userId="me", id=message_id, format="metadata", metadataHeaders=["From"],
+    ), "gmail", "messages.get")
+    headers = meta.get("payload", {}).get("headers", [])
+    sender = next((h["value"] for h in headers if h["name"].lower() == "from"), "")
+    return bool(DSN_SENDER.search(sender))
+
+
+def _load_state(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+_log_locks = {}
+_log_locks_guard = threading.Lock()
+
+
+def _log_lock(log_file: Path) -> threading.Lock:
+    """One lock per bounce log: the watcher and verify may ingest for the same campaign at once."""
+    with _log_locks_guard:
+        return _log_locks.setdefault(Path(log_file).resolve(), threading.Lock())
+
+
+def ingest_bounces(config: dict, gmail=None) -> list:
+    """
+    Pull DSNs that arrived since the last run, match them to sent leads and
+    append them to the bounce log. Returns the new bounce rows.
+    """
+    settings = bounce_settings(config)
+    if gmail is None:
+        gmail = google_service("gmail", "v1", GMAIL_SCOPES)
+    # state read -> fetch -> log append -> state write as one step, or both callers append the same DSNs
+    with _log_lock(settings["LOG_FILE"]):
+        return _ingest_bounces(settings, gmail)
+
+
+def _ingest_bounces(settings: dict, gmail) -> list:
+    state = _load_state(settings["STATE_FILE"])
+    history_id = state.get("history_id")
+    # Take the mailbox position before listing so nothing arriving meanwhile is skipped next time
+    profile_history_id = execute_api(gmail.users().getProfile(userId="me"), "gmail", "users.getProfile")["historyId"]
+
+    candidate_ids, from_history = None, False
+    if history_id:
+        try:
+            candidate_ids, profile_history_id = _history_message_ids(gmail, history_id)
+            from_history = True
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            print(f"[INFO] Gmail historyId {history_id} expired; searching the last {settings['FALLBACK_DAYS']} days")
+    if candidate_ids is None:
+        candidate_ids = _search_message_ids(gmail, settings["FALLBACK_DAYS"])
+
+    # Search results are already mailer-daemon only; history results need the sender check
+    seen = {row["dsn_msg_id"] for row in _read_jsonl(settings["LOG_FILE"])}
+    dsn_ids = [m for m in dict.fromkeys(candidate_ids)
+               if m not in seen and (not from_history or _is_dsn(gmail, m))]
+
+    failures = []
+    for message_id in dsn_ids:
+        msg = execute_api(gmail.users().messages().get(userId="me", id=message_id, format="raw"),
+                          "gmail", "messages.get")
+        received_at = datetime.fromtimestamp(int(msg.get("internalDate", 0)) / 1000, IST)
+        raw = base64.urlsafe_b64decode(msg["raw"])
+        failures += [(message_id, received_at, failure) for failure in parse_dsn(raw)]
+
+    # Journal entries of the failed recipients only
+    journal = load_journal_index(settings["OUTPUT_DIR"], settings["JOURNAL_DAYS"],
+                                 emails={failure["email"] for _, _, failure in failures}) if failures else {}
+    bounces = []
+    for message_id, received_at, failure in failures:
+        sent = journal.get(failure["email"])
+        if sent is None:
+            METRICS.inc("bounces_unmatched_total")
+            continue
+        bounces.append({
+            "email": failure["email"],
+            "lead_id": sent.get("lead_id"),
+            "gmail_msg_id": sent.get("gmail_msg_id"),
+            "sent_at": sent.get("sent_at"),
+            "bounce_code": failure["status"],
+            "bounce_reason": failure["diagnostic"],
+            "bounced_at": received_at.isoformat(timespec="seconds"),
+            "dsn_msg_id": message_id,
+        })
+
+    append_journal(settings["LOG_FILE"], bounces)
+    settings["STATE_FILE"].parent.mkdir(parents=True, exist_ok=True)
+    settings["STATE_FILE"].write_text(json.dumps({
+        "history_id": str(profile_history_id),
+        "updated_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+    }), encoding="utf-8")
+
+    METRICS.inc("bounce_dsn_messages_total", len(dsn_ids))
+    METRICS.inc("bounces_ingested_total", len(bounces))
+    print(f"[OK] Bounce ingest: {len(candidate_ids)} new messages, {len(dsn_ids)} DSNs, {len(bounces)} bounces")
+    return bounces
+
+
+def load_bounce_log(config: dict):
+    """The bounce log as a DataFrame, one row per bounced send (latest DSN wins), or None when empty."""
+    rows = _read_jsonl(bounce_settings(config)["LOG_FILE"])
+    if not rows:
+        return None
+    log = pd.DataFrame(rows)
+    send = log["gmail_msg_id"].fillna(log["email"] + "|" + log["sent_at"].fillna(""))
+    return log[~send.duplicated(keep="last")].reset_index(drop=True)
+
+
+def _send_day(values: pd.Series) -> pd.Series:
+    """sent_at values -> 'YYYY-MM-DD' in IST ('' when missing)."""
+    return parse_timestamps(values).dt.strftime("%Y-%m-%d").fillna("")
+
+
+def merge_bounce_log(df: pd.DataFrame, config: dict, log: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Fill bounce_code / bounce_reason (and a missing verified_at) from the
+    bounce log for sheet rows whose send bounced. A row matches a logged
+    bounce by gmail_msg_id; rows without one match by email and the day of
+    sent_at. An earlier bounce of the same address never matches a later send,
+    and sent_at is never filled from the log. Values already in the sheet win.
+    `log` (load_bounce_log) is read from disk when not given; pass it when
+    merging a sheet chunk by chunk.
+    """
+    if log is None:
+        log = load_bounce_log(config)
+    email_col = config.get("EMAIL_CONFIG", {}).get("EMAIL_COLUMN", "email")
+    msg_col = config.get("COL_GMAIL_MSG_ID", "gmail_msg_id")
+    sent_col = config.get("COL_SENT_AT", "sent_at")
+    if log is None or email_col not in df.columns:
+        return df
+
+    # Sheet row -> position in the log
+    empty_str = pd.Series("", index=df.index)
+    msg_ids = df[msg_col].astype("string").str.strip().fillna("") if msg_col in df.columns else empty_str
+    by_msg = pd.Series(log.index, index=log["gmail_msg_id"].astype("string").fillna(""))
+    by_msg = by_msg[(by_msg.index != "") & ~by_msg.index.duplicated(keep="last")]
+    position = msg_ids.map(by_msg)
+
+    no_msg = msg_ids == ""
+    if sent_col in df.columns and no_msg.any():
+        log_keys = log["email"].str.lower() + "|" + _send_day(log["sent_at"])
+        by_day = pd.Series(log.index, index=log_keys)
+        by_day = by_day[~by_day.index.duplicated(keep="last")]
+        days = _send_day(df.loc[no_msg, sent_col])
+        keys = df.loc[no_msg, email_col].astype(str).str.strip().str.lower() + "|" + days
+        position[no_msg] = keys.where(days != "").map(by_day)
+
+    matched = position.notna()
+    if not matched.any():
+        return df
+    position = position[matched].astype(int)
+
+    df = df.copy()
+    targets = {
+        "bounce_code": "bounce_code",
+        config.get("COL_BOUNCE_REASON", "bounce_reason"): "bounce_reason",
+        config.get("COL_VERIFIED_AT", "verified_at"): "bounced_at",
+    }
+    for column, source in targets.items():
+        values = pd.Series(log[source].to_numpy()[position.to_numpy()], index=position.index)
+        col = df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        empty = col.isna() | (col.astype(str).str.strip() == "")
+        fill = matched & empty
+        if not fill.any():
+            continue
+        values = values[fill[matched]]
+        # Keep the loader's dtypes (see lead_loader): tz-aware timestamps, categoricals
+        if isinstance(col.dtype, pd.DatetimeTZDtype):
+            values = parse_timestamps(values)
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.cat.add_categories(pd.Index(values.dropna().unique()).difference(col.cat.categories))
+        col = col.copy()
+        col[fill] = values
+        df[column] = col
+    return df
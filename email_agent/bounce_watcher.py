@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Summarise bounces in the background as they arrive.
+
+The report used to summarise every bounced lead of the window in one batch
+at the end of the day, so the whole LLM cost landed at report time. The
+watcher spreads it over the day. Every POLL_MINUTES, per campaign, it:
+
+1. pulls new DSNs from Gmail history (bounce_ingest.ingest_bounces, which
+   resumes from the stored historyId, so an idle mailbox costs two calls);
+2. downloads the sheet again when DSNs arrived or the sheet's Drive revision
+   changed (export_service.remote_revision, needs drive.metadata.readonly in
+   SCOPES; without it every SHEET_POLL_MINUTES), for bounce reasons typed
+   into the sheet directly;
+3. summarises verified leads with a bounce_reason that have no stored
+   summary yet (ReportGenerator.precompute_summaries), at most
+   MAX_LEADS_PER_TICK per poll, into the report state (report_state.py).
+
+Summaries are only generated while no report is using the shared model: a
+poll that finds it busy is skipped and picked up on the next one. The report
+then finds every lead in the report state and only assembles the entries; the
+model is not even loaded.
+
+With BOUNCE_WATCHER.ENABLED the scheduler (pipeline_scheduler.py) adds a
+watch job per campaign. Without the scheduler, run it on its own:
+
+    python bounce_watcher.py            # poll until Ctrl+C
+    python bounce_watcher.py --once     # one poll of every campaign
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bounce_ingest import bounce_settings, ingest_bounces
+from export_service import remote_revision
+from campaigns import campaign_config, get_campaigns, idle_model, shared_summary_bot
+from main import MODEL_PATH, ReportGenerator, download_google_sheet_to_xlsx, google_account, load_config
+from streaming import download_page_rows
+from telemetry import METRICS
+
+DEFAULT_BOUNCE_WATCHER = {
+    "ENABLED": False,          # add a watch job per campaign to the scheduler
+    "POLL_MINUTES": 10,        # Gmail history poll interval
+    "SHEET_POLL_MINUTES": 60,  # re-download the sheet this often even without new DSNs
+    "MAX_LEADS_PER_TICK": 50,  # summaries per poll, so a report waits for at most one batch
+}
+
+# campaign id -> {"downloaded_at": monotonic time, "revision": Drive version downloaded,
+#                 "pending": leads left over by the last poll}
+_watch_state = {}
+_watch_lock = threading.Lock()
+
+
+def watcher_settings(config: dict) -> dict:
+    return {**DEFAULT_BOUNCE_WATCHER, **config.get("BOUNCE_WATCHER", {})}
+
+
+def watch_once(campaign_cfg: dict, date_str: str = None) -> dict:
+    """
+    One poll for one campaign (its full config, campaigns.campaign_config).
+    Returns {"new_bounces", "downloaded", "summarised", "skipped"}.
+    """
+    settings = watcher_settings(campaign_cfg)
+    campaign_id = campaign_cfg.get("CAMPAIGN_ID", "default")
+    date_str = date_str or datetime.now().strftime("%d%m%Y")
+    output_dir = Path(campaign_cfg.get("OUTPUT_DIR", "leads_agent_excel_files"))
+    xlsx_path = output_dir / f"{campaign_cfg.get('OUTPUT_PREFIX', 'leads_')}{date_str}.xlsx"
+    result = {"new_bounces": 0, "downloaded": False, "summarised": 0, "skipped": None}
+
+    with _watch_lock:
+        state = _watch_state.setdefault(campaign_id, {"downloaded_at": None, "revision": None, "pending": False})
+    METRICS.inc("bounce_watcher_polls_total", campaign=campaign_id)
+
+    with google_account(campaign_cfg["CREDENTIALS_JSON"], campaign_cfg["TOKEN_JSON"]):
+        if bounce_settings(campaign_cfg)["ENABLED"]:
+            result["new_bounces"] = len(ingest_bounces(campaign_cfg))
+
+        revision = remote_revision(campaign_cfg["SPREADSHEET_ID"], campaign_cfg.get("SCOPES"))
+        if state["downloaded_at"] is None or not xlsx_path.exists():
+            sheet_due = True
+        elif revision is not None:
+            sheet_due = revision != state["revision"]
+        else:
+            sheet_due = time.monotonic() - state["downloaded_at"] >= float(settings["SHEET_POLL_MINUTES"]) * 60
+        if result["new_bounces"] or sheet_due:
+            download_google_sheet_to_xlsx(campaign_cfg["SPREADSHEET_ID"], xlsx_path,
+                                          page_rows=download_page_rows(campaign_cfg), campaign_config=campaign_cfg)
+            state["downloaded_at"] = time.monotonic()
+            state["revision"] = revision
+            state["pending"] = True
+            result["downloaded"] = True
+
+    if not state["pending"]:
+        result["skipped"] = "no_changes"
+        return result
+
+    # Idle time only: a report (or another campaign's poll) holding the model goes first
+    max_leads = int(settings["MAX_LEADS_PER_TICK"])
+    with idle_model() as idle:
+        if not idle:
+            METRICS.inc("bounce_watcher_skipped_total", campaign=campaign_id, reason="model_busy")
+            result["skipped"] = "model_busy"
+            return result
+        gen = ReportGenerator(os.path.abspath(MODEL_PATH), campaign_config=campaign_cfg, bot=shared_summary_bot)
+        result["summarised"] = gen.precompute_summaries(xlsx_path, max_leads=max_leads)
+    # A full batch may have left leads behind; the next poll carries on without a new download
+    state["pending"] = result["summarised"] >= max_leads
+    if result["summarised"]:
+        print(f"[OK] Watcher {campaign_id}: {result['summarised']} summaries precomputed "
+              f"({result['new_bounces']} new bounces)")
+    return result
+
+
+def watch_campaigns(config: dict = None, campaign_ids: list = None) -> dict:
+    """One poll of every campaign (or those in campaign_ids), one after another."""
+    config = config or load_config()
+    results = {}
+    for campaign in get_campaigns(config):
+        if campaign_ids and campaign["CAMPAIGN_ID"] not in campaign_ids:
+            continue
+        try:
+            results[campaign["CAMPAIGN_ID"]] = watch_once(campaign_config(config, campaign))
+        except Exception as e:
+            print(f"[ERROR] Watcher poll failed for {campaign['CAMPAIGN_ID']}: {e}")
+            results[campaign["CAMPAIGN_ID"]] = {"error": str(e)}
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Summarise bounces in the background as they arrive")
+    parser.add_argument("--once", action="store_true", help="Poll every campaign once and exit")
+    parser.add_argument("--campaign", nargs="+", default=None, help="Only these CAMPAIGN_IDs")
+    args = parser.parse_args()
+
+    config = load_config()
+    interval = float(watcher_settings(config)["POLL_MINUTES"]) * 60
+    try:
+        while True:
+            results = watch_campaigns(config, args.campaign)
+            if args.once:
+                for campaign_id, result in results.items():
+                    print(f"{campaign_id}: {result}")
+                return 1 if any(r.get("error") for r in results.values()) else 0
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n[STOP] Watcher stopped.")
+        return 130
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Several campaigns (spreadsheet + email template + sender account) in one process.
+
+config.json holds one SPREADSHEET_ID and one EMAIL_CONFIG; each extra campaign
+used to mean another process with its own model load and credentials. With a
+CAMPAIGNS list, every campaign's sheet pull, send, verify and report runs on
+a shared thread pool (EMAIL_CONFIG.PIPELINE_WORKERS) in this process, and the
+campaigns share:
+
+- the credentials cache in main.get_creds (one refresh per account);
+- one SummaryBot (model load), used by one report at a time;
+- the per-account Gmail quota (main.GMAIL_QUOTA), so campaigns sending from
+  the same account stay inside its rate and DAILY_SEND_LIMIT together.
+
+Usage:
+    python campaigns.py send   [DDMMYYYY] [--campaign ID ...]
+    python campaigns.py verify [DDMMYYYY] [--campaign ID ...]
+    python campaigns.py report [DDMMYYYY] [--campaign ID ...]
+
+pipeline_scheduler.py schedules the same stages per campaign.
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from main import (
+    MODEL_PATH, MODEL_ROUTES, SPECULATIVE_DECODING, ReportGenerator, SummaryBot, cancel_escalations,
+    download_google_sheet_to_xlsx, google_account, load_config,
+)
+from lead_history import ingest_history
+from model_router import model_route
+from send_emails import send_emails_to_leads, verify_email_status
+from streaming import download_page_rows
+from telemetry import METRICS
+
+DEFAULT_CAMPAIGN_ID = "default"
+
+# Only one report decodes on the shared model at a time; pulls/sends of other campaigns keep going
+_MODEL_LOCK = threading.Lock()
+_bot = None
+
+
+def get_campaigns(config: dict) -> list:
+    """
+    Campaigns in config["CAMPAIGNS"], as dicts with at least CAMPAIGN_ID and
+    SPREADSHEET_ID. Without CAMPAIGNS, the single top-level sheet is the
+    "default" campaign.
+    """
+    campaigns = config.get("CAMPAIGNS")
+    if not campaigns:
+        return [{"CAMPAIGN_ID": DEFAULT_CAMPAIGN_ID, "SPREADSHEET_ID": config["SPREADSHEET_ID"]}]
+
+    ids = [c["CAMPAIGN_ID"] for c in campaigns]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate CAMPAIGN_ID in CAMPAIGNS: {', '.join(duplicates)}")
+    return campaigns
+
+
+def campaign_config(config: dict, campaign: dict) -> dict:
+    """
+    The full config one campaign runs with: top-level config.json values,
+    overridden by the campaign's keys. EMAIL_CONFIG is merged key by key.
+    Listed campaigns default to OUTPUT_DIR/<CAMPAIGN_ID>, so their sheets, send
+    journals and bounce state never collide.
+    """
+    if not config.get("CAMPAIGNS"):
+        return {**config, "CAMPAIGN_ID": DEFAULT_CAMPAIGN_ID}
+
+    campaign_id = campaign["CAMPAIGN_ID"]
+    merged = {**config, **campaign}
+    merged.pop("CAMPAIGNS", None)
+    merged["EMAIL_CONFIG"] = {**config.get("EMAIL_CONFIG", {}), **campaign.get("EMAIL_CONFIG", {})}
+    if "OUTPUT_DIR" not in campaign:
+        merged["OUTPUT_DIR"] = str(Path(config.get("OUTPUT_DIR", "leads_agent_excel_files")) / campaign_id)
+    return merged
+
+
+def report_id(campaign_cfg: dict, date_str: str) -> str:
+    campaign_id = campaign_cfg.get("CAMPAIGN_ID", DEFAULT_CAMPAIGN_ID)
+    return date_str if campaign_id == DEFAULT_CAMPAIGN_ID else f"{campaign_id}_{date_str}"
+
+
+def _account(campaign_cfg: dict):
+    return google_account(campaign_cfg["CREDENTIALS_JSON"], campaign_cfg["TOKEN_JSON"])
+
+
+def shared_summary_bot() -> SummaryBot:
+    """The process-wide SummaryBot, loaded on first use. Call with _MODEL_LOCK held."""
+    global _bot
+    if _bot is None:
+        model_path = model_route(MODEL_ROUTES, "report_summary", os.path.abspath(MODEL_PATH))["MODEL_PATH"]
+        _bot = SummaryBot(model_path, speculative=SPECULATIVE_DECODING)
+    return _bot
+
+
+@contextmanager
+def idle_model():
+    """Hold the shared model if no report is using it; yields False, without waiting, otherwise."""
+    acquired = _MODEL_LOCK.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _MODEL_LOCK.release()
+
+
+def cancel_reports() -> None:
+    """
+    Stop the summary being generated on the shared model (shutdown / Ctrl+C);
+    the running report raises GenerationCancelled instead of finishing.
+    """
+    if _bot is not None:
+        _bot.cancel()
+    cancel_escalations()
+
+
+def run_send(campaign_cfg: dict, date_str: str) -> dict:
+    with _account(campaign_cfg):
+        return send_emails_to_leads(date_str, config=campaign_cfg)
+
+
+def run_verify(campaign_cfg: dict, date_str: str) -> dict:
+    with _account(campaign_cfg):
+        return verify_email_status(date_str, config=campaign_cfg)
+
+
+def run_report(campaign_cfg: dict, date_str: str) -> Path:
+    """Pull the campaign's sheet, then wait for the shared model and generate its report."""
+    # The report's metrics start here; other campaigns keep recording into METRICS meanwhile
+    run_start = METRICS.checkpoint()
+    with _account(campaign_cfg):
+        output_dir = Path(campaign_cfg.get("OUTPUT_DIR", "leads_agent_excel_files"))
+        xlsx_path = output_dir / f"{campaign_cfg.get('OUTPUT_PREFIX', 'leads_')}{date_str}.xlsx"
+        download_google_sheet_to_xlsx(campaign_cfg["SPREADSHEET_ID"], xlsx_path,
+                                      page_rows=download_page_rows(campaign_cfg), campaign_config=campaign_cfg)
+
+        with _MODEL_LOCK:
+            gen = ReportGenerator(os.path.abspath(MODEL_PATH), campaign_config=campaign_cfg,
+                                  bot=shared_summary_bot)
+            report_path = gen.generate_report_from_xlsx(xlsx_path, report_id(campaign_cfg, date_str), since=run_start)
+    print(f"[OK] Report generated for {campaign_cfg['CAMPAIGN_ID']}: {report_path.resolve()}")
+    ingest_history(campaign_cfg)
+    return report_path
+
+
+STAGES = {"send": run_send, "verify": run_verify, "report": run_report}
+
+
+def run_campaigns(stage: str, date_str: str = None, campaign_ids: list = None, config: dict = None) -> dict:
+    """
+    Run one stage for every campaign (or those in campaign_ids) concurrently.
+    Returns {campaign_id: stage result}; a failing campaign maps to {"error": ...}
+    and does not stop the others.
+    """
+    config = config or load_config()
+    date_str = date_str or datetime.now().strftime("%d%m%Y")
+    campaigns = [campaign_config(config, c) for c in get_campaigns(config)
+                 if not campaign_ids or c["CAMPAIGN_ID"] in campaign_ids]
+    if not campaigns:
+        print(f"[ERROR] No campaigns match {campaign_ids}")
+        return {}
+
+    workers = min(int(config.get("EMAIL_CONFIG", {}).get("PIPELINE_WORKERS", 4)), len(campaigns))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="campaign")
+    try:
+        futures = {c["CAMPAIGN_ID"]: pool.submit(STAGES[stage], c, date_str) for c in campaigns}
+        pool.shutdown(wait=True)
+    except KeyboardInterrupt:
+        # Drop campaigns not started yet and free the model instead of finishing the current report
+        pool.shutdown(wait=False, cancel_futures=True)
+        cancel_reports()
+        raise
+
+    results = {}
+    for campaign_id, future in futures.items():
+        try:
+            results[campaign_id] = future.result()
+        except Exception as e:
+            print(f"[ERROR] {stage} failed for {campaign_id}/{date_str}: {e}")
+            results[campaign_id] = {"error": str(e)}
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run a pipeline stage for every campaign in config.json")
+    parser.add_argument("stage", choices=sorted(STAGES))
+    parser.add_argument("date", nargs="?", default=None, help="DDMMYYYY (default: today)")
+    parser.add_argument("--campaign", nargs="+", default=None, help="Only these CAMPAIGN_IDs")
+    args = parser.parse_args()
+
+    results = run_campaigns(args.stage, args.date, args.campaign)
+    for campaign_id, result in results.items():
+        print(f"{campaign_id}: {result}")
+    return 1 if any(isinstance(r, dict) and r.get("error") for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""
+Lazy, chunked exports of the lead sheet for the dashboard's Download Data page.
+
+The page used to re-download the sheet, build the whole CSV in memory with
+df.to_csv() and read the whole xlsx into memory on every render, even when
+nothing was downloaded. Instead:
+
+- ensure_snapshot() reuses the local OUTPUT_DIR/leads_DDMMYYYY.xlsx while it
+  is current: same Drive revision as when it was pulled (needs the optional
+  drive.metadata.readonly scope in SCOPES), or younger than
+  EXPORT.SNAPSHOT_MAX_AGE_MINUTES without that scope;
+- export() builds a CSV or Parquet file only when asked, streaming the
+  snapshot in CHUNK_ROWS row chunks (lead_loader.iter_sheet_chunks), so peak
+  memory is one chunk regardless of sheet size; xlsx is the snapshot itself;
+- finished exports are cached in OUTPUT_DIR/exports by the snapshot's content
+  hash (its revision), so repeated downloads of an unchanged sheet cost nothing.
+"""
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from main import SCOPES, download_google_sheet_to_xlsx, execute_api, google_service
+from lead_loader import CHUNK_ROWS, iter_sheet_chunks
+from telemetry import METRICS
+
+DEFAULT_EXPORT = {
+    "DIR": "exports",                 # under OUTPUT_DIR
+    "SNAPSHOT_MAX_AGE_MINUTES": 10,   # used when the Drive revision is unavailable
+    "CHUNK_ROWS": CHUNK_ROWS,
+}
+
+DRIVE_METADATA_SCOPE = "https://www.googleapis.com/auth/drive.metadata.readonly"
+
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def export_settings(config: dict) -> dict:
+    settings = {**DEFAULT_EXPORT, **config.get("EXPORT", {})}
+    settings["DIR"] = Path(config.get("OUTPUT_DIR", "leads_agent_excel_files")) / settings["DIR"]
+    return settings
+
+
+# ---------------------------------------------------------------------------
+# Snapshot + revision
+# ---------------------------------------------------------------------------
+
+def _meta_path(xlsx_path: Path) -> Path:
+    return xlsx_path.with_name(xlsx_path.name + ".rev.json")
+
+
+def _file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def remote_revision(spreadsheet_id: str, scopes: list = None):
+    """The sheet's Drive version, or None when SCOPES lacks drive.metadata.readonly."""
+    scopes = scopes or SCOPES
+    if DRIVE_METADATA_SCOPE not in scopes:
+        return None
+    drive = google_service("drive", "v3", scopes)
+    meta = execute_api(drive.files().get(fileId=spreadsheet_id, fields="version"), "drive", "files.get")
+    return str(meta.get("version"))
+
+
+def _read_meta(xlsx_path: Path) -> dict:
+    """Sidecar metadata, if it still describes the file on disk (send/verify rewrite it too)."""
+    try:
+        meta = json.loads(_meta_path(xlsx_path).read_text(encoding="utf-8"))
+        stat = xlsx_path.stat()
+    except (OSError, ValueError):
+        return {}
+    if meta.get("size") != stat.st_size or meta.get("mtime_ns") != stat.st_mtime_ns:
+        return {}
+    return meta
+
+
+def _write_meta(xlsx_path: Path, remote: str) -> dict:
+    stat = xlsx_path.stat()
+    meta = {
+        "content_hash": _file_hash(xlsx_path),
+        "remote_revision": remote,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "downloaded_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+    }
+    _meta_path(xlsx_path).write_text(json.dumps(meta), encoding="utf-8")
+    return meta
+
+
+def ensure_snapshot(config: dict, date_str: str, refresh: bool = False) -> tuple:
+    """
+    (xlsx_path, metadata) for today's local snapshot, downloading the sheet only
+    when forced, missing or stale. metadata["content_hash"] is the revision
+    exports are cached by.
+    """
+    output_dir = Path(config.get("OUTPUT_DIR", "leads_agent_excel_files"))
+    xlsx_path = output_dir / f"{config.get('OUTPUT_PREFIX', 'leads_')}{date_str}.xlsx"
+    settings = export_settings(config)
+
+    remote = remote_revision(config["SPREADSHEET_ID"], config.get("SCOPES"))
+    meta = _read_meta(xlsx_path) if xlsx_path.exists() else {}
+    if xlsx_path.exists() and not refresh:
+        if remote is not None:
+            fresh = meta.get("remote_revision") == remote
+        else:
+            age_s = time.time() - xlsx_path.stat().st_mtime
+            fresh = age_s < float(settings["SNAPSHOT_MAX_AGE_MINUTES"]) * 60
+        if fresh:
+            METRICS.cache("sheet_snapshot", hit=True)
+            return xlsx_path, meta or _write_meta(xlsx_path, remote)
+
+    METRICS.cache("sheet_snapshot", hit=False)
+    download_google_sheet_to_xlsx(config["SPREADSHEET_ID"], xlsx_path, campaign_config=config)
+    return xlsx_path, _write_meta(xlsx_path, remote)
+
+
+# ---------------------------------------------------------------------------
+# Exports
+# ---------------------------------------------------------------------------
+
+def _write_csv(xlsx_path: Path, out_path: Path, chunk_rows: int) -> None:
+    with open(out_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        header_written = False
+        for chunk in iter_sheet_chunks(xlsx_path, chunk_rows=chunk_rows):
+            if not header_written:
+                writer.writerow(chunk.keys())
+                header_written = True
+            writer.writerows(zip(*chunk.values()))
+
+
+def _write_parquet(xlsx_path: Path, out_path: Path, chunk_rows: int) -> None:
+    writer = None
+    try:
+        for chunk in iter_sheet_chunks(xlsx_path, chunk_rows=chunk_rows):
+            # Sheet values are text; cells typed as numbers/dates are kept as their text form
+            table = pa.table({name: pa.array([None if v is None else str(v) for v in values], type=pa.string())
+                              for name, values in chunk.items()})
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema, compression="zstd")
+            writer.write_table(table, row_group_size=chunk_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export(xlsx_path: Path, fmt: str, meta: dict, config: dict) -> Path:
+    """
+    Path of `fmt` ("csv", "parquet" or "xlsx") for this snapshot, building it
+    on first request and reusing it until the snapshot's content changes.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "xlsx":
+        return xlsx_path
+
+    settings = export_settings(config)
+    revision = meta["content_hash"][:16]
+    out_path = settings["DIR"] / f"{xlsx_path.stem}_{revision}.{fmt}"
+    if out_path.exists():
+        METRICS.cache("export", hit=True)
+        return out_path
+
+    METRICS.cache("export", hit=False)
+    settings["DIR"].mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with METRICS.timer("export_build", format=fmt):
+        if fmt == "csv":
+            _write_csv(xlsx_path, tmp, int(settings["CHUNK_ROWS"]))
+        else:
+            _write_parquet(xlsx_path, tmp, int(settings["CHUNK_ROWS"]))
+    os.replace(tmp, out_path)
+
+    # Older revisions of the same snapshot are no longer reachable
+    for old in settings["DIR"].glob(f"{xlsx_path.stem}_*.{fmt}"):
+        if old != out_path:
+            old.unlink(missing_ok=True)
+    return out_path
@@ -0,0 +1,105 @@
+"""
+Per-account Gmail API quota enforcement.
+
+Gmail meters each user (mailbox) in quota units: 250 units per second, with
+messages.send costing 100 units, so at most ~2.5 sends/s per account. There is
+also a daily sending cap (500 for consumer accounts, 2000 for Workspace).
+Campaigns that share an account share that budget, so every Gmail call made
+through main.execute_api draws from one token bucket per account here,
+whichever campaign or thread it comes from.
+
+The limiter is per process: run campaigns in one process (campaigns.py) for
+the budget to be shared.
+"""
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_GMAIL_QUOTA = {
+    "ENABLED": True,
+    "UNITS_PER_SECOND": 250,
+    "BURST_UNITS": 250,
+    "DAILY_SEND_LIMIT": None,  # e.g. 500 (consumer) / 2000 (Workspace); None = unlimited
+}
+
+# https://developers.google.com/gmail/api/reference/quota
+METHOD_UNITS = {
+    "messages.send": 100,
+    "messages.get": 5,
+    "messages.list": 5,
+    "history.list": 2,
+    "users.getProfile": 1,
+}
+DEFAULT_METHOD_UNITS = 5
+
+
+class GmailQuotaExceeded(RuntimeError):
+    """The account's DAILY_SEND_LIMIT has been reached."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() reserves the units immediately (the
+    balance may go negative) and sleeps off the deficit outside the lock, so
+    concurrent callers are served in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float) -> float:
+        """Take `units`, blocking until they are available. Returns seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= units
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class GmailQuota:
+    """One TokenBucket and one daily send counter per account (token file)."""
+
+    def __init__(self, settings: dict = None):
+        self.settings = {**DEFAULT_GMAIL_QUOTA, **(settings or {})}
+        self._buckets = {}
+        self._sends = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, account: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(account)
+            if bucket is None:
+                bucket = self._buckets[account] = TokenBucket(
+                    self.settings["UNITS_PER_SECOND"], self.settings["BURST_UNITS"])
+            return bucket
+
+    def _count_send(self, account: str) -> None:
+        limit = self.settings["DAILY_SEND_LIMIT"]
+        key = (account, datetime.now().strftime("%d%m%Y"))
+        with self._lock:
+            sent = self._sends.get(key, 0)
+            if limit is not None and sent >= limit:
+                raise GmailQuotaExceeded(f"Daily send limit of {limit} reached for {account}")
+            self._sends[key] = sent + 1
+
+    def sends_today(self, account: str) -> int:
+        return self._sends.get((account, datetime.now().strftime("%d%m%Y")), 0)
+
+    def acquire(self, account: str, method: str) -> float:
+        """
+        Wait for the quota units `method` costs on `account`. Returns seconds
+        waited; raises GmailQuotaExceeded for a send past DAILY_SEND_LIMIT.
+        """
+        if not self.settings["ENABLED"]:
+            return 0.0
+        if method == "messages.send":
+            self._count_send(account)
+        return self._bucket(account).acquire(METHOD_UNITS.get(method, DEFAULT_METHOD_UNITS))
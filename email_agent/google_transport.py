@@ -0,0 +1,141 @@
+"""
+Shared, pooled HTTP transport for every Google API client in the package.
+
+build(..., credentials=creds) gives each service object its own httplib2.Http:
+a fresh TLS connection per client, and an object that must not be shared
+between threads. Sheets downloads, Gmail fetches and sends built a new client
+(and paid a new handshake) on every call. Instead, GoogleTransport keeps:
+
+- one connection pool per account (credentials object), shared by all
+  threads: a requests AuthorizedSession with keep-alive and POOL_SIZE
+  connections per host, or an httpx client with HTTP2 when enabled and
+  installed (pip install "httpx[http2]");
+- connect/read timeouts (CONNECT_TIMEOUT / READ_TIMEOUT) on every request;
+- one service object per (API, version, account), built once over that pool.
+
+Both pools expose the httplib2 request() interface googleapiclient expects,
+so callers still use execute_api(service.x().y(...), ...) as before.
+"""
+import threading
+
+import httplib2
+from google.auth.transport.requests import AuthorizedSession, Request
+from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
+
+from telemetry import METRICS
+
+DEFAULT_GOOGLE_TRANSPORT = {
+    "POOL_SIZE": 10,        # connections kept alive per host and account
+    "CONNECT_TIMEOUT": 10,  # seconds
+    "READ_TIMEOUT": 60,     # seconds
+    "HTTP2": False,         # needs httpx[http2]; falls back to HTTP/1.1 keep-alive
+}
+
+
+def _httplib2_response(status: int, reason: str, headers, content: bytes) -> tuple:
+    """(httplib2.Response, content) as googleapiclient expects from Http.request()."""
+    info = {k.lower(): v for k, v in headers.items()}
+    # Both clients decode gzip themselves; httplib2 drops the header after decoding too
+    info.pop("content-encoding", None)
+    info["status"] = status
+    response = httplib2.Response(info)
+    response.reason = reason
+    return response, content
+
+
+class PooledHttp:
+    """httplib2.Http interface over a thread-safe requests AuthorizedSession."""
+
+    def __init__(self, credentials, settings: dict):
+        self.session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(settings["POOL_SIZE"]))
+        self.session.mount("https://", adapter)
+        self.timeout = (float(settings["CONNECT_TIMEOUT"]), float(settings["READ_TIMEOUT"]))
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        resp = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+        return _httplib2_response(resp.status_code, resp.reason, resp.headers, resp.content)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class Http2Http:
+    """httplib2.Http interface over an httpx HTTP/2 client (one multiplexed connection per host)."""
+
+    def __init__(self, credentials, settings: dict):
+        import httpx
+
+        self.credentials = credentials
+        self._auth_request = Request()
+        self.client = httpx.Client(
+            http2=True,
+            timeout=httpx.Timeout(float(settings["READ_TIMEOUT"]), connect=float(settings["CONNECT_TIMEOUT"])),
+            limits=httpx.Limits(max_connections=int(settings["POOL_SIZE"])),
+        )
+        self._refresh_lock = threading.Lock()
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        for attempt in range(2):
+            request_headers = dict(headers or {})
+            with self._refresh_lock:
+                self.credentials.before_request(self._auth_request, method, uri, request_headers)
+            resp = self.client.request(method, uri, content=body, headers=request_headers)
+            if resp.status_code != 401 or attempt:
+                break
+            # Token revoked/expired server-side: refresh once and retry, like AuthorizedSession
+            with self._refresh_lock:
+                self.credentials.refresh(self._auth_request)
+        return _httplib2_response(resp.status_code, resp.reason_phrase, resp.headers, resp.content)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class GoogleTransport:
+    """Connection pools and service objects, shared by every thread in the process."""
+
+    def __init__(self, settings: dict = None):
+        self.settings = {**DEFAULT_GOOGLE_TRANSPORT, **(settings or {})}
+        self._lock = threading.Lock()
+        # Keyed by the credentials object itself (get_creds caches one per account/scopes)
+        self._pools = {}
+        self._services = {}
+
+    def _new_pool(self, credentials):
+        if self.settings["HTTP2"]:
+            try:
+                return Http2Http(credentials, self.settings)
+            except ImportError:
+                print("[INFO] GOOGLE_TRANSPORT.HTTP2 needs httpx[http2]; using HTTP/1.1 keep-alive")
+                self.settings["HTTP2"] = False
+        return PooledHttp(credentials, self.settings)
+
+    def http(self, credentials):
+        with self._lock:
+            pool = self._pools.get(credentials)
+            if pool is None:
+                pool = self._pools[credentials] = self._new_pool(credentials)
+                METRICS.inc("google_http_pools_total", http2=str(isinstance(pool, Http2Http)).lower())
+        return pool
+
+    def service(self, api: str, version: str, credentials):
+        """The API client for (api, version, credentials), built on first use."""
+        key = (api, version, credentials)
+        with self._lock:
+            service = self._services.get(key)
+        METRICS.cache("google_service", hit=service is not None)
+        if service is None:
+            # Static discovery document: no network round trip to build
+            service = build(api, version, http=self.http(credentials), cache_discovery=False, static_discovery=True)
+            with self._lock:
+                service = self._services.setdefault(key, service)
+        return service
+
+    def close(self) -> None:
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+            self._services.clear()
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Indexed history of every send across the daily sheet snapshots and reports.
+
+OUTPUT_DIR keeps a full leads_DDMMYYYY.xlsx per day and excel_leads_daily_list
+a report per day, so a question like "how many 5.1.1 bounces from company X in
+the last 30 days" meant opening every file. LeadHistory keeps one SQLite file
+(LEAD_HISTORY.DB_FILE) that is filled incrementally from every source whose
+size/mtime changed since it was last read, like the suppression index:
+
+- lead sheets (*.xlsx, or their snapshot archive version once evicted,
+  see snapshot_archive.py): one row per send, keyed by (campaign, email,
+  sent_at), so the same send seen in 90 daily snapshots is stored once and
+  later snapshots only fill in what changed (bounce code/reason, status);
+- bounce logs (bounce_log*.jsonl): bounces parsed from Gmail DSNs, merged
+  into their send (same gmail_msg_id, else same email and sent_date: the
+  log's sent_at is the send journal's, seconds off the sheet's). A bounce
+  whose send is not in a sheet yet is stored on its own and folded into the
+  send once a sheet has it;
+- reports (report_*.txt): each entry's category and summary.
+
+sends is indexed on email, (company, sent_date), (bounce_code, sent_date) and
+sent_at. daily_counts keeps sends/bounces per day, campaign, company and
+bounce code, rebuilt for the days a source touched, so trend queries read a
+few thousand pre-aggregated rows instead of every send.
+
+    python lead_history.py ingest
+    python lead_history.py bounces --days 30 --company ACME --code 5.1.1
+    python lead_history.py trend --days 90 --code 5.1.
+    python lead_history.py lead alice@example.com
+"""
+import argparse
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pytz
+
+from lead_loader import TIMEZONE, iter_leads, parse_timestamps
+from main import load_config
+from snapshot_archive import archived_only, is_manifest, snapshot_of
+from suppression import ENTRY_SEPARATOR, normalize_email
+from telemetry import METRICS
+
+DEFAULT_LEAD_HISTORY = {
+    "ENABLED": True,
+    "DB_FILE": "leads_agent_excel_files/lead_history.sqlite",
+    # Scanned recursively (campaign subfolders included)
+    "SOURCE_DIRS": ["leads_agent_excel_files", "excel_leads_daily_list"],
+    "INGEST_AFTER_REPORT": True,  # bring the DB up to date after every report
+}
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    stamp TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sends (
+    campaign TEXT NOT NULL,
+    email TEXT NOT NULL,
+    sent_at TEXT NOT NULL,      -- UTC, 'YYYY-MM-DD HH:MM:SS'
+    sent_date TEXT NOT NULL,    -- Asia/Kolkata calendar day, 'YYYY-MM-DD'
+    lead_id TEXT,
+    first_name TEXT,
+    company TEXT,
+    status TEXT,
+    gmail_msg_id TEXT,
+    bounce_code TEXT,
+    bounce_reason TEXT,
+    verified_at TEXT,
+    first_seen TEXT,            -- first / last snapshot day the send appeared in
+    last_seen TEXT,
+    PRIMARY KEY (campaign, email, sent_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sends_email ON sends (email);
+CREATE INDEX IF NOT EXISTS sends_company ON sends (company, sent_date);
+CREATE INDEX IF NOT EXISTS sends_bounce_code ON sends (bounce_code, sent_date);
+CREATE INDEX IF NOT EXISTS sends_sent_at ON sends (sent_at);
+CREATE INDEX IF NOT EXISTS sends_gmail_msg_id ON sends (gmail_msg_id);
+-- bounce-log rows still waiting for their sheet send (LeadHistory._fold_bounce_rows)
+CREATE INDEX IF NOT EXISTS sends_bounce_only ON sends (campaign) WHERE first_seen IS NULL;
+CREATE TABLE IF NOT EXISTS daily_counts (
+    campaign TEXT NOT NULL,
+    sent_date TEXT NOT NULL,
+    company TEXT NOT NULL,      -- '' = none
+    bounce_code TEXT NOT NULL,  -- '' = none
+    sends INTEGER NOT NULL,
+    bounces INTEGER NOT NULL,
+    PRIMARY KEY (sent_date, campaign, company, bounce_code)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS daily_counts_company ON daily_counts (company, sent_date);
+CREATE INDEX IF NOT EXISTS daily_counts_bounce_code ON daily_counts (bounce_code, sent_date);
+CREATE TABLE IF NOT EXISTS report_entries (
+    campaign TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    email TEXT NOT NULL,
+    lead_id TEXT NOT NULL,
+    company TEXT,
+    status TEXT,
+    category TEXT,
+    summary TEXT,
+    PRIMARY KEY (campaign, report_date, email, lead_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS report_entries_email ON report_entries (email);
+CREATE INDEX IF NOT EXISTS report_entries_category ON report_entries (category, report_date);
+"""
+
+SEND_COLUMNS = ["campaign", "email", "sent_at", "sent_date", "lead_id", "first_name", "company", "status",
+                "gmail_msg_id", "bounce_code", "bounce_reason", "verified_at", "first_seen", "last_seen"]
+# Later sources fill in values; an empty value never overwrites a known one
+UPSERT_SENDS = (
+    f"INSERT INTO sends ({', '.join(SEND_COLUMNS)}) VALUES ({', '.join('?' * len(SEND_COLUMNS))}) "
+    "ON CONFLICT (campaign, email, sent_at) DO UPDATE SET "
+    + ", ".join(f"{c} = coalesce(excluded.{c}, {c})" for c in SEND_COLUMNS[4:12])
+    + ", first_seen = min(coalesce(excluded.first_seen, first_seen), coalesce(first_seen, excluded.first_seen))"
+    + ", last_seen = max(coalesce(excluded.last_seen, last_seen), coalesce(last_seen, excluded.last_seen))"
+)
+BOUNCED = "(bounce_code IS NOT NULL OR bounce_reason IS NOT NULL)"
+# A bounce-log row (b, never seen in a sheet) and the sheet send (s) it belongs to
+SAME_SEND = (
+    "s.campaign = b.campaign AND s.sent_at != b.sent_at AND s.first_seen IS NOT NULL AND "
+    "(s.gmail_msg_id = b.gmail_msg_id OR ((s.gmail_msg_id IS NULL OR b.gmail_msg_id IS NULL) "
+    "AND s.email = b.email AND s.sent_date = b.sent_date))"
+)
+
+DATE_IN_NAME = re.compile(r"(\d{2})(\d{2})(\d{4})\.(?:xlsx|txt|json)$")
+REPORT_NAME = re.compile(r"^report_(?:(?P<campaign>.+)_)?\d{8}\.txt$")
+REPORT_FIELD = re.compile(r"^(LEAD ID|NAME|COMPANY|EMAIL|STATUS|CATEGORY): (.*)$", re.MULTILINE)
+REPORT_SUMMARY = re.compile(r"^BOUNCE_REASON_SUMMARY:\n(.*)", re.MULTILINE | re.DOTALL)
+
+_lock = threading.Lock()
+
+
+def history_settings(config: dict) -> dict:
+    return {**DEFAULT_LEAD_HISTORY, **config.get("LEAD_HISTORY", {})}
+
+
+def _text(value):
+    """None for missing/blank cells and the "none"/"null" placeholders the report also ignores."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    value = str(value).strip()
+    return None if value.lower() in ("", "none", "null", "nan") else value
+
+
+def _file_date(path: Path):
+    """'YYYY-MM-DD' from a ..._DDMMYYYY.xlsx/.txt name, or None."""
+    m = DATE_IN_NAME.search(path.name)
+    if not m:
+        return None
+    day, month, year = m.groups()
+    return f"{year}-{month}-{day}"
+
+
+def _campaign(path: Path, root: Path) -> str:
+    """Campaign of a source: its subfolder of the source dir (campaigns.py layout), else "default"."""
+    if is_manifest(path):
+        path = snapshot_of(path)
+    parts = path.relative_to(root).parts
+    return parts[0] if len(parts) > 1 else "default"
+
+
+class LeadHistory:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the dashboard's threads; writes are serialised by _lock
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise RuntimeError(f"{self.path} has schema version {version}, expected {SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @classmethod
+    def from_config(cls, config: dict) -> "LeadHistory":
+        return cls(history_settings(config)["DB_FILE"])
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # -----------------------------------------------------------------------
+    # Ingestion
+    # -----------------------------------------------------------------------
+
+    def ingest(self, config: dict) -> dict:
+        """
+        Read every source under SOURCE_DIRS whose size/mtime changed since the
+        last ingest. Returns {kind: sources read} plus the send rows written.
+        """
+        settings = history_settings(config)
+        counts = {"sheet": 0, "bounce_log": 0, "report": 0, "rows": 0}
+        with _lock, METRICS.timer("lead_history_ingest"):
+            known = dict(self.conn.execute("SELECT path, stamp FROM sources"))
+            for source, kind, root in self._sources(settings, config):
+                stat = source.stat()
+                stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+                if known.get(str(source)) == stamp:
+                    continue
+                try:
+                    with self.conn:
+                        if kind == "sheet":
+                            rows = self._ingest_sheet(source, config, _campaign(source, root))
+                        elif kind == "bounce_log":
+                            rows = self._ingest_bounce_log(source, _campaign(source, root))
+                        else:
+                            rows = self._ingest_report(source)
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                            (str(source), kind, stamp, rows, datetime.now().astimezone().isoformat(timespec="seconds")),
+                        )
+                except Exception as e:
+                    print(f"[ERROR] Lead history: could not read {source}: {e}")
+                    continue
+                counts[kind] += 1
+                counts["rows"] += rows
+            if counts["sheet"] or counts["bounce_log"]:
+                with self.conn:
+                    self._fold_bounce_rows()
+        METRICS.inc("lead_history_rows_total", counts["rows"])
+        return counts
+
+    @staticmethod
+    def _sources(settings: dict, config: dict) -> list:
+        files = []
+        for folder in settings["SOURCE_DIRS"]:
+            root = Path(folder)
+            if not root.exists():
+                continue
+            sheets = [p for p in root.rglob("*.xlsx") if "exports" not in p.parts and _file_date(p)]
+            # Snapshots evicted by the snapshot archive are read from it (lead_loader)
+            sheets += archived_only(root, config)
+            # Oldest snapshot first, so first_seen/last_seen and fill-ins follow the calendar
+            files += [(p, "sheet", root) for p in sorted(sheets, key=_file_date)]
+            files += [(p, "bounce_log", root) for p in root.rglob("bounce_log*.jsonl")]
+            files += [(p, "report", root) for p in root.rglob("report_*.txt") if _file_date(p)]
+        return files
+
+    def _upsert_sends(self, frame: pd.DataFrame) -> int:
+        """Upsert a frame with SEND_COLUMNS (text values) and refresh daily_counts for its days."""
+        frame = frame[frame["email"].notna() & frame["sent_at"].notna()]
+        if frame.empty:
+            return 0
+        rows = frame[SEND_COLUMNS].astype(object).where(frame[SEND_COLUMNS].notna(), None)
+        self.conn.executemany(UPSERT_SENDS, rows.itertuples(index=False, name=None))
+        self._refresh_daily_counts(sorted(frame["sent_date"].unique()))
+        return len(frame)
+
+    def _refresh_daily_counts(self, days: list) -> None:
+        for start in range(0, len(days), 500):
+            batch = days[start:start + 500]
+            marks = ", ".join("?" * len(batch))
+            self.conn.execute(f"DELETE FROM daily_counts WHERE sent_date IN ({marks})", batch)
+            self.conn.execute(
+                "INSERT INTO daily_counts "
+                "SELECT campaign, sent_date, coalesce(company, ''), coalesce(bounce_code, ''), "
+                f"count(*), sum({BOUNCED}) FROM sends WHERE sent_date IN ({marks}) "
+                "GROUP BY campaign, sent_date, coalesce(company, ''), coalesce(bounce_code, '')",
+                batch,
+            )
+
+    @staticmethod
+    def _send_frame(df: pd.DataFrame, campaign: str, email_col: str, columns: dict) -> pd.DataFrame:
+        """SEND_COLUMNS frame from a typed lead frame; columns maps logical name -> sheet header."""
+        sent_at = parse_timestamps(df[columns["sent_at"]]) if columns["sent_at"] in df.columns else None
+        out = pd.DataFrame(index=df.index)
+        out["campaign"] = campaign
+        out["email"] = df[email_col].map(normalize_email).replace("", None) if email_col in df.columns else None
+        if sent_at is None:
+            out["sent_at"] = out["sent_date"] = None
+        else:
+            out["sent_at"] = sent_at.dt.tz_convert("UTC").dt.strftime("%Y-%m-%d %H:%M:%S")
+            out["sent_date"] = sent_at.dt.strftime("%Y-%m-%d")
+        for name in ["lead_id", "first_name", "company", "status", "gmail_msg_id", "bounce_code", "bounce_reason"]:
+            col = columns.get(name, name)
+            out[name] = df[col].map(_text) if col in df.columns else None
+        verified = columns["verified_at"]
+        if verified in df.columns:
+            out["verified_at"] = parse_timestamps(df[verified]).dt.tz_convert("UTC").dt.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            out["verified_at"] = None
+        return out
+
+    def _ingest_sheet(self, path: Path, config: dict, campaign: str) -> int:
+        email_col = config.get("EMAIL_CONFIG", {}).get("EMAIL_COLUMN", "email")
+        columns = {
+            "sent_at": config.get("COL_SENT_AT", "sent_at"),
+            "verified_at": config.get("COL_VERIFIED_AT", "verified_at"),
+            "bounce_reason": config.get("COL_BOUNCE_REASON", "bounce_reason"),
+            "gmail_msg_id": config.get("COL_GMAIL_MSG_ID", "gmail_msg_id"),
+        }
+        seen_on = _file_date(path)
+        rows = 0
+        # Chunked, so a large sheet never sits in memory whole
+        for df in iter_leads(path, config, consumer="history"):
+            frame = self._send_frame(df, campaign, email_col, columns)
+            frame["first_seen"] = frame["last_seen"] = seen_on
+            rows += self._upsert_sends(frame)
+        return rows
+
+    def _ingest_bounce_log(self, path: Path, campaign: str) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if not entries:
+            return 0
+        df = pd.DataFrame(entries)
+        columns = {"sent_at": "sent_at", "verified_at": "bounced_at"}
+        frame = self._send_frame(df, campaign, "email", columns)
+        frame["first_seen"] = frame["last_seen"] = None
+        # Update the send the bounce belongs to rather than adding a second row a few seconds off
+        frame["sent_at"] = [
+            self._matching_send(campaign, row.email, row.gmail_msg_id, row.sent_date) or row.sent_at
+            for row in frame.itertuples()
+        ]
+        return self._upsert_sends(frame)
+
+    def _matching_send(self, campaign: str, email, gmail_msg_id, sent_date):
+        """sent_at of the stored send with this gmail_msg_id, else of this email's send that day, or None."""
+        if gmail_msg_id:
+            row = self.conn.execute("SELECT sent_at FROM sends WHERE gmail_msg_id = ? AND campaign = ? LIMIT 1",
+                                    (gmail_msg_id, campaign)).fetchone()
+            if row:
+                return row[0]
+        if not email or not sent_date:
+            return None
+        # Another message id the same day is another send
+        row = self.conn.execute(
+            "SELECT sent_at FROM sends WHERE email = ? AND campaign = ? AND sent_date = ? "
+            "AND (gmail_msg_id IS NULL OR ? IS NULL) ORDER BY sent_at LIMIT 1",
+            (email, campaign, sent_date, gmail_msg_id)).fetchone()
+        return row[0] if row else None
+
+    def _fold_bounce_rows(self) -> None:
+        """Merge bounce-log rows ingested before their send's sheet into that send."""
+        pairs = self.conn.execute(
+            "SELECT s.campaign, s.email, s.sent_at, s.sent_date, b.email, b.sent_at, b.sent_date, "
+            "b.gmail_msg_id, b.bounce_code, b.bounce_reason, b.verified_at "
+            f"FROM sends b JOIN sends s ON {SAME_SEND} WHERE b.first_seen IS NULL").fetchall()
+        if not pairs:
+            return
+        self.conn.executemany(
+            "UPDATE sends SET gmail_msg_id = coalesce(gmail_msg_id, ?), bounce_code = coalesce(?, bounce_code), "
+            "bounce_reason = coalesce(?, bounce_reason), verified_at = coalesce(?, verified_at) "
+            "WHERE campaign = ? AND email = ? AND sent_at = ?",
+            [(msg_id, code, reason, verified, campaign, email, sent_at)
+             for campaign, email, sent_at, _, _, _, _, msg_id, code, reason, verified in pairs])
+        self.conn.executemany(
+            "DELETE FROM sends WHERE campaign = ? AND email = ? AND sent_at = ?",
+            sorted({(pair[0], pair[4], pair[5]) for pair in pairs}))
+        self._refresh_daily_counts(sorted({pair[3] for pair in pairs} | {pair[6] for pair in pairs}))
+
+    def _ingest_report(self, path: Path) -> int:
+        m = REPORT_NAME.match(path.name)
+        campaign = (m.group("campaign") if m else None) or "default"
+        report_date = _file_date(path)
+        rows = []
+        for entry in path.read_text(encoding="utf-8").split(ENTRY_SEPARATOR):
+            fields = dict(REPORT_FIELD.findall(entry))
+            email = normalize_email(fields.get("EMAIL"))
+            if not email or email == "n/a":
+                continue
+            summary = REPORT_SUMMARY.search(entry)
+            rows.append((
+                campaign, report_date, email, fields.get("LEAD ID", ""), _text(fields.get("COMPANY")),
+                _text(fields.get("STATUS")), _text((fields.get("CATEGORY") or "").lower()),
+                " ".join(summary.group(1).split()) if summary else None,
+            ))
+        self.conn.execute("DELETE FROM report_entries WHERE campaign = ? AND report_date = ?", (campaign, report_date))
+        self.conn.executemany("INSERT OR REPLACE INTO report_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _since(days: int) -> str:
+        return (datetime.now(pytz.timezone(TIMEZONE)).date() - timedelta(days=days - 1)).isoformat()
+
+    @staticmethod
+    def _filters(company=None, bounce_code=None, campaign=None) -> tuple:
+        """WHERE clauses for daily_counts/sends. A bounce_code ending in "." matches the prefix."""
+        clauses, params = [], []
+        if company:
+            clauses.append("company = ?")
+            params.append(company)
+        if bounce_code:
+            if bounce_code.endswith("."):
+                # Prefix as a range, so the bounce_code index still applies
+                clauses.append("bounce_code >= ? AND bounce_code < ?")
+                params += [bounce_code, bounce_code[:-1] + chr(ord(bounce_code[-1]) + 1)]
+            else:
+                clauses.append("bounce_code = ?")
+                params.append(bounce_code)
+        if campaign:
+            clauses.append("campaign = ?")
+            params.append(campaign)
+        return clauses, params
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        """Ad hoc SQL over sends / daily_counts / report_entries."""
+        with METRICS.timer("lead_history_query"):
+            return pd.read_sql_query(sql, self.conn, params=list(params))
+
+    def bounce_counts(self, days: int = 30, company: str = None, bounce_code: str = None, campaign: str = None,
+                      by: str = None) -> pd.DataFrame:
+        """
+        Sends and bounces of the last `days` days (today included), optionally
+        grouped by "day", "company", "bounce_code" or "campaign". With a
+        bounce_code filter, "sends" counts sends with that code.
+        """
+        groups = {None: None, "day": "sent_date", "company": "company", "bounce_code": "bounce_code",
+                  "campaign": "campaign"}
+        if by not in groups:
+            raise ValueError(f"Unknown grouping: {by}")
+        clauses, params = self._filters(company, bounce_code, campaign)
+        where = " AND ".join(["sent_date >= ?"] + clauses)
+        column = groups[by]
+        select = f"{column} AS {by}, " if column else ""
+        sql = (f"SELECT {select}sum(sends) AS sends, sum(bounces) AS bounces FROM daily_counts "
+               f"WHERE {where}" + (f" GROUP BY {column} ORDER BY {column}" if column else ""))
+        df = self.query(sql, [self._since(days)] + params)
+        return df.fillna({"sends": 0, "bounces": 0}).astype({"sends": int, "bounces": int})
+
+    def trend(self, days: int = 90, company: str = None, bounce_code: str = None, campaign: str = None) -> pd.DataFrame:
+        """Daily sends/bounces over the last `days` days, one row per day (days without sends are 0)."""
+        counts = self.bounce_counts(days, company, bounce_code, campaign, by="day").set_index("day")
+        index = pd.date_range(self._since(days), periods=days, freq="D").strftime("%Y-%m-%d")
+        out = counts.reindex(index, fill_value=0)
+        out.index.name = "day"
+        out["bounce_rate"] = (out["bounces"] / out["sends"].where(out["sends"] > 0)).fillna(0.0)
+        return out.reset_index()
+
+    def lead(self, email: str) -> tuple:
+        """(sends, report entries) of one address, newest first."""
+        email = normalize_email(email)
+        sends = self.query("SELECT * FROM sends WHERE email = ? ORDER BY sent_at DESC", [email])
+        entries = self.query("SELECT * FROM report_entries WHERE email = ? ORDER BY report_date DESC", [email])
+        return sends, entries
+
+    def companies(self) -> list:
+        return [r[0] for r in self.conn.execute(
+            "SELECT DISTINCT company FROM daily_counts WHERE company != '' ORDER BY company")]
+
+    def summary(self) -> dict:
+        row = self.conn.execute(
+            "SELECT count(*), min(sent_date), max(sent_date) FROM sends").fetchone()
+        sources = dict(self.conn.execute("SELECT kind, count(*) FROM sources GROUP BY kind"))
+        return {"sends": row[0], "first_day": row[1], "last_day": row[2], "sources": sources}
+
+
+def ingest_history(config: dict) -> dict:
+    """Bring the history DB up to date after a report (no-op unless ENABLED and INGEST_AFTER_REPORT)."""
+    settings = history_settings(config)
+    if not (settings["ENABLED"] and settings["INGEST_AFTER_REPORT"]):
+        return {}
+    history = LeadHistory.from_config(config)
+    try:
+        return history.ingest(config)
+    except Exception as e:
+        # The report is already written; the next ingest catches up
+        print(f"[ERROR] Lead history ingest failed: {e}")
+        return {}
+    finally:
+        history.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Query the lead history across daily snapshots and reports")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("ingest", help="Read new or changed sheets, bounce logs and reports")
+    for name in ("bounces", "trend"):
+        p = sub.add_parser(name)
+        p.add_argument("--days", type=int, default=30 if name == "bounces" else 90)
+        p.add_argument("--company", default=None)
+        p.add_argument("--code", default=None, help='Bounce code, or a prefix ending in "." (e.g. 5.1.)')
+        p.add_argument("--campaign", default=None)
+        if name == "bounces":
+            p.add_argument("--by", choices=["day", "company", "bounce_code", "campaign"], default=None)
+    p = sub.add_parser("lead", help="Every send and report entry of one address")
+    p.add_argument("email")
+    args = parser.parse_args()
+
+    config = load_config()
+    history = LeadHistory.from_config(config)
+    if args.command == "ingest":
+        print(f"[OK] Ingested: {history.ingest(config)}")
+        print(f"[OK] History: {history.summary()}")
+    elif args.command == "bounces":
+        print(history.bounce_counts(args.days, args.company, args.code, args.campaign, by=args.by).to_string(index=False))
+    elif args.command == "trend":
+        print(history.trend(args.days, args.company, args.code, args.campaign).to_string(index=False))
+    else:
+        sends, entries = history.lead(args.email)
+        print(sends.to_string(index=False) if not sends.empty else "[INFO] No sends")
+        print(entries.to_string(index=False) if not entries.empty else "[INFO] No report entries")
+    history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
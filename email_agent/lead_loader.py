@@ -0,0 +1,185 @@
+"""
+Typed, column-projected loading of the downloaded lead sheets.
+
+pd.read_excel(xlsx_path) loads every column as object dtype (one Python str
+per cell). Each consumer only needs a few columns, so load_leads():
+
+- streams the sheet (openpyxl read-only) and keeps only the columns the
+  consumer declares (CONSUMER_COLUMNS), so other cells never become Python
+  objects (pd.read_excel materialises every cell before usecols applies);
+- stores text as Arrow-backed strings and low-cardinality columns
+  (status, company, bounce_code) as categoricals;
+- parses sent_at / verified_at once, with a fixed format, into tz-aware
+  Asia/Kolkata timestamps.
+
+iter_leads() yields the same typed frames chunk by chunk, for sheets too
+large to hold at once (STREAMING, see streaming.py).
+
+Column names follow config.json (EMAIL_COLUMN, COL_SENT_AT, ...).
+"""
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+from openpyxl import load_workbook
+
+from snapshot_archive import is_manifest, iter_manifest_chunks
+
+TIMEZONE = "Asia/Kolkata"
+# Sheet timestamps are ISO 8601 (datetime.isoformat()); naive values are read as UTC
+TIMESTAMP_FORMAT = "ISO8601"
+
+STRING = pd.StringDtype("pyarrow")
+
+# Rows buffered as Python objects before each column chunk is converted to Arrow
+CHUNK_ROWS = 50000
+
+# Columns each consumer reads (None = every column in the sheet)
+CONSUMER_COLUMNS = {
+    "send": ["email", "lead_id", "first_name", "last_name", "company"],
+    "verify": ["email", "lead_id", "bounce_code", "bounce_reason", "sent_at", "gmail_msg_id", "verified_at"],
+    "report": ["lead_id", "email", "first_name", "company", "status", "sent_at", "gmail_msg_id",
+               "bounce_code", "bounce_reason", "verified_at"],
+    "dashboard": ["lead_id", "first_name", "email", "company", "status", "sent_at", "bounce_reason",
+                  "verified_at"],
+    "history": ["lead_id", "first_name", "email", "company", "status", "sent_at", "gmail_msg_id",
+                "bounce_code", "bounce_reason", "verified_at"],
+    "all": None,
+}
+
+
+def _column_names(config: dict) -> dict:
+    """Logical column -> sheet header, per config.json."""
+    return {
+        "email": config.get("EMAIL_CONFIG", {}).get("EMAIL_COLUMN", "email"),
+        "sent_at": config.get("COL_SENT_AT", "sent_at"),
+        "verified_at": config.get("COL_VERIFIED_AT", "verified_at"),
+        "bounce_reason": config.get("COL_BOUNCE_REASON", "bounce_reason"),
+        "gmail_msg_id": config.get("COL_GMAIL_MSG_ID", "gmail_msg_id"),
+    }
+
+
+def lead_schema(config: dict) -> dict:
+    """Sheet header -> "string" | "category" | "timestamp"."""
+    names = _column_names(config)
+    schema = {
+        "lead_id": "string",
+        "first_name": "string",
+        "last_name": "string",
+        "company": "category",
+        "status": "category",
+        "bounce_code": "category",
+    }
+    schema.update({
+        names["email"]: "string",
+        names["bounce_reason"]: "string",
+        names["gmail_msg_id"]: "string",
+        names["sent_at"]: "timestamp",
+        names["verified_at"]: "timestamp",
+    })
+    return schema
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """Parse ISO 8601 strings (mixed offsets allowed) into Asia/Kolkata timestamps."""
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        return values.dt.tz_convert(TIMEZONE)
+    return pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors="coerce", utc=True).dt.tz_convert(TIMEZONE)
+
+
+def _to_arrow(values: list) -> pa.Array:
+    try:
+        return pa.array(values, type=pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Numeric/date cells typed in by hand
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def iter_sheet_chunks(xlsx_path: Path, usecols=None, chunk_rows: int = CHUNK_ROWS):
+    """
+    Stream the first tab as {header: [cell values]} chunks of up to chunk_rows
+    rows, keeping only headers in usecols (None = all). Fully empty rows are
+    skipped; a sheet without data rows yields one empty chunk, so the headers
+    are still known. Only one chunk of Python objects is alive at a time.
+    A version manifest of the snapshot archive is read from the archive.
+    """
+    if is_manifest(xlsx_path):
+        yield from iter_manifest_chunks(xlsx_path, usecols, chunk_rows)
+        return
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        picked = [(i, str(h)) for i, h in enumerate(header)
+                  if h is not None and (usecols is None or str(h) in usecols)]
+        chunk = {name: [] for _, name in picked}
+        buffered, yielded = 0, False
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            for i, name in picked:
+                chunk[name].append(row[i] if i < len(row) else None)
+            buffered += 1
+            if buffered == chunk_rows:
+                yield chunk
+                chunk = {name: [] for _, name in picked}
+                buffered, yielded = 0, True
+        if buffered or not yielded:
+            yield chunk
+    finally:
+        wb.close()
+
+
+def _read_columns(xlsx_path: Path, usecols) -> dict:
+    """{header: Arrow string array} for the first tab, converted chunk by chunk."""
+    chunks = {}
+    for chunk in iter_sheet_chunks(xlsx_path, usecols):
+        for name, values in chunk.items():
+            parts = chunks.setdefault(name, [])
+            if values:
+                parts.append(_to_arrow(values))
+    return {name: pa.chunked_array(parts, type=pa.string()) for name, parts in chunks.items()}
+
+
+def _usecols(config: dict, consumer: str):
+    names = _column_names(config)
+    wanted = CONSUMER_COLUMNS[consumer]
+    return None if wanted is None else {names.get(c, c) for c in wanted}
+
+
+def _typed_frame(columns: dict, schema: dict, index=None) -> pd.DataFrame:
+    """DataFrame from {header: Arrow string array}, typed per schema."""
+    data = {}
+    for col, values in columns.items():
+        strings = pd.Series(pd.arrays.ArrowStringArray(values), index=index)
+        kind = schema.get(col, "string")
+        if kind == "timestamp":
+            data[col] = parse_timestamps(strings)
+        elif kind == "category":
+            data[col] = strings.astype("category")
+        else:
+            data[col] = strings
+    return pd.DataFrame(data, index=index)
+
+
+def load_leads(xlsx_path: Path, config: dict, consumer: str = "all") -> pd.DataFrame:
+    """
+    Load the first tab of a downloaded lead sheet with only `consumer`'s columns,
+    typed per lead_schema(). Columns missing from the sheet are simply absent.
+    """
+    return _typed_frame(_read_columns(xlsx_path, _usecols(config, consumer)), lead_schema(config))
+
+
+def iter_leads(xlsx_path: Path, config: dict, consumer: str = "all", chunk_rows: int = CHUNK_ROWS):
+    """
+    load_leads() in frames of up to chunk_rows rows (streaming.py). The index
+    continues across chunks, so it is the row position in the whole sheet.
+    Categorical columns get per-chunk categories.
+    """
+    schema = lead_schema(config)
+    start = 0
+    for chunk in iter_sheet_chunks(xlsx_path, _usecols(config, consumer), chunk_rows):
+        rows = len(next(iter(chunk.values()), []))
+        index = pd.RangeIndex(start, start + rows)
+        yield _typed_frame({name: _to_arrow(values) for name, values in chunk.items()}, schema, index)
+        start += rows
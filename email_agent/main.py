@@ -13,21 +13,44 @@ Notes:
 import os
 import sys
 import json
+import argparse
 import signal
+import threading
+import contextvars
 import datetime as dt
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta
 
-import pandas as pd
 import pytz
 from openpyxl import Workbook
 
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaGrammar
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+
+# Shared helpers (telemetry, ...) live at the repository root next to the CodingBot app
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from telemetry import METRICS, count_prompt_tokens, instrument_completion
+from cancellation import cancellable
+from speculative import DEFAULT_SPECULATIVE, build_draft_model
+from hw_profile import llama_settings
+from model_router import model_route, routed
+from report_sharding import DEFAULT_REPORT_SHARDS, ShardPool
+from bounce_clustering import clustering_settings, cluster_leads, shared_embedder
+from gmail_quota import GmailQuota
+from google_transport import GoogleTransport
+from report_prefetch import prefetch_settings, prefetched
+from streaming import download_page_rows, lead_chunks, summary_batches
+from snapshot_archive import archive_settings, archive_snapshot
+import profiling
+from report_state import DEFAULT_REPORT_STATE, ReportState, lead_key, report_state_path, settings_fingerprint
+from structured_summary import (
+    DEFAULT_STRUCTURED_SUMMARY, STOP_SEQUENCES, build_structured_query, build_summary_grammar,
+    max_summary_tokens, parse_structured_summary, validate_summary,
+)
 
 # -----------------------------
 # CONFIG - Load from JSON
@@ -53,36 +76,135 @@ ENABLE_GMAIL_PULL = config["ENABLE_GMAIL_PULL"]
 GMAIL_SCOPES = config["GMAIL_SCOPES"]
 COL_GMAIL_MSG_ID = config["COL_GMAIL_MSG_ID"]
 MAX_GMAIL_BODY_CHARS = config["MAX_GMAIL_BODY_CHARS"]
+SPECULATIVE_DECODING = config.get("SPECULATIVE_DECODING", {})
+STRUCTURED_SUMMARY = {**DEFAULT_STRUCTURED_SUMMARY, **config.get("STRUCTURED_SUMMARY", {})}
+REPORT_SHARDS = {**DEFAULT_REPORT_SHARDS, **config.get("REPORT_SHARDS", {})}
+BOUNCE_CLUSTERING = clustering_settings(config.get("BOUNCE_CLUSTERING", {}))
+# Task -> GGUF (model_router.py); the report_summary route defaults to MODEL_PATH
+MODEL_ROUTES = config.get("MODEL_ROUTES", {})
+# Shared by every thread/campaign in this process, one bucket per account
+GMAIL_QUOTA = GmailQuota(config.get("GMAIL_QUOTA"))
+# Pooled keep-alive connections and API clients, shared the same way
+GOOGLE_TRANSPORT = GoogleTransport(config.get("GOOGLE_TRANSPORT"))
 # -----------------------------
 
+# Google account the current thread/campaign acts as: (credentials file, token file)
+_ACCOUNT = contextvars.ContextVar("google_account", default=(CREDENTIALS_JSON, TOKEN_JSON))
 
-def get_creds(scopes, credentials_path=CREDENTIALS_JSON, token_path=TOKEN_JSON) -> Credentials:
-    creds = None
-    if os.path.exists(token_path):
-        creds = Credentials.from_authorized_user_file(token_path, scopes)
+# Credentials shared across threads/campaigns, per (token file, scopes)
+_CREDS_CACHE = {}
+_CREDS_LOCK = threading.Lock()
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if not os.path.exists(credentials_path):
-                raise FileNotFoundError(f"Missing {credentials_path}")
-            flow = InstalledAppFlow.from_client_secrets_file(credentials_path, scopes)
-            creds = flow.run_local_server(port=0)
-        with open(token_path, "w", encoding="utf-8") as f:
-            f.write(creds.to_json())
+
+@contextmanager
+def google_account(credentials_path: str, token_path: str):
+    """
+    Run Google calls in this block as another account (campaigns with their own
+    TOKEN_JSON). get_creds() and the Gmail quota both key on the token file.
+    """
+    token = _ACCOUNT.set((credentials_path, token_path))
+    try:
+        yield
+    finally:
+        _ACCOUNT.reset(token)
+
+
+def get_creds(scopes, credentials_path=None, token_path=None) -> Credentials:
+    default_credentials, default_token = _ACCOUNT.get()
+    credentials_path = credentials_path or default_credentials
+    token_path = token_path or default_token
+    key = (os.path.abspath(token_path), tuple(sorted(scopes)))
+
+    # One lock for all accounts: refreshes and the consent flow run one at a time
+    with METRICS.timer("google_auth"), _CREDS_LOCK:
+        creds = _CREDS_CACHE.get(key)
+        if creds is None and os.path.exists(token_path):
+            creds = Credentials.from_authorized_user_file(token_path, scopes)
+
+        # A still-valid cached/stored token counts as a credentials cache hit
+        METRICS.cache("google_credentials", hit=bool(creds and creds.valid))
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                if not os.path.exists(credentials_path):
+                    raise FileNotFoundError(f"Missing {credentials_path}")
+                flow = InstalledAppFlow.from_client_secrets_file(credentials_path, scopes)
+                creds = flow.run_local_server(port=0)
+            with open(token_path, "w", encoding="utf-8") as f:
+                f.write(creds.to_json())
+        _CREDS_CACHE[key] = creds
 
     return creds
 
 
-def download_google_sheet_to_xlsx(spreadsheet_id: str, out_path: Path) -> None:
+def google_service(api: str, version: str, scopes):
+    """API client for the current account, on the shared pooled transport (google_transport.py)."""
+    return GOOGLE_TRANSPORT.service(api, version, get_creds(scopes))
+
+
+def execute_api(request, api: str, method: str):
+    """
+    Execute a googleapiclient request, counting calls, errors and latency per API method.
+    Gmail calls first wait for the current account's quota (GMAIL_QUOTA).
+    """
+    if api == "gmail":
+        waited = GMAIL_QUOTA.acquire(_ACCOUNT.get()[1], method)
+        if waited:
+            METRICS.observe("gmail_quota_wait", waited, method=method)
+    METRICS.inc("google_api_calls_total", api=api, method=method)
+    try:
+        with METRICS.timer("google_api_call", api=api, method=method):
+            return request.execute()
+    except Exception:
+        METRICS.inc("google_api_errors_total", api=api, method=method)
+        raise
+
+
+def download_google_sheet_to_xlsx(spreadsheet_id: str, out_path: Path, page_rows: int = None,
+                                  campaign_config: dict = None) -> None:
     """
     Pull all tabs via Sheets API (values) and write to a local .xlsx.
+    With page_rows (STREAMING, see streaming.download_page_rows) each tab is
+    fetched that many rows at a time into a write-only workbook. With
+    SNAPSHOT_ARCHIVE in campaign_config (default: config.json) the new
+    snapshot is then archived (snapshot_archive.py).
     """
-    creds = get_creds(SCOPES)
-    service = build("sheets", "v4", credentials=creds)
+    campaign_config = campaign_config or config
+    with METRICS.timer("pipeline_stage", stage="sheet_download"):
+        if page_rows:
+            _download_google_sheet_paged(spreadsheet_id, out_path, int(page_rows))
+        else:
+            _download_google_sheet_to_xlsx(spreadsheet_id, out_path)
+    if archive_settings(campaign_config)["ENABLED"]:
+        # The xlsx is written either way; a failed archive only means it is kept as-is
+        try:
+            with METRICS.timer("snapshot_archive"):
+                archive_snapshot(Path(out_path), campaign_config)
+        except Exception as e:
+            print(f"[ERROR] Snapshot archive failed for {out_path}: {e}")
+
 
-    meta = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+def _save_workbook(wb: Workbook, out_path: Path) -> None:
+    """
+    Save next to out_path and rename over it, so readers (verify, report, the
+    bounce watcher's own rewrites) never open a half-written sheet.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # Per writer: two downloads of the same day's sheet may overlap
+    tmp = out_path.with_name(f"{out_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        wb.save(tmp)
+        os.replace(tmp, out_path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _download_google_sheet_to_xlsx(spreadsheet_id: str, out_path: Path) -> None:
+    service = google_service("sheets", "v4", SCOPES)
+
+    meta = execute_api(service.spreadsheets().get(spreadsheetId=spreadsheet_id), "sheets", "spreadsheets.get")
     sheets = meta.get("sheets", [])
     if not sheets:
         raise RuntimeError("Spreadsheet has no tabs.")
@@ -95,18 +217,60 @@ def download_google_sheet_to_xlsx(spreadsheet_id: str, out_path: Path) -> None:
         title = sh["properties"]["title"]
         ws = ws0 if i == 0 else wb.create_sheet(title=title)
 
-        resp = service.spreadsheets().values().get(
+        resp = execute_api(service.spreadsheets().values().get(
             spreadsheetId=spreadsheet_id,
             range=title
-        ).execute()
+        ), "sheets", "values.get")
         values = resp.get("values", [])
 
         for r_idx, row in enumerate(values, start=1):
             for c_idx, cell in enumerate(row, start=1):
                 ws.cell(row=r_idx, column=c_idx, value=cell)
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    wb.save(out_path)
+    _save_workbook(wb, out_path)
+
+
+def _sheet_rows_paged(service, spreadsheet_id: str, properties: dict, page_rows: int):
+    """
+    Rows of one tab, page_rows at a time by A1 row range. The API drops
+    trailing empty rows of a range, so a short page is padded with empty rows
+    unless it is the last one (the tab's rowCount, or a short page when the
+    grid size is unknown).
+    """
+    quoted = "'" + properties["title"].replace("'", "''") + "'"
+    row_count = properties.get("gridProperties", {}).get("rowCount")
+    start = 1
+    while row_count is None or start <= row_count:
+        end = start + page_rows - 1
+        resp = execute_api(service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=f"{quoted}!{start}:{end}"
+        ), "sheets", "values.get")
+        values = resp.get("values", [])
+        yield from values
+        if len(values) < page_rows:
+            if row_count is None:
+                return
+            yield from ([] for _ in range(min(end, row_count) - start + 1 - len(values)))
+        start = end + 1
+
+
+def _download_google_sheet_paged(spreadsheet_id: str, out_path: Path, page_rows: int) -> None:
+    service = google_service("sheets", "v4", SCOPES)
+
+    meta = execute_api(service.spreadsheets().get(spreadsheetId=spreadsheet_id), "sheets", "spreadsheets.get")
+    sheets = meta.get("sheets", [])
+    if not sheets:
+        raise RuntimeError("Spreadsheet has no tabs.")
+
+    # Write-only: rows go straight to the file instead of being kept as cells
+    wb = Workbook(write_only=True)
+    for sh in sheets:
+        ws = wb.create_sheet(title=sh["properties"]["title"])
+        for row in _sheet_rows_paged(service, spreadsheet_id, sh["properties"], page_rows):
+            ws.append(row)
+
+    _save_workbook(wb, out_path)
 
 
 def try_fetch_gmail_message_text(gmail_message_id: str) -> str:
@@ -118,9 +282,9 @@ def try_fetch_gmail_message_text(gmail_message_id: str) -> str:
     if not gmail_message_id or str(gmail_message_id).strip() == "":
         return ""
 
-    creds = get_creds(GMAIL_SCOPES)
-    gmail = build("gmail", "v1", credentials=creds)
-    msg = gmail.users().messages().get(userId="me", id=str(gmail_message_id), format="full").execute()
+    gmail = google_service("gmail", "v1", GMAIL_SCOPES)
+    msg = execute_api(gmail.users().messages().get(userId="me", id=str(gmail_message_id), format="full"),
+                      "gmail", "messages.get")
 
     snippet = msg.get("snippet", "") or ""
     # Full MIME decode is more involved; snippet is usually enough for your use-case.
@@ -131,44 +295,134 @@ def try_fetch_gmail_message_text(gmail_message_id: str) -> str:
 
 
 class SummaryBot:
-    def __init__(self, model_path: str, n_ctx: int = 16384):
+    def __init__(self, model_path: str, n_ctx: int = 16384, speculative: dict = None, n_threads: int = None,
+                 route: str = "report_summary"):
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found: {os.path.abspath(model_path)}")
 
+        # Threads/batch/offload from the tuned hardware profile (python ../hw_profile.py tune)
+        settings = llama_settings(model_path)
+        if n_threads is not None:
+            settings["n_threads"] = settings["n_threads_batch"] = n_threads
+        n_ctx = min(n_ctx, settings.pop("n_ctx", n_ctx))
+
+        # Optional speculative decoding (prompt lookup or a small draft GGUF)
+        self.route = route  # metrics label; escalated summaries are counted separately
+        self.draft_model = build_draft_model(speculative, route=route)
+        if self.draft_model is not None:
+            # Draft verification keeps logits for every position; one lead needs far less than 16k
+            n_ctx = min(n_ctx, {**DEFAULT_SPECULATIVE, **speculative}["N_CTX"])
+
         self.history = [
             {"role": "system", "content": "You are a precise assistant specializing in summarizing email lead status and reasons for no response."}
         ]
 
-        self.llm = Llama(
-            model_path=model_path,
-            n_gpu_layers=-1,
-            n_ctx=n_ctx,
-            n_threads=12,
-            flash_attn=True,
-            verbose=False
-        )
-
-    def chat(self, user_query: str):
+        with METRICS.timer("llm_model_load", route=route):
+            self.llm = Llama(
+                model_path=model_path,
+                n_ctx=n_ctx,
+                draft_model=self.draft_model,
+                verbose=False,
+                **settings
+            )
+        # Set by cancel(): the current summary stops after its next token and chat()
+        # raises GenerationCancelled; stays set until reset_cancel() (e.g. shutdown)
+        self.cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def reset_cancel(self) -> None:
+        self.cancel_event.clear()
+
+    def reset(self) -> None:
+        """Drop everything but the system prompt (fresh context for the next lead)."""
+        self.history = self.history[:1]
+
+    def chat(self, user_query: str, max_tokens: int = 2048, grammar: LlamaGrammar = None,
+             stop: list = None, temperature: float = 0.2):
         self.history.append({"role": "user", "content": user_query})
-        response_stream = self.llm.create_chat_completion(
-            messages=self.history,
-            stream=True,
-            temperature=0.2,
-            max_tokens=2048
+        if self.draft_model is not None:
+            self.draft_model.start()
+        profiler = profiling.active()
+        t0 = profiler.llama_begin(self.llm) if profiler is not None else None
+        response_stream = cancellable(
+            instrument_completion(
+                self.llm.create_chat_completion(
+                    messages=self.history,
+                    stream=True,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    grammar=grammar,
+                    stop=stop or []
+                ),
+                route=self.route,
+                prompt_tokens=count_prompt_tokens(self.llm, self.history),
+            ),
+            self.cancel_event,
+            route=self.route,
+            raise_on_cancel=True,
         )
         full_response = ""
-        for chunk in response_stream:
-            delta = chunk["choices"][0].get("delta", {})
-            if "content" in delta:
-                content = delta["content"]
-                full_response += content
-                yield content
-        self.history.append({"role": "assistant", "content": full_response})
+        try:
+            for chunk in response_stream:
+                delta = chunk["choices"][0].get("delta", {})
+                if "content" in delta:
+                    content = delta["content"]
+                    full_response += content
+                    yield content
+        finally:
+            # Partial output stays in history so the KV cache and the history agree
+            self.history.append({"role": "assistant", "content": full_response})
+            if profiler is not None:
+                profiler.llama_end(self.llm, self.route, t0)
+
+
+# Escalation models (MODEL_ROUTES), loaded on the first escalated summary and kept for the process
+_ESCALATION_BOTS = {}
+_ESCALATION_LOCK = threading.Lock()
+
+
+def escalation_bot(model_path: str, speculative: dict = None) -> SummaryBot:
+    with _ESCALATION_LOCK:
+        if model_path not in _ESCALATION_BOTS:
+            print(f"[INFO] Loading escalation model {os.path.basename(model_path)}")
+            _ESCALATION_BOTS[model_path] = SummaryBot(model_path, speculative=speculative,
+                                                      route="report_summary_escalated")
+        return _ESCALATION_BOTS[model_path]
+
+
+def cancel_escalations() -> None:
+    """Stop summaries running on escalation models (shutdown / Ctrl+C)."""
+    with _ESCALATION_LOCK:
+        for bot in _ESCALATION_BOTS.values():
+            bot.cancel()
 
 
 class ReportGenerator:
-    def __init__(self, model_path: str):
-        self.model_path = model_path
+    def __init__(self, model_path: str, speculative: dict = None, structured: dict = None, shards: dict = None,
+                 campaign_config: dict = None, bot=None, clustering: dict = None):
+        # Sheet columns and bounce files come from the campaign's config (campaigns.py)
+        self.config = campaign_config or config
+        self.col_sent_at = self.config.get("COL_SENT_AT", "sent_at")
+        self.col_verified_at = self.config.get("COL_VERIFIED_AT", "verified_at")
+        self.col_bounce_reason = self.config.get("COL_BOUNCE_REASON", "bounce_reason")
+        self.col_gmail_msg_id = self.config.get("COL_GMAIL_MSG_ID", "gmail_msg_id")
+        self.gmail_pull = self.config.get("ENABLE_GMAIL_PULL", False)
+        # model_path is the default (big) model; MODEL_ROUTES may send summaries to a smaller one
+        self.default_model_path = model_path
+        self.route = model_route(self.config.get("MODEL_ROUTES", {}), "report_summary", model_path)
+        self.model_path = self.route["MODEL_PATH"]
+        # Model to reuse (campaigns share one), or a callable returning it, called only when a
+        # lead needs summarising (reports over precomputed summaries load nothing); per report otherwise
+        self.bot = bot
+        self.speculative = SPECULATIVE_DECODING if speculative is None else speculative
+        self.structured = STRUCTURED_SUMMARY if structured is None else {**DEFAULT_STRUCTURED_SUMMARY, **structured}
+        self.shards = REPORT_SHARDS if shards is None else {**DEFAULT_REPORT_SHARDS, **shards}
+        self.clustering = BOUNCE_CLUSTERING if clustering is None else clustering_settings(clustering)
+        self._grammar = None
+        # Shard workers (REPORT_SHARDS), started by the first sharded batch and kept for the report
+        self._shard_pool = None
 
     @staticmethod
     def format_text_with_line_breaks(text: str, words_per_line: int = 15) -> str:
@@ -178,140 +432,358 @@ class ReportGenerator:
             lines.append(" ".join(words[i:i + words_per_line]))
         return "\n".join(lines)
 
-    @staticmethod
-    def _is_nonempty_bounce_reason(x) -> bool:
-        """
-        The requested change:
-        keep only rows where bounce_reason is NOT None, NOT NaN, NOT "" (after strip).
-        """
-        if x is None:
-            return False
-        # pandas NaN
-        try:
-            if pd.isna(x):
-                return False
-        except Exception:
-            pass
-        s = str(x).strip()
-        return s != "" and s.lower() not in {"none", "null"}
-
-    def generate_report_from_xlsx(self, xlsx_path: Path, report_id: str) -> Path:
-        if not xlsx_path.exists():
-            raise FileNotFoundError(f"Excel file not found: {xlsx_path}")
-
-        df = pd.read_excel(xlsx_path)
-
-        # Time window
-        ist = pytz.timezone("Asia/Kolkata")
-        current_time = datetime.now(ist)
-        last_24hrs = current_time - timedelta(hours=24)
-
-        # Parse timestamps
-        df[COL_SENT_AT] = pd.to_datetime(df[COL_SENT_AT], errors="coerce")
-        # verified_at can be blank; keep as datetime where possible
-        if COL_VERIFIED_AT in df.columns:
-            df[COL_VERIFIED_AT] = pd.to_datetime(df[COL_VERIFIED_AT], errors="coerce")
-
-        # Filter: last 24h + verified
-        filtered = df[df[COL_SENT_AT] > last_24hrs]
-        if COL_VERIFIED_AT in filtered.columns:
-            filtered = filtered[filtered[COL_VERIFIED_AT].notnull()]
-
-        # NEW FILTER: only rows with bounce_reason present
-        if COL_BOUNCE_REASON in filtered.columns:
-            filtered = filtered[filtered[COL_BOUNCE_REASON].apply(self._is_nonempty_bounce_reason)]
-        else:
-            # If column missing, nothing to summarize under your new constraint
-            filtered = filtered.iloc[0:0]
-
-        # Build report
-        report_content = ""
-        report_content += "=" * 117 + "\n"
-        report_content += "OFFICIAL EMAIL LEADS STATUS REPORT\n"
-        report_content += "=" * 117 + "\n"
-        report_content += f"REPORT ID: {report_id}\n"
-        report_content += f"GENERATED ON: {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}\n"
-        report_content += (
-            f"PERIOD: Last 24 Hours (From {last_24hrs.strftime('%Y-%m-%d %H:%M:%S %Z')} "
-            f"to {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')})\n"
-        )
-        report_content += "=" * 117 + "\n\n"
-
-        if filtered.empty:
-            report_content += "No verified leads in the last 24 hours with a non-empty bounce_reason.\n"
-        else:
-            for _, row in filtered.iterrows():
-                bot = SummaryBot(self.model_path)
-
-                gmail_msg_id = row.get(COL_GMAIL_MSG_ID, "N/A")
-                gmail_excerpt = ""
-                if ENABLE_GMAIL_PULL and COL_GMAIL_MSG_ID in filtered.columns:
-                    try:
-                        gmail_excerpt = try_fetch_gmail_message_text(str(gmail_msg_id))
-                    except Exception as e:
-                        gmail_excerpt = f"(Gmail fetch failed: {e})"
-
-                query = f"""Summarize in a professional manner why this lead did not respond, based on the following data:
+    def _build_query(self, row, gmail_excerpt: str) -> str:
+        """Free-form prompt (used when STRUCTURED_SUMMARY is disabled)."""
+        return f"""Summarize in a professional manner why this lead did not respond, based on the following data:
 
 Lead ID: {row.get('lead_id', 'N/A')}
 Email: {row.get('email', 'N/A')}
 First Name: {row.get('first_name', 'N/A')}
 Company: {row.get('company', 'N/A')}
 Status: {row.get('status', 'N/A')}
-Sent At: {row.get(COL_SENT_AT, 'N/A')}
-Gmail Msg ID: {gmail_msg_id}
+Sent At: {row.get(self.col_sent_at, 'N/A')}
+Gmail Msg ID: {row.get(self.col_gmail_msg_id, 'N/A')}
 Bounce Code: {row.get('bounce_code', 'N/A')}
-Bounce Reason: {row.get(COL_BOUNCE_REASON, 'N/A')}
-Verified At: {row.get(COL_VERIFIED_AT, 'N/A')}
+Bounce Reason: {row.get(self.col_bounce_reason, 'N/A')}
+Verified At: {row.get(self.col_verified_at, 'N/A')}
 
 Optional Gmail excerpt (if present):
 {gmail_excerpt}
 
-Provide a short summary focused on the reason for no response. Prefer concrete operational causes (delivery failure, policy blocks, invalid address, etc.) over speculation.
+Provide a short summary focused on the reason for no response. Prefer concrete operational causes (delivery failure, policy blocks, invalid address, etc.) over speculation. Quote the bounce code if there is one.
 """
 
-                full_summary = ""
-                for chunk in bot.chat(query):
-                    full_summary += chunk
+    def _gmail_excerpt(self, row) -> str:
+        """The optional Gmail excerpt for one lead (network; runs on prefetch threads)."""
+        if not (self.gmail_pull and self.col_gmail_msg_id in row.index):
+            return ""
+        try:
+            return try_fetch_gmail_message_text(str(row.get(self.col_gmail_msg_id, "N/A")))
+        except Exception as e:
+            return f"(Gmail fetch failed: {e})"
+
+    def _lead_prompt(self, row) -> str:
+        """Fetch the Gmail excerpt and build the summary prompt for one lead."""
+        gmail_excerpt = self._gmail_excerpt(row)
+        if not self.structured["ENABLED"]:
+            return self._build_query(row, gmail_excerpt)
+        return build_structured_query(
+            row.get("status", "N/A"), row.get("bounce_code", "N/A"), row.get(self.col_bounce_reason, "N/A"),
+            gmail_excerpt,
+        )
+
+    def _summarize(self, bot: SummaryBot, query: str, bounce_code=None):
+        """
+        Run one lead's prompt on the routed model, escalating outputs that fail
+        validate_summary when MODEL_ROUTES has an escalation model.
+        """
+        escalate = None
+        if self.route["ESCALATE_MODEL_PATH"]:
+            def escalate():
+                return self._generate(escalation_bot(self.route["ESCALATE_MODEL_PATH"], self.speculative), query)
+        return routed("report_summary", lambda: self._generate(bot, query),
+                      validate=lambda summary: validate_summary(summary, bounce_code), escalate=escalate)
+
+    def _generate(self, bot: SummaryBot, query: str):
+        """
+        A {"cause", "category", "action"} dict in structured mode, otherwise
+        the free-form summary text.
+        """
+        bot.reset()
+        if not self.structured["ENABLED"]:
+            return "".join(bot.chat(query))
+
+        cause_tokens = self.structured["CAUSE_TOKENS"]
+        action_tokens = self.structured["ACTION_TOKENS"]
+        if self._grammar is None:
+            self._grammar = LlamaGrammar.from_string(build_summary_grammar(cause_tokens, action_tokens), verbose=False)
+        text = "".join(bot.chat(
+            query,
+            max_tokens=max_summary_tokens(cause_tokens, action_tokens),
+            grammar=self._grammar,
+            stop=STOP_SEQUENCES,
+            temperature=0.0,
+        ))
+        return parse_structured_summary(text)
+
+    def lead_summary(self, bot: SummaryBot, row):
+        """Fetch the optional Gmail excerpt and summarise one lead."""
+        return self._summarize(bot, self._lead_prompt(row), row.get("bounce_code"))
+
+    def _embed(self, texts: list):
+        embedder = shared_embedder(self.clustering["EMBEDDING_MODEL_PATH"] or self.model_path,
+                                   n_ctx=int(self.clustering["N_CTX"]))
+        return embedder.embed(texts)
+
+    def _lead_summaries(self, filtered, sharded: bool = True) -> list:
+        """
+        One summary per row of `filtered`, in order. With structured summaries
+        and BOUNCE_CLUSTERING, only the first lead of each bounce cluster is
+        summarised and its summary is used for every member. sharded=False
+        keeps summarising in this process even with REPORT_SHARDS.
+        """
+        clusters = None
+        leads = filtered
+        if self.structured["ENABLED"] and self.clustering["ENABLED"] and len(filtered) > 1:
+            clusters = cluster_leads(filtered, self.col_bounce_reason, self._embed, float(self.clustering["THRESHOLD"]))
+            leads = filtered.loc[[members[0] for members in clusters]]
+
+        if sharded and self.shards["WORKERS"] > 1 and len(leads) > 1:
+            # One pinned model per worker process, loaded once per report; summaries come back in lead order
+            if self._shard_pool is None:
+                self._shard_pool = ShardPool(self.default_model_path, speculative=self.speculative,
+                                             structured=self.structured, shards=self.shards, config=self.config)
+            summaries = self._shard_pool.summarize(leads)
+        else:
+            # One model load per generator (not per summary batch); history is reset per lead
+            if callable(self.bot):
+                self.bot = self.bot()
+            if self.bot is None:
+                self.bot = SummaryBot(self.model_path, speculative=self.speculative)
+            bot = self.bot
+            rows = (row for _, row in leads.iterrows())
+            prefetch = prefetch_settings(self.config)
+            if prefetch["ENABLED"] and self.gmail_pull:
+                # Gmail excerpts and prompts for the next leads are fetched while this one generates
+                prompts = prefetched(rows, self._lead_prompt, prefetch["DEPTH"], prefetch["IO_WORKERS"])
+            else:
+                prompts = ((row, self._lead_prompt(row)) for row in rows)
+            summaries = [self._summarize(bot, query, row.get("bounce_code")) for row, query in prompts]
+
+        if clusters is None:
+            return summaries
+        summary_of = {index: summary for members, summary in zip(clusters, summaries) for index in members}
+        return [summary_of[index] for index in filtered.index]
+
+    def _report_state(self):
+        """The stored summaries (report_state.py), or None with REPORT_STATE off."""
+        if not {**DEFAULT_REPORT_STATE, **self.config.get("REPORT_STATE", {})}["ENABLED"]:
+            return None
+        return ReportState(report_state_path(self.config), settings_fingerprint(self.model_path, self.structured))
+
+    def _state_keys(self, filtered) -> list:
+        """ReportState keys (lead_key) for the rows of `filtered`."""
+        # Everything the prompts are built from; a change re-summarises the lead
+        inputs = ["lead_id", "email", "first_name", "company", "status", self.col_sent_at, self.col_gmail_msg_id,
+                  "bounce_code", self.col_bounce_reason, self.col_verified_at]
+        return [lead_key(row, inputs) for _, row in filtered.iterrows()]
+
+    def _window_summaries(self, filtered, state: ReportState = None, window_keys: list = None) -> list:
+        """
+        Summaries for (a batch of) the report window, reusing those stored by
+        earlier runs (report_state.py) and summarising only leads new since
+        then. The batch's state keys are appended to window_keys; the caller
+        saves the state once the whole window has been seen.
+        """
+        if state is None:
+            return self._lead_summaries(filtered)
+
+        keys = self._state_keys(filtered)
+        reused, missing = state.split(keys)
+        if missing:
+            delta = filtered.iloc[missing]
+            verified_at = delta[self.col_verified_at] if self.col_verified_at in delta.columns else [None] * len(delta)
+            state.update([keys[i] for i in missing], self._lead_summaries(delta), list(verified_at))
+        window_keys.extend(keys)
+        return [state.summaries[k]["summary"] for k in keys]
+
+    def _report_window(self, df, since):
+        """Rows verified, sent after `since` and with a bounce_reason."""
+        filtered = df[df[self.col_sent_at] > since]
+        if self.col_verified_at in filtered.columns:
+            filtered = filtered[filtered[self.col_verified_at].notnull()]
+
+        # NEW FILTER: only rows with bounce_reason present (not NaN, "", "none" or "null")
+        if self.col_bounce_reason in filtered.columns:
+            reason = filtered[self.col_bounce_reason].fillna("").str.strip()
+            return filtered[(reason != "") & ~reason.str.lower().isin(["none", "null"])]
+        # If column missing, nothing to summarize under your new constraint
+        return filtered.iloc[0:0]
+
+    def _window_batches(self, xlsx_path: Path, since):
+        """The report window (_report_window) of the sheet, in the batches it is summarised in."""
+        # Bounces detected from Gmail DSNs (imported here: bounce_ingest imports this module)
+        from bounce_ingest import bounce_settings, load_bounce_log, merge_bounce_log
+        bounce_log = load_bounce_log(self.config) if bounce_settings(self.config)["ENABLED"] else None
+
+        # Typed, projected load: timestamps are parsed once (tz-aware IST) by the loader.
+        # One frame, or CHUNK_ROWS at a time with STREAMING (streaming.py)
+        windows = (
+            self._report_window(df if bounce_log is None else merge_bounce_log(df, self.config, bounce_log), since)
+            for df in lead_chunks(xlsx_path, self.config, "report")
+        )
+        return summary_batches(windows, self.config)
+
+    def precompute_summaries(self, xlsx_path: Path, max_leads: int = None) -> int:
+        """
+        Summarise window leads without a stored summary and save them to the
+        report state, without writing a report (bounce_watcher.py). At most
+        max_leads are summarised; the rest wait for the next call. Returns the
+        number of new summaries.
+        """
+        state = self._report_state()
+        if state is None:
+            print("[INFO] REPORT_STATE is off; there is nowhere to keep precomputed summaries")
+            return 0
+
+        since = datetime.now(pytz.timezone("Asia/Kolkata")) - timedelta(hours=24)
+        window_keys = []
+        done = 0
+        for filtered in self._window_batches(xlsx_path, since):
+            keys = self._state_keys(filtered)
+            window_keys.extend(keys)
+            missing = [i for i, k in enumerate(keys) if k not in state.summaries]
+            if max_leads is not None:
+                missing = missing[:max(0, max_leads - done)]
+            if missing:
+                delta = filtered.iloc[missing]
+                verified_at = (delta[self.col_verified_at] if self.col_verified_at in delta.columns
+                               else [None] * len(delta))
+                # In process: a watcher poll must not start K worker model loads
+                state.update([keys[i] for i in missing], self._lead_summaries(delta, sharded=False),
+                             list(verified_at))
+                done += len(missing)
+                # Saved per batch: summaries survive a stop before the window is done
+                state.save(state.summaries)
+        if window_keys:
+            state.save(window_keys)
+        METRICS.inc("report_summaries_precomputed_total", done)
+        return done
+
+    def _render_entry(self, row, summary) -> str:
+        entry = "-" * 117 + "\n"
+        entry += f"LEAD ID: {row.get('lead_id', 'N/A')}\n"
+        entry += f"NAME: {row.get('first_name', 'N/A')}\n"
+        entry += f"COMPANY: {row.get('company', 'N/A')}\n"
+        entry += f"EMAIL: {row.get('email', 'N/A')}\n"
+        entry += f"STATUS: {row.get('status', 'N/A')}\n"
+        entry += "BOUNCE_REASON_SUMMARY:\n"
+        if isinstance(summary, dict):
+            entry += self.format_text_with_line_breaks(f"CAUSE: {summary['cause']}", words_per_line=15) + "\n"
+            entry += f"CATEGORY: {summary['category'].upper()}\n"
+            entry += self.format_text_with_line_breaks(f"ACTION: {summary['action']}", words_per_line=15) + "\n"
+        else:
+            entry += self.format_text_with_line_breaks(summary, words_per_line=15) + "\n"
+        entry += "-" * 117 + "\n\n"
+        return entry
 
-                formatted_summary = self.format_text_with_line_breaks(full_summary, words_per_line=15)
+    def close_shards(self) -> None:
+        """Shut down the shard workers (and their models) of this report."""
+        if self._shard_pool is not None:
+            self._shard_pool.close()
+            self._shard_pool = None
 
-                report_content += "-" * 117 + "\n"
-                report_content += f"LEAD ID: {row.get('lead_id', 'N/A')}\n"
-                report_content += f"NAME: {row.get('first_name', 'N/A')}\n"
-                report_content += f"COMPANY: {row.get('company', 'N/A')}\n"
-                report_content += f"EMAIL: {row.get('email', 'N/A')}\n"
-                report_content += f"STATUS: {row.get('status', 'N/A')}\n"
-                report_content += "BOUNCE_REASON_SUMMARY:\n"
-                report_content += formatted_summary + "\n"
-                report_content += "-" * 117 + "\n\n"
+    def generate_report_from_xlsx(self, xlsx_path: Path, report_id: str, since: dict = None) -> Path:
+        """
+        Write the report for the sheet at xlsx_path. Its metrics (.prom /
+        .metrics.json) cover what was recorded since the `since` checkpoint
+        (METRICS.checkpoint(), e.g. taken before the download), or this call.
+        """
+        since = since or METRICS.checkpoint()
+        with METRICS.timer("pipeline_stage", stage="report"):
+            try:
+                report_path = self._generate_report_from_xlsx(xlsx_path, report_id)
+            finally:
+                self.close_shards()
+        # Metrics for this run go next to the report
+        METRICS.since(since).write_run_artifacts(report_path.with_suffix(""))
+        return report_path
 
-        report_content += "=" * 117 + "\n"
-        report_content += "END OF REPORT\n"
-        report_content += "=" * 117 + "\n"
+    def _generate_report_from_xlsx(self, xlsx_path: Path, report_id: str) -> Path:
+        if not xlsx_path.exists():
+            raise FileNotFoundError(f"Excel file not found: {xlsx_path}")
+
+        # Time window
+        ist = pytz.timezone("Asia/Kolkata")
+        current_time = datetime.now(ist)
+        last_24hrs = current_time - timedelta(hours=24)
 
         report_dir = Path("excel_leads_daily_list")
         report_dir.mkdir(parents=True, exist_ok=True)
         report_path = report_dir / f"report_{report_id}.txt"
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(report_content)
-
+        # Entries are appended as they are summarised; the finished file replaces the report
+        part_path = report_path.with_name(report_path.name + ".part")
+
+        state = self._report_state()
+        window_keys = []
+        entries = 0
+        with open(part_path, "w", encoding="utf-8") as f:
+            f.write("=" * 117 + "\n")
+            f.write("OFFICIAL EMAIL LEADS STATUS REPORT\n")
+            f.write("=" * 117 + "\n")
+            f.write(f"REPORT ID: {report_id}\n")
+            f.write(f"GENERATED ON: {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}\n")
+            f.write(
+                f"PERIOD: Last 24 Hours (From {last_24hrs.strftime('%Y-%m-%d %H:%M:%S %Z')} "
+                f"to {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')})\n"
+            )
+            f.write("=" * 117 + "\n\n")
+
+            for filtered in self._window_batches(xlsx_path, last_24hrs):
+                summaries = self._window_summaries(filtered, state, window_keys)
+                f.write("".join(self._render_entry(row, summary)
+                                for (_, row), summary in zip(filtered.iterrows(), summaries)))
+                entries += len(filtered)
+
+            if not entries:
+                f.write("No verified leads in the last 24 hours with a non-empty bounce_reason.\n")
+
+            f.write("=" * 117 + "\n")
+            f.write("END OF REPORT\n")
+            f.write("=" * 117 + "\n")
+
+        if state is not None and window_keys:
+            state.save(window_keys)
+            print(f"[OK] Report state: {state.reused} summaries reused, {state.new} new "
+                  f"(watermark {state.watermark.get('verified_at', 'none')})")
+        os.replace(part_path, report_path)
         return report_path
 
 
-def main() -> int:
-    # Download sheet to dated XLSX
-    ddmmyyyy = dt.datetime.now().strftime("%d%m%Y")
-    xlsx_path = OUTPUT_DIR / f"{OUTPUT_PREFIX}{ddmmyyyy}.xlsx"
-
-    download_google_sheet_to_xlsx(SPREADSHEET_ID, xlsx_path)
+def generate_daily_report(date_str: str = None, spreadsheet_id: str = SPREADSHEET_ID) -> Path:
+    """
+    Download the sheet to its dated XLSX and generate the report for that date.
+    """
+    if date_str is None:
+        date_str = dt.datetime.now().strftime("%d%m%Y")
+    # Not METRICS.reset(): the scheduler may be sending/verifying other campaigns in this process
+    run_start = METRICS.checkpoint()
+    xlsx_path = OUTPUT_DIR / f"{OUTPUT_PREFIX}{date_str}.xlsx"
+
+    download_google_sheet_to_xlsx(spreadsheet_id, xlsx_path, page_rows=download_page_rows(config),
+                                  campaign_config=config)
     print(f"[OK] Saved XLSX: {xlsx_path.resolve()}")
 
     # Generate report from that XLSX
     model_abs = os.path.abspath(MODEL_PATH)
     gen = ReportGenerator(model_abs)
-    report_path = gen.generate_report_from_xlsx(xlsx_path=xlsx_path, report_id=ddmmyyyy)
+    report_path = gen.generate_report_from_xlsx(xlsx_path=xlsx_path, report_id=date_str, since=run_start)
     print(f"[OK] Report generated: {report_path.resolve()}")
+    # Imported here: lead_history imports this module
+    from lead_history import ingest_history
+    ingest_history(config)
+    run = METRICS.since(run_start)
+    summarized = run.counter_total("model_route_requests_total", route="report_summary", tier="primary")
+    escalated = run.counter_total("model_route_requests_total", route="report_summary", tier="escalated")
+    if escalated:
+        print(f"[INFO] {escalated:.0f} of {summarized:.0f} summaries escalated to "
+              f"{os.path.basename(gen.route['ESCALATE_MODEL_PATH'])}")
+    summary_stats = run.summary()["llm"].get("report_summary", {})
+    if "draft_acceptance_rate" in summary_stats:
+        print(f"[OK] Speculative decoding: {summary_stats['draft_acceptance_rate']:.1%} of "
+              f"{summary_stats['draft_tokens']:.0f} drafted tokens accepted, "
+              f"decode {summary_stats['decode_tokens_per_s']} tok/s")
+    return report_path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Download today's lead sheet and generate the bounce report")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a sampling profile, llama.cpp timings and stage spans next to the report")
+    args = parser.parse_args()
+    date_str = dt.datetime.now().strftime("%d%m%Y")
+    with profiling.profiled(Path("excel_leads_daily_list") / f"report_{date_str}", enabled=args.profile):
+        generate_daily_report(date_str)
     return 0
 
 
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Durable send -> verify -> report pipeline scheduler.
+
+Jobs live in a SQLite job store (APScheduler SQLAlchemyJobStore), so they survive
+restarts:
+1) send:   cron/interval job per campaign at EMAIL_CONFIG.SCHEDULE_TIME
+2) verify: one-off job VERIFICATION_HOURS after each send finishes
+3) report: one-off job right after verify, on a single-worker "llm" executor
+4) watch:  with BOUNCE_WATCHER.ENABLED, an interval job per campaign on the "llm"
+           executor that summarises bounces as they arrive (bounce_watcher.py),
+           so the report only assembles stored summaries
+
+Campaigns come from config.json CAMPAIGNS (see campaigns.py). Send/verify are
+network bound and run concurrently across campaigns on the default thread
+pool; report generation owns the shared model, so it is serialised.
+Missed runs (process down at fire time) are caught up on start within
+MISFIRE_GRACE_HOURS, with repeated misses coalesced into a single run.
+"""
+from datetime import datetime, timedelta
+
+import pytz
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from main import load_config
+from campaigns import DEFAULT_CAMPAIGN_ID, campaign_config, get_campaigns, run_report, run_send, run_verify
+from bounce_watcher import watch_once, watcher_settings
+
+# Set by start_pipeline_scheduler(); stage jobs use it to chain the next stage.
+_scheduler = None
+
+
+def _get_campaign(campaign_id: str) -> dict:
+    """The campaign's full config (campaigns.campaign_config)."""
+    config = load_config()
+    for campaign in get_campaigns(config):
+        if campaign["CAMPAIGN_ID"] == campaign_id:
+            return campaign_config(config, campaign)
+    raise KeyError(f"Unknown campaign: {campaign_id}")
+
+
+def _schedule_stage(func, campaign_id: str, date_str: str, stage: str,
+                    run_date: datetime, executor: str = "default") -> None:
+    if _scheduler is None:
+        print(f"[INFO] No scheduler running; skipping {stage} for {campaign_id}/{date_str}")
+        return
+    _scheduler.add_job(
+        func,
+        "date",
+        run_date=run_date,
+        args=[campaign_id, date_str],
+        id=f"{campaign_id}:{stage}:{date_str}",
+        executor=executor,
+        replace_existing=True,
+    )
+    print(f"[OK] Scheduled {stage} for {campaign_id}/{date_str} at {run_date.isoformat()}")
+
+
+def run_send_stage(campaign_id: str = DEFAULT_CAMPAIGN_ID) -> dict:
+    """
+    Send today's emails for a campaign, then queue verification VERIFICATION_HOURS later.
+    """
+    config = _get_campaign(campaign_id)
+    email_cfg = config.get("EMAIL_CONFIG", {})
+    date_str = datetime.now().strftime("%d%m%Y")
+
+    result = run_send(config, date_str)
+    if result.get("error"):
+        print(f"[ERROR] Send stage failed for {campaign_id}/{date_str}: {result['error']}")
+        return result
+
+    verification_hours = float(email_cfg.get("VERIFICATION_HOURS", 12))
+    tz = pytz.timezone(config.get("SCHEDULE_TIMEZONE", "Asia/Kolkata"))
+    _schedule_stage(run_verify_stage, campaign_id, date_str, "verify",
+                    datetime.now(tz) + timedelta(hours=verification_hours))
+    return result
+
+
+def run_verify_stage(campaign_id: str, date_str: str) -> dict:
+    """
+    Verify delivery status for a send, then queue the report on the llm executor.
+    """
+    config = _get_campaign(campaign_id)
+    result = run_verify(config, date_str)
+    print(f"[OK] Verified {campaign_id}/{date_str}: "
+          f"delivered={result['delivered']} bounced={result['bounced']}")
+
+    tz = pytz.timezone(config.get("SCHEDULE_TIMEZONE", "Asia/Kolkata"))
+    _schedule_stage(run_report_stage, campaign_id, date_str, "report",
+                    datetime.now(tz), executor="llm")
+    return result
+
+
+def run_report_stage(campaign_id: str, date_str: str) -> str:
+    """
+    Generate the report for a verified send (on the model shared by all campaigns).
+    """
+    report_path = run_report(_get_campaign(campaign_id), date_str)
+    return str(report_path)
+
+
+def run_watch_stage(campaign_id: str) -> dict:
+    """
+    Poll Gmail/the sheet for new bounces and precompute their summaries while the model is idle.
+    """
+    return watch_once(_get_campaign(campaign_id))
+
+
+def _send_trigger(email_cfg: dict, tz):
+    schedule_time = email_cfg.get("SCHEDULE_TIME", "09:00")
+    frequency_days = int(email_cfg.get("SCHEDULE_FREQUENCY_DAYS", 1))
+    hour, minute = (int(x) for x in schedule_time.split(":"))
+
+    if frequency_days == 1:
+        return CronTrigger(hour=hour, minute=minute, timezone=tz)
+    # 'interval' takes no hour/minute; anchor it at SCHEDULE_TIME via start_date instead
+    anchor = datetime.now(tz).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return IntervalTrigger(days=frequency_days, start_date=anchor, timezone=tz)
+
+
+def _same_schedule(old, new) -> bool:
+    if isinstance(old, IntervalTrigger) and isinstance(new, IntervalTrigger):
+        return old.interval == new.interval and old.start_date.timetz() == new.start_date.timetz()
+    return str(old) == str(new)
+
+
+def build_pipeline_scheduler(config: dict) -> BackgroundScheduler:
+    """
+    Create (but do not start) the scheduler with its SQLite job store and executors.
+    """
+    email_cfg = config.get("EMAIL_CONFIG", {})
+    tz = pytz.timezone(config.get("SCHEDULE_TIMEZONE", "Asia/Kolkata"))
+    grace_hours = float(email_cfg.get("MISFIRE_GRACE_HOURS", 24))
+
+    return BackgroundScheduler(
+        jobstores={
+            "default": SQLAlchemyJobStore(url=f"sqlite:///{config.get('SCHEDULER_DB', 'pipeline_jobs.sqlite')}"),
+        },
+        executors={
+            "default": ThreadPoolExecutor(int(email_cfg.get("PIPELINE_WORKERS", 4))),
+            "llm": ThreadPoolExecutor(1),
+        },
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": int(grace_hours * 3600),
+        },
+        timezone=tz,
+    )
+
+
+def start_pipeline_scheduler(config: dict = None) -> BackgroundScheduler:
+    """
+    Register one send job per campaign and start the scheduler.
+
+    Jobs already in the job store keep their stored next run time, so a send,
+    verify or report that was due while the process was down fires on start.
+    """
+    global _scheduler
+
+    config = config or load_config()
+    tz = pytz.timezone(config.get("SCHEDULE_TIMEZONE", "Asia/Kolkata"))
+
+    scheduler = build_pipeline_scheduler(config)
+    _scheduler = scheduler
+    # Start paused so stored jobs can be inspected before anything fires
+    scheduler.start(paused=True)
+
+    for campaign in get_campaigns(config):
+        job_id = f"{campaign['CAMPAIGN_ID']}:send"
+        # Each campaign may override SCHEDULE_TIME / SCHEDULE_FREQUENCY_DAYS in its EMAIL_CONFIG
+        trigger = _send_trigger(campaign_config(config, campaign)["EMAIL_CONFIG"], tz)
+        job = scheduler.get_job(job_id)
+        if job is None:
+            scheduler.add_job(run_send_stage, trigger, args=[campaign["CAMPAIGN_ID"]], id=job_id)
+        elif not _same_schedule(job.trigger, trigger):
+            scheduler.reschedule_job(job_id, trigger=trigger)
+
+        # Background summarisation; shares the single "llm" worker with reports
+        watch_id = f"{campaign['CAMPAIGN_ID']}:watch"
+        watch = watcher_settings(campaign_config(config, campaign))
+        watch_job = scheduler.get_job(watch_id)
+        if not watch["ENABLED"]:
+            if watch_job is not None:
+                scheduler.remove_job(watch_id)
+            continue
+        watch_trigger = IntervalTrigger(minutes=float(watch["POLL_MINUTES"]), timezone=tz)
+        if watch_job is None:
+            scheduler.add_job(run_watch_stage, watch_trigger, args=[campaign["CAMPAIGN_ID"]], id=watch_id,
+                              executor="llm")
+        elif watch_job.trigger.interval != watch_trigger.interval:
+            scheduler.reschedule_job(watch_id, trigger=watch_trigger)
+
+    scheduler.resume()
+    for job in scheduler.get_jobs():
+        print(f"[OK] Job {job.id} next run: {job.next_run_time}")
+    return scheduler
@@ -0,0 +1,315 @@
+"""
+Built-in profiling for report and send runs (--profile).
+
+    python main.py --profile
+    python send_emails.py send 08022026 --profile
+
+While a run is profiled:
+
+- a sampler thread records the Python stack of every thread every
+  SAMPLE_INTERVAL seconds (sys._current_frames, wall clock: time blocked on
+  the network or the model shows up in the caller that waits);
+- every METRICS.timer() block (pipeline stages, sheet download, model load,
+  ...) becomes a wall-clock span;
+- every SummaryBot call records llama.cpp's own counters (model load, prompt
+  eval and eval time and token counts) via llama_perf_context.
+
+Next to the run's other artifacts (<stem> = excel_leads_daily_list/report_DDMMYYYY
+or leads_agent_excel_files/send_DDMMYYYY) it writes:
+
+- <stem>.trace.json: spans and model calls per thread, for chrome://tracing or
+  https://ui.perfetto.dev;
+- <stem>.speedscope.json: the sampled stacks per thread, for https://www.speedscope.app;
+- <stem>.hotspots.txt: the top TOP_N functions by samples, llama.cpp timings
+  per route and the stage spans.
+
+Sharded report workers (REPORT_SHARDS.WORKERS > 1) run in other processes and
+are not sampled; their model calls show up as time waiting in the parent.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from telemetry import METRICS
+
+SAMPLE_INTERVAL = 0.005
+TOP_N = 30
+
+# Leaf frames of threads parked on a lock/queue; left out of the hotspot table (kept in speedscope)
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # concurrent.futures worker blocked on its (C) work queue
+}
+
+_active = None
+
+
+def active():
+    """The running Profiler, or None when the run is not profiled."""
+    return _active
+
+
+class Profiler:
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.frames = {}            # (function, file, line) -> frame index
+        self.stacks = {}            # tuple of frame indexes (root -> leaf) -> stack index
+        self.samples = defaultdict(list)  # thread id -> [(t, stack index, weight)]
+        self.thread_names = {}
+        self.spans = []             # (name, labels, start, end, thread id, args)
+        self.llama_load_ms = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = self.stopped_at = None
+
+    # -----------------------------------------------------------------------
+    # Recording
+    # -----------------------------------------------------------------------
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        METRICS.add_span_listener(self._on_span)
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        METRICS.remove_span_listener(self._on_span)
+        self.stopped_at = time.perf_counter()
+
+    def _frame(self, code, line: int) -> int:
+        key = (code.co_name, code.co_filename, line)
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame(frame.f_code, frame.f_code.co_firstlineno))
+                    frame = frame.f_back
+                stack = tuple(reversed(stack))
+                index = self.stacks.get(stack)
+                if index is None:
+                    index = self.stacks[stack] = len(self.stacks)
+                self.samples[tid].append((now, index, weight))
+                if tid in names:
+                    self.thread_names[tid] = names[tid]
+
+    def _on_span(self, name: str, labels: dict, start: float, end: float) -> None:
+        self.span(name, labels, start, end)
+
+    def span(self, name: str, labels: dict, start: float, end: float, args: dict = None) -> None:
+        with self._lock:
+            self.spans.append((name, dict(labels), start, end, threading.get_ident(), args or {}))
+
+    def llama_begin(self, llm) -> float:
+        """Reset llama.cpp's perf counters before a call; returns the start time."""
+        ctx = _llama_ctx(llm)
+        if ctx is not None:
+            import llama_cpp
+            data = llama_cpp.llama_perf_context(ctx)
+            # Load time is set once per context; keep it for the first call's record
+            self.llama_load_ms.setdefault(id(llm), data.t_load_ms)
+            llama_cpp.llama_perf_context_reset(ctx)
+        return time.perf_counter()
+
+    def llama_end(self, llm, route: str, start: float) -> None:
+        """Record one model call as a span with llama.cpp's prompt eval / eval timings."""
+        args = {}
+        ctx = _llama_ctx(llm)
+        if ctx is not None:
+            import llama_cpp
+            data = llama_cpp.llama_perf_context(ctx)
+            args = {
+                "prompt_eval_ms": round(data.t_p_eval_ms, 3),
+                "prompt_tokens": data.n_p_eval,
+                "eval_ms": round(data.t_eval_ms, 3),
+                "eval_tokens": data.n_eval,
+                "ms_per_token": round(data.t_eval_ms / data.n_eval, 3) if data.n_eval else 0.0,
+                "reused_tokens": data.n_reused,
+            }
+            load_ms = self.llama_load_ms.pop(id(llm), None)
+            if load_ms:
+                args["load_ms"] = round(load_ms, 3)
+        self.span("llama_call", {"route": route}, start, time.perf_counter(), args)
+
+    # -----------------------------------------------------------------------
+    # Output
+    # -----------------------------------------------------------------------
+
+    def _frame_list(self) -> list:
+        out = [None] * len(self.frames)
+        for (name, path, line), index in self.frames.items():
+            out[index] = {"name": name, "file": path, "line": line}
+        return out
+
+    def _stack_list(self) -> list:
+        out = [None] * len(self.stacks)
+        for stack, index in self.stacks.items():
+            out[index] = stack
+        return out
+
+    def chrome_trace(self) -> dict:
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "arbstatbot"}}]
+        tids = {tid for *_, tid, _ in self.spans} | set(self.samples)
+        events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                    "args": {"name": self.thread_names.get(tid, str(tid))}} for tid in sorted(tids)]
+        for name, labels, start, end, tid, args in sorted(self.spans, key=lambda s: s[2]):
+            label = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+            events.append({
+                "name": f"{name} {label}" if label else name,
+                "cat": name,
+                "ph": "X",
+                "ts": round((start - self.started_at) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": pid,
+                "tid": tid,
+                "args": {**labels, **args},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def speedscope(self, name: str) -> dict:
+        stacks = self._stack_list()
+        profiles = []
+        for tid, samples in sorted(self.samples.items()):
+            profiles.append({
+                "type": "sampled",
+                "name": self.thread_names.get(tid, str(tid)),
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(self.stopped_at - self.started_at, 6),
+                "samples": [list(stacks[index]) for _, index, _ in samples],
+                "weights": [round(weight, 6) for _, _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "arbstatbot profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self._frame_list()},
+            "profiles": profiles,
+        }
+
+    def hotspots(self, top_n: int = TOP_N) -> str:
+        frames, stacks = self._frame_list(), self._stack_list()
+        self_s, total_s = Counter(), Counter()
+        busy = idle = 0.0
+        for samples in self.samples.values():
+            for _, index, weight in samples:
+                stack = stacks[index]
+                if not stack:
+                    continue
+                leaf = frames[stack[-1]]
+                if (os.path.basename(leaf["file"]), leaf["name"]) in IDLE_LEAVES:
+                    idle += weight
+                    continue
+                busy += weight
+                self_s[stack[-1]] += weight
+                for frame in set(stack):
+                    total_s[frame] += weight
+
+        wall = self.stopped_at - self.started_at
+        lines = [
+            f"Profile: {wall:.2f}s wall, {sum(len(s) for s in self.samples.values())} samples "
+            f"every {self.interval * 1000:g} ms over {len(self.samples)} threads",
+            f"Busy thread time {busy:.2f}s (parked on locks/queues: {idle:.2f}s, excluded)",
+            "",
+            f"Top {top_n} functions by self time",
+            f"{'self_s':>9} {'self%':>6} {'total_s':>9} {'total%':>7}  function",
+        ]
+        for frame, seconds in self_s.most_common(top_n):
+            f = frames[frame]
+            lines.append(f"{seconds:9.3f} {100 * seconds / busy:6.1f} {total_s[frame]:9.3f} "
+                         f"{100 * total_s[frame] / busy:7.1f}  {f['name']} ({_short(f['file'])}:{f['line']})")
+
+        calls = [s for s in self.spans if s[0] == "llama_call"]
+        if calls:
+            lines += ["", "llama.cpp per route",
+                      f"{'route':<26} {'calls':>6} {'load_ms':>9} {'prompt_tok':>10} {'prompt_ms':>10} "
+                      f"{'eval_tok':>9} {'eval_ms':>10} {'ms/tok':>7}"]
+            by_route = defaultdict(list)
+            for _, labels, _, _, _, args in calls:
+                by_route[labels["route"]].append(args)
+            for route, records in sorted(by_route.items()):
+                def total(key):
+                    return sum(r.get(key, 0) for r in records)
+                eval_tokens = total("eval_tokens")
+                lines.append(f"{route:<26} {len(records):>6} {total('load_ms'):>9.1f} {total('prompt_tokens'):>10} "
+                             f"{total('prompt_eval_ms'):>10.1f} {eval_tokens:>9} {total('eval_ms'):>10.1f} "
+                             f"{total('eval_ms') / eval_tokens if eval_tokens else 0:>7.2f}")
+
+        stages = defaultdict(lambda: [0, 0.0])
+        for name, labels, start, end, _, _ in self.spans:
+            if name == "llama_call":
+                continue
+            label = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+            stats = stages[f"{name} {label}".strip()]
+            stats[0] += 1
+            stats[1] += end - start
+        if stages:
+            lines += ["", "Spans (wall clock)", f"{'count':>6} {'total_s':>9}  span"]
+            for span, (count, seconds) in sorted(stages.items(), key=lambda kv: -kv[1][1]):
+                lines.append(f"{count:>6} {seconds:9.3f}  {span}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path_stem: Path) -> tuple:
+        path_stem = Path(path_stem)
+        path_stem.parent.mkdir(parents=True, exist_ok=True)
+        trace_path = path_stem.with_name(path_stem.name + ".trace.json")
+        speedscope_path = path_stem.with_name(path_stem.name + ".speedscope.json")
+        hotspots_path = path_stem.with_name(path_stem.name + ".hotspots.txt")
+        trace_path.write_text(json.dumps(self.chrome_trace()), encoding="utf-8")
+        speedscope_path.write_text(json.dumps(self.speedscope(path_stem.name)), encoding="utf-8")
+        hotspots_path.write_text(self.hotspots(), encoding="utf-8")
+        return trace_path, speedscope_path, hotspots_path
+
+
+def _llama_ctx(llm):
+    """The llama_context pointer of a llama_cpp.Llama (None for stand-ins)."""
+    return getattr(getattr(llm, "_ctx", None), "ctx", None)
+
+
+def _short(path: str) -> str:
+    parts = Path(path).parts
+    return str(Path(*parts[-2:])) if len(parts) > 2 else path
+
+
+@contextmanager
+def profiled(path_stem: Path, enabled: bool = True, interval: float = SAMPLE_INTERVAL):
+    """Profile the block and write the artifacts to <path_stem>.*; does nothing when not enabled."""
+    global _active
+    if not enabled:
+        yield None
+        return
+    profiler = Profiler(interval)
+    _active = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active = None
+        paths = profiler.write(path_stem)
+        print(f"[OK] Profile written: {', '.join(str(p) for p in paths)}")
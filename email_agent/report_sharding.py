@@ -0,0 +1,197 @@
+"""
+Sharded report generation across CPU cores / NUMA nodes.
+
+On CPU-only boxes one Llama instance stops scaling long before all cores are
+busy (decode is memory-bandwidth bound), so the failed leads are spread over
+K worker processes instead:
+
+- each worker pins itself to its own core set (or a slice of one NUMA node)
+  and loads one model with n_threads = size of that set;
+- the GGUF is mmapped read-only (llama.cpp default), so the weights are shared
+  through the page cache rather than copied K times;
+- leads are handed out one at a time and summaries come back in the original
+  lead order, for the parent to render (and fan out to bounce clusters).
+
+Each worker ships its metrics back with every summary so report telemetry
+still covers the whole run.
+"""
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from queue import Empty
+
+from telemetry import METRICS
+
+DEFAULT_REPORT_SHARDS = {
+    "WORKERS": 1,               # 1 = in-process, no sharding
+    "THREADS_PER_WORKER": None,  # None = size of the worker's core set
+    "PIN": "cores",             # "cores", "numa" or "none"
+}
+
+_worker = {}
+
+
+def _parse_cpulist(text: str) -> set:
+    """'0-3,8,10-11' -> {0, 1, 2, 3, 8, 10, 11}"""
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def _allowed_cpus() -> list:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _numa_nodes(allowed: list) -> list:
+    """CPUs of each NUMA node (restricted to `allowed`); one node if unknown."""
+    nodes = []
+    for path in sorted(Path("/sys/devices/system/node").glob("node[0-9]*/cpulist")):
+        cpus = _parse_cpulist(path.read_text()) & set(allowed)
+        if cpus:
+            nodes.append(sorted(cpus))
+    return nodes or [allowed]
+
+
+def _split(cpus: list, k: int) -> list:
+    """k contiguous, near-equal slices of cpus (empty slices get the whole list)."""
+    size, extra = divmod(len(cpus), k)
+    out, start = [], 0
+    for i in range(k):
+        end = start + size + (1 if i < extra else 0)
+        out.append(cpus[start:end] or list(cpus))
+        start = end
+    return out
+
+
+def plan_core_sets(workers: int, pin: str = "cores") -> list:
+    """
+    Core set for each worker. "numa" puts worker i on node i % nodes and splits
+    each node between its workers; "cores" splits all allowed CPUs; "none"
+    leaves scheduling to the OS.
+    """
+    if pin == "none":
+        return [None] * workers
+    allowed = _allowed_cpus()
+    if pin == "cores":
+        return _split(allowed, workers)
+    if pin == "numa":
+        nodes = _numa_nodes(allowed)
+        core_sets = [None] * workers
+        for n, cpus in enumerate(nodes):
+            members = list(range(n, workers, len(nodes)))
+            for w, core_set in zip(members, _split(cpus, len(members)) if members else []):
+                core_sets[w] = core_set
+        return core_sets
+    raise ValueError(f"Unknown REPORT_SHARDS.PIN: {pin}")
+
+
+def _init_worker(core_sets, model_path: str, speculative: dict, structured: dict, config: dict,
+                 threads_per_worker: int, worker_setup) -> None:
+    try:
+        core_set = core_sets.get(timeout=5)
+    except Empty:
+        core_set = None  # replacement worker after a crash: leave it unpinned
+    if core_set and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, core_set)
+    n_threads = threads_per_worker or (len(core_set) if core_set else max(1, (os.cpu_count() or 1) // 2))
+    if worker_setup is not None:
+        worker_setup()
+
+    import main
+    # The campaign's config: MODEL_ROUTES, sheet columns and Gmail pull as in the parent
+    generator = main.ReportGenerator(model_path, speculative=speculative, structured=structured,
+                                     campaign_config=config)
+    _worker["generator"] = generator
+    # generator.model_path is the MODEL_ROUTES model; escalations load the default one in this worker
+    _worker["bot"] = main.SummaryBot(generator.model_path, n_threads=n_threads, speculative=generator.speculative)
+
+
+def _lead_summary(row) -> tuple:
+    summary = _worker["generator"].lead_summary(_worker["bot"], row)
+    state = METRICS.export_state()
+    METRICS.reset()
+    return summary, state
+
+
+class ShardPool:
+    """
+    REPORT_SHARDS["WORKERS"] pinned worker processes, each loading the model
+    once. Started on the first summarize() and kept until close(), so a report
+    summarised in batches (STREAMING, REPORT_STATE deltas) loads the model K
+    times per run, not per batch.
+
+    `worker_setup` is an optional picklable callable run in each worker before
+    the model is loaded (the benchmarks use it to install a fake Llama).
+    """
+
+    def __init__(self, model_path: str, speculative: dict = None, structured: dict = None, shards: dict = None,
+                 config: dict = None, worker_setup=None):
+        self.model_path = model_path
+        self.speculative = speculative
+        self.structured = structured
+        self.shards = {**DEFAULT_REPORT_SHARDS, **(shards or {})}
+        self.config = config
+        self.worker_setup = worker_setup
+        self._pool = None
+
+    def _start(self) -> ProcessPoolExecutor:
+        workers = max(1, int(self.shards["WORKERS"]))
+        ctx = mp.get_context("spawn")
+        core_sets = ctx.Queue()
+        for core_set in plan_core_sets(workers, self.shards["PIN"]):
+            core_sets.put(core_set)
+        METRICS.set_gauge("report_shard_workers", workers)
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(core_sets, self.model_path, self.speculative, self.structured, self.config,
+                      self.shards["THREADS_PER_WORKER"], self.worker_setup),
+        )
+
+    def summarize(self, filtered) -> list:
+        """Summarise each row of `filtered` (ReportGenerator.lead_summary); summaries in row order."""
+        rows = [row for _, row in filtered.iterrows()]
+        if self._pool is None:
+            self._pool = self._start()
+        summaries = []
+        try:
+            for summary, state in self._pool.map(_lead_summary, rows):
+                METRICS.merge(state)
+                summaries.append(summary)
+        except BrokenProcessPool:
+            # A worker died (OOM, killed); the next batch starts a fresh pool
+            self.close()
+            raise
+        return summaries
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def summarize_sharded(filtered, model_path: str, speculative: dict = None, structured: dict = None,
+                      shards: dict = None, config: dict = None, worker_setup=None) -> list:
+    """One-off ShardPool: summarise the rows of `filtered` and shut the workers down."""
+    shards = {**DEFAULT_REPORT_SHARDS, **(shards or {})}
+    shards["WORKERS"] = max(1, min(int(shards["WORKERS"]), len(filtered)))
+    with ShardPool(model_path, speculative, structured, shards, config, worker_setup) as pool:
+        return pool.summarize(filtered)
@@ -0,0 +1,115 @@
+"""
+Incremental report state, so re-running a report only summarises new leads.
+
+generate_report_from_xlsx recomputes the rolling "last 24 hours" window on
+every run; a second run the same day (or one after a crash) used to summarise
+every lead in it again. The state file (OUTPUT_DIR/report_state.json, one per
+campaign since each campaign has its own OUTPUT_DIR) keeps:
+
+- the summary of every lead already reported, keyed by lead id plus a hash of
+  the summary inputs (status, bounce code/reason, Gmail id), so a lead whose
+  bounce details change is summarised again;
+- the watermark: the latest verified_at (and its lead id) summarised so far;
+- a fingerprint of the model and summary settings; when it changes the stored
+  summaries are dropped.
+
+Each run summarises only leads without a stored summary, renders stored and
+new summaries in sheet order, and drops leads that have left the window.
+bounce_watcher.py adds summaries during the day, as bounces arrive.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from telemetry import METRICS
+
+DEFAULT_REPORT_STATE = {
+    "ENABLED": True,
+    "STATE_FILE": "report_state.json",
+}
+
+STATE_VERSION = 1
+
+
+def report_state_path(config: dict) -> Path:
+    settings = {**DEFAULT_REPORT_STATE, **config.get("REPORT_STATE", {})}
+    return Path(config.get("OUTPUT_DIR", "leads_agent_excel_files")) / settings["STATE_FILE"]
+
+
+def settings_fingerprint(model_path: str, structured: dict) -> str:
+    """Changes whenever stored summaries would no longer match a fresh run."""
+    payload = json.dumps({"model": os.path.basename(model_path), "structured": structured}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _text(value) -> str:
+    return "" if value is None or pd.isna(value) else str(value).strip()
+
+
+def lead_key(row, input_columns: list) -> str:
+    """'<lead_id>:<hash of summary inputs>'; falls back to the email when lead_id is empty."""
+    lead = _text(row.get("lead_id")) or _text(row.get("email")).lower()
+    inputs = "\x1f".join(_text(row.get(c)) for c in input_columns)
+    return f"{lead}:{hashlib.sha1(inputs.encode()).hexdigest()[:12]}"
+
+
+class ReportState:
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.summaries = {}
+        self.watermark = {}
+        # Leads reused / summarised by this run, over every split()
+        self.reused = 0
+        self.new = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            print(f"[INFO] Unreadable report state {self.path}; summarising the whole window")
+            return
+        if data.get("version") != STATE_VERSION or data.get("fingerprint") != self.fingerprint:
+            print("[INFO] Model or summary settings changed; summarising the whole window")
+            return
+        self.summaries = data.get("summaries", {})
+        self.watermark = data.get("watermark", {})
+
+    def split(self, keys: list) -> tuple:
+        """(positions with a stored summary, positions to summarise) for keys in row order."""
+        reused = [i for i, k in enumerate(keys) if k in self.summaries]
+        missing = [i for i, k in enumerate(keys) if k not in self.summaries]
+        self.reused += len(reused)
+        self.new += len(missing)
+        METRICS.inc("report_summaries_reused_total", len(reused))
+        METRICS.inc("report_summaries_new_total", len(missing))
+        return reused, missing
+
+    def update(self, keys: list, summaries: list, verified_at: list) -> None:
+        for key, summary, ts in zip(keys, summaries, verified_at):
+            self.summaries[key] = {"summary": summary, "verified_at": None if pd.isna(ts) else ts.isoformat()}
+            if not pd.isna(ts) and ts.isoformat() > self.watermark.get("verified_at", ""):
+                self.watermark = {"verified_at": ts.isoformat(), "lead_id": key.split(":", 1)[0]}
+
+    def save(self, keep_keys: list) -> None:
+        """Write the state, keeping only summaries for keep_keys (the leads still in the window)."""
+        keep = set(keep_keys)
+        self.summaries = {k: v for k, v in self.summaries.items() if k in keep}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({
+            "version": STATE_VERSION,
+            "fingerprint": self.fingerprint,
+            "updated_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "watermark": self.watermark,
+            "summaries": self.summaries,
+        }), encoding="utf-8")
+        # Atomic: a crash mid-write keeps the previous state
+        os.replace(tmp, self.path)
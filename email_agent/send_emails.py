@@ -10,12 +10,17 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import pandas as pd
 import pytz
-from apscheduler.schedulers.background import BackgroundScheduler
-from main import load_config, download_google_sheet_to_xlsx, get_creds
+from main import load_config, download_google_sheet_to_xlsx, google_service, execute_api
+from telemetry import METRICS
+from gmail_quota import GmailQuotaExceeded
+from bounce_ingest import (
+    append_journal, bounce_settings, ingest_bounces, journal_path, journal_recipients, load_bounce_log,
+    merge_bounce_log,
+)
+from streaming import download_page_rows, lead_chunks, streaming_settings
+from suppression import SeenAddresses, filter_recipients, refresh_index, suppression_settings
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 
 
 def load_email_config(config_file: str = "config.json") -> dict:
@@ -25,12 +30,12 @@ def load_email_config(config_file: str = "config.json") -> dict:
     return config
 
 
-def get_email_content(date_str: str) -> str:
+def get_email_content(date_str: str, email_folder: str = "email_to_send") -> str:
     """
-    Load email content from email_to_send folder.
+    Load email content from email_to_send folder (EMAIL_CONFIG.EMAIL_FOLDER).
     Expected format: email_to_send/email_(DDMMYYYY).txt
     """
-    email_folder = Path("email_to_send")
+    email_folder = Path(email_folder)
     email_file = email_folder / f"email_{date_str}.txt"
     
     if not email_file.exists():
@@ -73,9 +78,10 @@ def format_email_content(content: str, lead_data: dict) -> tuple:
 
 
 def send_email_via_gmail_api(recipient_email: str, subject: str, body: str, 
-                             sender_email: str, gmail_service) -> bool:
+                             sender_email: str, gmail_service):
     """
     Send email using Gmail API.
+    Returns the Gmail message id, or None if sending failed.
     """
     try:
         msg = MIMEText(body, "plain")
@@ -86,22 +92,33 @@ def send_email_via_gmail_api(recipient_email: str, subject: str, body: str,
         raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
         send_message = {"raw": raw}
         
-        gmail_service.users().messages().send(userId="me", body=send_message).execute()
+        sent = execute_api(gmail_service.users().messages().send(userId="me", body=send_message),
+                           "gmail", "messages.send")
         print(f"[OK] Email sent to {recipient_email}")
-        return True
+        return sent.get("id", "")
+    except GmailQuotaExceeded:
+        raise
     except Exception as e:
         print(f"[ERROR] Failed to send email to {recipient_email}: {e}")
-        return False
+        return None
 
 
-def send_emails_to_leads(date_str: str = None) -> dict:
+def send_emails_to_leads(date_str: str = None, config: dict = None) -> dict:
     """
     Main function to send emails to all leads from the sheet using Gmail API.
+    config defaults to config.json; campaigns pass their own (campaigns.campaign_config).
+    With STREAMING the sheet is sent chunk by chunk and "recipients" is left
+    empty (the send journal lists them).
     """
+    with METRICS.timer("pipeline_stage", stage="send"):
+        return _send_emails_to_leads(date_str, config)
+
+
+def _send_emails_to_leads(date_str: str = None, config: dict = None) -> dict:
     if date_str is None:
         date_str = datetime.now().strftime("%d%m%Y")
     
-    config = load_email_config()
+    config = config or load_email_config()
     email_cfg = config.get("EMAIL_CONFIG", {})
     
     # Get Gmail credentials (expanded scopes to include sending + sheets access)
@@ -112,11 +129,10 @@ def send_emails_to_leads(date_str: str = None) -> dict:
     ]
     
     try:
-        creds = get_creds(combined_scopes)
-        gmail_service = build("gmail", "v1", credentials=creds)
+        gmail_service = google_service("gmail", "v1", combined_scopes)
         
         # Get authenticated user's email
-        profile = gmail_service.users().getProfile(userId="me").execute()
+        profile = execute_api(gmail_service.users().getProfile(userId="me"), "gmail", "users.getProfile")
         sender_email = profile.get("emailAddress", "")
         
         if not sender_email:
@@ -133,89 +149,147 @@ def send_emails_to_leads(date_str: str = None) -> dict:
     output_prefix = config.get("OUTPUT_PREFIX", "leads_")
     xlsx_path = output_dir / f"{output_prefix}{date_str}.xlsx"
     
-    download_google_sheet_to_xlsx(config["SPREADSHEET_ID"], xlsx_path)
+    streaming = streaming_settings(config)["ENABLED"]
+    download_google_sheet_to_xlsx(config["SPREADSHEET_ID"], xlsx_path, page_rows=download_page_rows(config),
+                                  campaign_config=config)
     print(f"[OK] Downloaded sheet to {xlsx_path}")
     
-    # Load leads from Excel
-    df = pd.read_excel(xlsx_path)
-    
     # Get email content
     try:
-        email_content = get_email_content(date_str)
+        email_content = get_email_content(date_str, email_cfg.get("EMAIL_FOLDER", "email_to_send"))
     except FileNotFoundError as e:
         print(f"[ERROR] {e}")
         return {"success": 0, "failed": 0, "error": str(e)}
     
+    # Dropped before rendering: invalid, duplicate, suppressed (past hard bounces) and already-sent addresses.
+    # Across the chunks of a streamed sheet: addresses seen so far and one read of the suppression index
+    already_sent = journal_recipients(journal_path(output_dir, date_str))
+    seen = SeenAddresses() if streaming else None
+    suppressed = refresh_index(config) if suppression_settings(config)["ENABLED"] else None
+    skipped = {}
+    
     # Send emails
     success_count = 0
     failed_count = 0
     sent_recipients = []
+    ist = pytz.timezone("Asia/Kolkata")
+    quota_error = None
     
-    for idx, row in df.iterrows():
-        email = row.get(email_column, "")
-        if not email or pd.isna(email):
-            continue
+    # Leads from Excel (only the columns templates and the journal use); CHUNK_ROWS at a time with STREAMING
+    for df in lead_chunks(xlsx_path, config, "send"):
+        df, chunk_skipped = filter_recipients(df, email_column, config, already_sent=already_sent,
+                                              seen=seen, suppressed_hashes=suppressed)
+        skipped = {k: skipped.get(k, 0) + v for k, v in chunk_skipped.items()}
+        # Send journal: bounce_ingest matches DSNs back to leads by recipient
+        journal = []
         
-        try:
-            subject, body = format_email_content(email_content, row.to_dict())
-            if send_email_via_gmail_api(email, subject, body, sender_email, gmail_service):
-                success_count += 1
-                sent_recipients.append(email)
-            else:
+        for idx, row in df.iterrows():
+            email = str(row.get(email_column)).strip()
+            
+            try:
+                subject, body = format_email_content(email_content, row.to_dict())
+                msg_id = send_email_via_gmail_api(email, subject, body, sender_email, gmail_service)
+                if msg_id is not None:
+                    success_count += 1
+                    if not streaming:
+                        sent_recipients.append(email)
+                    journal.append({
+                        "email": str(email).strip().lower(),
+                        "lead_id": row.get("lead_id"),
+                        "gmail_msg_id": msg_id,
+                        "sent_at": datetime.now(ist).isoformat(timespec="seconds"),
+                    })
+                else:
+                    failed_count += 1
+            except GmailQuotaExceeded as e:
+                # The account is shared across campaigns; stop instead of failing every remaining lead
+                print(f"[ERROR] {e}; stopping sends for {date_str}")
+                quota_error = str(e)
+                break
+            except Exception as e:
+                print(f"[ERROR] Error processing {email}: {e}")
                 failed_count += 1
-        except Exception as e:
-            print(f"[ERROR] Error processing {email}: {e}")
-            failed_count += 1
+        
+        append_journal(journal_path(output_dir, date_str), journal)
+        if quota_error:
+            break
     
     result = {
         "success": success_count,
         "failed": failed_count,
         "timestamp": datetime.now().isoformat(),
         "recipients": sent_recipients,
-        "sender": sender_email
+        "sender": sender_email,
+        "skipped": skipped
     }
+    if quota_error:
+        result["quota_error"] = quota_error
     
-    print(f"\n[SUMMARY] Sent: {success_count}, Failed: {failed_count}")
+    print(f"\n[SUMMARY] Sent: {success_count}, Failed: {failed_count}, "
+          f"Skipped: {sum(skipped.values())} ({', '.join(f'{k} {v}' for k, v in skipped.items() if v) or 'none'})")
     return result
 
 
-def verify_email_status(date_str: str = None) -> dict:
+def verify_email_status(date_str: str = None, config: dict = None) -> dict:
     """
     Verify email status by checking bounce information and update sent_at timestamp.
     """
+    with METRICS.timer("pipeline_stage", stage="verify"):
+        return _verify_email_status(date_str, config)
+
+
+def _verify_email_status(date_str: str = None, config: dict = None) -> dict:
     if date_str is None:
         date_str = datetime.now().strftime("%d%m%Y")
     
-    config = load_email_config()
+    config = config or load_email_config()
     output_dir = Path(config.get("OUTPUT_DIR", "leads_agent_excel_files"))
     output_prefix = config.get("OUTPUT_PREFIX", "leads_")
     xlsx_path = output_dir / f"{output_prefix}{date_str}.xlsx"
     
     # Download latest sheet
-    download_google_sheet_to_xlsx(config["SPREADSHEET_ID"], xlsx_path)
+    download_google_sheet_to_xlsx(config["SPREADSHEET_ID"], xlsx_path, page_rows=download_page_rows(config),
+                                  campaign_config=config)
     
-    df = pd.read_excel(xlsx_path)
     col_sent_at = config.get("COL_SENT_AT", "sent_at")
     col_bounce_reason = config.get("COL_BOUNCE_REASON", "bounce_reason")
     
-    # Count bounced vs delivered
-    bounced = df[col_bounce_reason].notna().sum()
-    delivered = df[col_bounce_reason].isna().sum()
+    # Pull new DSNs from Gmail and merge every logged bounce into the sheet rows
+    new_bounces = []
+    bounce_log = None
+    if bounce_settings(config)["ENABLED"]:
+        new_bounces = ingest_bounces(config)
+        bounce_log = load_bounce_log(config)
+    
+    # Count bounced vs delivered, CHUNK_ROWS leads at a time with STREAMING
+    total = bounced = delivered = 0
+    bounce_details = []
+    for df in lead_chunks(xlsx_path, config, "verify"):
+        if bounce_log is not None:
+            df = merge_bounce_log(df, config, bounce_log)
+        if col_bounce_reason not in df.columns:
+            df[col_bounce_reason] = None
+        
+        total += len(df)
+        bounced += df[col_bounce_reason].notna().sum()
+        delivered += df[col_bounce_reason].isna().sum()
+        bounce_details += df[df[col_bounce_reason].notna()][[
+            "email", col_bounce_reason
+        ]].to_dict(orient="records")
     
     return {
         "timestamp": datetime.now().isoformat(),
-        "total_leads": len(df),
+        "total_leads": total,
         "delivered": delivered,
         "bounced": bounced,
-        "bounce_details": df[df[col_bounce_reason].notna()][[
-            "email", col_bounce_reason
-        ]].to_dict(orient="records") if col_bounce_reason in df.columns else []
+        "new_bounces": len(new_bounces),
+        "bounce_details": bounce_details
     }
 
 
 def setup_scheduler():
     """
-    Setup background scheduler for periodic email sending.
+    Setup the persistent send -> verify -> report pipeline scheduler.
     """
     config = load_email_config()
     email_cfg = config.get("EMAIL_CONFIG", {})
@@ -224,48 +298,53 @@ def setup_scheduler():
         print("[INFO] Scheduler is disabled in config")
         return None
     
-    schedule_time = email_cfg.get("SCHEDULE_TIME", "09:00")
-    frequency_days = email_cfg.get("SCHEDULE_FREQUENCY_DAYS", 1)
-    
-    scheduler = BackgroundScheduler()
-    
-    # Schedule based on frequency
-    if frequency_days == 1:
-        scheduler.add_job(
-            send_emails_to_leads,
-            'cron',
-            hour=int(schedule_time.split(":")[0]),
-            minute=int(schedule_time.split(":")[1]),
-            id='daily_email_send'
-        )
-    else:
-        scheduler.add_job(
-            send_emails_to_leads,
-            'interval',
-            days=frequency_days,
-            hour=int(schedule_time.split(":")[0]),
-            minute=int(schedule_time.split(":")[1]),
-            id='periodic_email_send'
-        )
+    # Imported here: pipeline_scheduler imports this module for the stage functions
+    from pipeline_scheduler import start_pipeline_scheduler
     
-    scheduler.start()
-    print(f"[OK] Scheduler started. Next send at {schedule_time}")
+    scheduler = start_pipeline_scheduler(config)
+    print(f"[OK] Scheduler started. Sends at {email_cfg.get('SCHEDULE_TIME', '09:00')}, "
+          f"verification {email_cfg.get('VERIFICATION_HOURS', 12)}h later")
     return scheduler
 
 
+def _profile_stem(command: str, date_arg: str) -> Path:
+    """Profile artifacts of a send/verify run: <OUTPUT_DIR>/<command>_DDMMYYYY.*"""
+    output_dir = Path(load_email_config().get("OUTPUT_DIR", "leads_agent_excel_files"))
+    return output_dir / f"{command}_{date_arg or datetime.now().strftime('%d%m%Y')}"
+
+
 if __name__ == "__main__":
     import sys
-    
-    if len(sys.argv) > 1 and sys.argv[1] == "send":
-        date_arg = sys.argv[2] if len(sys.argv) > 2 else None
-        result = send_emails_to_leads(date_arg)
+    from profiling import profiled
+
+    # --profile: sampling profile + stage spans next to the run's files (profiling.py)
+    profile = "--profile" in sys.argv
+    argv = [a for a in sys.argv if a != "--profile"]
+
+    if len(argv) > 1 and argv[1] == "send":
+        date_arg = argv[2] if len(argv) > 2 else None
+        with profiled(_profile_stem("send", date_arg), enabled=profile):
+            result = send_emails_to_leads(date_arg)
         print(f"Result: {result}")
-    elif len(sys.argv) > 1 and sys.argv[1] == "verify":
-        date_arg = sys.argv[2] if len(sys.argv) > 2 else None
-        result = verify_email_status(date_arg)
+    elif len(argv) > 1 and argv[1] == "verify":
+        date_arg = argv[2] if len(argv) > 2 else None
+        with profiled(_profile_stem("verify", date_arg), enabled=profile):
+            result = verify_email_status(date_arg)
         print(f"Result: {result}")
+    elif len(argv) > 1 and argv[1] == "schedule":
+        import time
+        scheduler = setup_scheduler()
+        if scheduler is None:
+            sys.exit(1)
+        try:
+            while True:
+                time.sleep(60)
+        except (KeyboardInterrupt, SystemExit):
+            scheduler.shutdown()
     else:
         print("Usage:")
         print("  python send_emails.py send [DDMMYYYY]  - Send emails for a specific date")
         print("  python send_emails.py verify [DDMMYYYY] - Verify email status")
+        print("  python send_emails.py schedule          - Run the send/verify/report scheduler")
+        print("  Add --profile to send/verify to write a profile next to the run's files")
 
@@ -0,0 +1,590 @@
+"""
+Deduplicated, compressed archive of the daily sheet snapshots.
+
+Every download writes another full OUTPUT_DIR/leads_DDMMYYYY.xlsx of a sheet
+that mostly did not change since yesterday, so disk and backups grew with
+days x rows. With SNAPSHOT_ARCHIVE enabled each download is also archived
+(archive_snapshot) under OUTPUT_DIR/<DIR>:
+
+- rows are content-hashed (16-byte BLAKE2b of their non-empty cells, by
+  column name); a version stores only the rows its parent (the previous
+  archived day) does not have, in zstd-compressed Parquet column chunks
+  (segments/, CHUNK_ROWS rows per row group; gzip where pyarrow has no zstd);
+- each day's row order is a list of runs in versions/<stem>.json: ["p",
+  start, count] copies rows of the parent, ["n", start, count] takes rows of
+  the version's own segment. Every MAX_CHAIN deltas a base version stores
+  every row again, so no reconstruction walks more than MAX_CHAIN parents;
+- dated xlsx files older than KEEP_DAYS are removed once archived and come
+  back as lazily materialised views (snapshot_path) when something asks for
+  that date; lead_loader reads the archive directly when given a version
+  manifest, so the suppression index and the lead history never need the
+  xlsx of an evicted day.
+
+Only the cells under each tab's header row are archived; that is all any
+reader of the snapshots (lead_loader, exports) uses. Cells are kept as text.
+
+    python snapshot_archive.py import                # archive the dated xlsx already on disk
+    python snapshot_archive.py list
+    python snapshot_archive.py materialize 08022026
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook, load_workbook
+
+DEFAULT_SNAPSHOT_ARCHIVE = {
+    "ENABLED": False,
+    "DIR": "archive",       # under OUTPUT_DIR
+    "KEEP_DAYS": 2,         # dated xlsx of the last KEEP_DAYS days also stay on disk as-is
+    "MAX_CHAIN": 30,        # deltas before the next base version
+    "CHUNK_ROWS": 50000,    # rows per compressed column chunk (Parquet row group)
+    "COMPRESSION": "zstd",
+}
+
+ARCHIVE_VERSION = 1
+MANIFEST_SUFFIX = ".json"
+HASH_BYTES = 16
+DATED_STEM = re.compile(r"^(?P<prefix>.*?)(?P<date>\d{8})$")
+EMPTY_ROW_HASH = hashlib.blake2b(b"", digest_size=HASH_BYTES).digest()
+# Row groups of recently read segments kept decoded while materialising
+ROW_GROUP_CACHE = 8
+
+_lock = threading.Lock()
+
+
+def archive_settings(config: dict) -> dict:
+    settings = {**DEFAULT_SNAPSHOT_ARCHIVE, **config.get("SNAPSHOT_ARCHIVE", {})}
+    if settings["COMPRESSION"] == "zstd" and not pa.Codec.is_available("zstd"):
+        settings["COMPRESSION"] = "gzip"
+    return settings
+
+
+def archive_dir(output_dir, config: dict) -> Path:
+    return Path(output_dir) / archive_settings(config)["DIR"]
+
+
+def _stem_date(stem: str):
+    """datetime.date of a ..._DDMMYYYY stem, or None."""
+    m = DATED_STEM.match(stem)
+    if not m:
+        return None
+    try:
+        return datetime.strptime(m.group("date"), "%d%m%Y").date()
+    except ValueError:
+        return None
+
+
+def _stamp(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _column_keys(header: list) -> list:
+    """Segment column per header cell: the header text, made unique/non-empty with its position."""
+    names = [None if h is None else str(h) for h in header]
+    keys = []
+    for i, name in enumerate(names):
+        keys.append(name if name and names.count(name) == 1 and not name.startswith("#") else f"#{i}:{name or ''}")
+    return keys
+
+
+def _row_hash(keys: list, row) -> bytes:
+    h = hashlib.blake2b(digest_size=HASH_BYTES)
+    for key, value in zip(keys, row):
+        if value is not None and value != "":
+            h.update(key.encode("utf-8") + b"\x1e" + str(value).encode("utf-8") + b"\x1f")
+    return h.digest()
+
+
+def _hash_array(column) -> np.ndarray:
+    """fixed_size_binary(16) Arrow column -> numpy S16 array."""
+    arr = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    return np.frombuffer(arr.buffers()[1], dtype=f"S{HASH_BYTES}", count=len(arr), offset=arr.offset * HASH_BYTES)
+
+
+# ---------------------------------------------------------------------------
+# Versions
+# ---------------------------------------------------------------------------
+
+class _Resolved:
+    """A version's rows as (segment index, row in segment) arrays per tab."""
+
+    def __init__(self, manifest: dict, segments: list, tabs: list):
+        self.manifest = manifest
+        self.segments = segments  # paths relative to the archive root
+        self.tabs = tabs          # [(seg_idx int32 array, seg_row int64 array)]
+
+    def flat(self) -> tuple:
+        if not self.tabs:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        return np.concatenate([t[0] for t in self.tabs]), np.concatenate([t[1] for t in self.tabs])
+
+
+class SnapshotArchive:
+    def __init__(self, root, settings: dict):
+        self.root = Path(root)
+        self.settings = settings
+        self.versions_dir = self.root / "versions"
+        self.segments_dir = self.root / "segments"
+
+    @classmethod
+    def for_output_dir(cls, output_dir, config: dict) -> "SnapshotArchive":
+        return cls(archive_dir(output_dir, config), archive_settings(config))
+
+    def manifest_path(self, stem: str) -> Path:
+        return self.versions_dir / f"{stem}{MANIFEST_SUFFIX}"
+
+    def manifest(self, stem: str):
+        try:
+            return json.loads(self.manifest_path(stem).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def versions(self, prefix: str = None) -> list:
+        """Archived stems (oldest first), optionally only those with this OUTPUT_PREFIX."""
+        if not self.versions_dir.exists():
+            return []
+        stems = []
+        for path in self.versions_dir.glob(f"*{MANIFEST_SUFFIX}"):
+            m = DATED_STEM.match(path.stem)
+            if m and _stem_date(path.stem) and (prefix is None or m.group("prefix") == prefix):
+                stems.append(path.stem)
+        return sorted(stems, key=_stem_date)
+
+    def _parent_of(self, stem: str):
+        """The newest archived version dated before `stem`, with the same prefix."""
+        prefix, day = DATED_STEM.match(stem).group("prefix"), _stem_date(stem)
+        older = [s for s in self.versions(prefix) if _stem_date(s) < day]
+        return older[-1] if older else None
+
+    def resolve(self, stem: str) -> _Resolved:
+        chain, manifest = [], self.manifest(stem)
+        if manifest is None:
+            raise FileNotFoundError(f"{stem} is not in the archive {self.root}")
+        while True:
+            chain.append(manifest)
+            if manifest["parent"] is None:
+                break
+            manifest = self.manifest(manifest["parent"])
+            if manifest is None:
+                raise RuntimeError(f"Archive {self.root}: parent {chain[-1]['parent']} of {chain[-1]['stem']} is missing")
+
+        resolved = None
+        for manifest in reversed(chain):
+            segments = list(resolved.segments) if resolved else []
+            p_idx, p_row = resolved.flat() if resolved else (None, None)
+            tabs = []
+            for tab in manifest["tabs"]:
+                own = None
+                if tab["segment"]:
+                    own = len(segments)
+                    segments.append(tab["segment"])
+                idx_parts, row_parts = [], []
+                for kind, start, count in tab["runs"]:
+                    if kind == "p":
+                        idx_parts.append(p_idx[start:start + count])
+                        row_parts.append(p_row[start:start + count])
+                    else:
+                        idx_parts.append(np.full(count, own, dtype=np.int32))
+                        row_parts.append(np.arange(start, start + count, dtype=np.int64))
+                tabs.append((
+                    np.concatenate(idx_parts) if idx_parts else np.empty(0, dtype=np.int32),
+                    np.concatenate(row_parts) if row_parts else np.empty(0, dtype=np.int64),
+                ))
+            resolved = _Resolved(manifest, segments, tabs)
+        return resolved
+
+    def _hashes(self, resolved: _Resolved) -> np.ndarray:
+        """Row hashes of a resolved version, in order, flattened across tabs."""
+        seg_idx, seg_row = resolved.flat()
+        out = np.empty(len(seg_idx), dtype=f"S{HASH_BYTES}")
+        for i in np.unique(seg_idx):
+            hashes = _hash_array(pq.read_table(self.root / resolved.segments[i], columns=["_hash"]).column(0))
+            mask = seg_idx == i
+            out[mask] = hashes[seg_row[mask]]
+        return out
+
+    # -----------------------------------------------------------------------
+    # Archiving
+    # -----------------------------------------------------------------------
+
+    def add(self, xlsx_path: Path) -> dict:
+        """Archive one dated snapshot. Returns its manifest."""
+        xlsx_path = Path(xlsx_path)
+        stem = xlsx_path.stem
+        if _stem_date(stem) is None:
+            raise ValueError(f"{xlsx_path.name} has no DDMMYYYY date")
+        stamp = _stamp(xlsx_path)
+        existing = self.manifest(stem)
+        if existing and existing["source_stamp"] == stamp:
+            return existing
+        if existing and any((self.manifest(s) or {}).get("parent") == stem for s in self.versions()):
+            print(f"[INFO] {stem} is already archived and later versions build on it; keeping the archived copy")
+            return existing
+
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        parent = self._parent_of(stem)
+        parent_manifest = self.manifest(parent) if parent else None
+        depth = parent_manifest["depth"] + 1 if parent_manifest else 0
+        if parent_manifest is None or depth > int(self.settings["MAX_CHAIN"]):
+            parent, depth = None, 0
+        sorted_hashes = order = None
+        if parent:
+            parent_hashes = self._hashes(self.resolve(parent))
+            order = np.argsort(parent_hashes, kind="stable")
+            sorted_hashes = parent_hashes[order]
+        token = uuid.uuid4().hex[:8]
+        chunk_rows = int(self.settings["CHUNK_ROWS"])
+
+        tabs, new_rows, rows = [], 0, 0
+        wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+        try:
+            for t, ws in enumerate(wb.worksheets):
+                row_iter = ws.iter_rows(values_only=True)
+                header = list(next(row_iter, None) or ())
+                while header and header[-1] is None:
+                    header.pop()
+                keys = _column_keys(header)
+                segment = f"segments/{stem}.{token}.{t}.parquet"
+                writer = None
+                schema = pa.schema([("_hash", pa.binary(HASH_BYTES))] + [(k, pa.string()) for k in keys])
+                pending = {k: [] for k in ["_hash"] + keys}
+                refs, seg_rows = [], 0
+
+                def flush(final=False):
+                    nonlocal writer
+                    if not pending["_hash"] or (not final and len(pending["_hash"]) < chunk_rows):
+                        return
+                    table = pa.table({k: pa.array(v, type=schema.field(k).type) for k, v in pending.items()},
+                                     schema=schema)
+                    if writer is None:
+                        writer = pq.ParquetWriter(self.root / segment, schema,
+                                                  compression=self.settings["COMPRESSION"])
+                    writer.write_table(table, row_group_size=chunk_rows)
+                    for values in pending.values():
+                        values.clear()
+
+                batch = []
+                for row in row_iter:
+                    batch.append(row)
+                    if len(batch) == chunk_rows:
+                        seg_rows = self._add_rows(batch, keys, sorted_hashes, order, pending, refs, seg_rows, flush)
+                        batch = []
+                seg_rows = self._add_rows(batch, keys, sorted_hashes, order, pending, refs, seg_rows, flush)
+                flush(final=True)
+                if writer is not None:
+                    writer.close()
+
+                refs = np.concatenate(refs) if refs else np.empty(0, dtype=np.int64)
+                tabs.append({
+                    "title": ws.title,
+                    "header": [None if h is None else str(h) for h in header],
+                    "keys": keys,
+                    "rows": len(refs),
+                    "segment": segment if seg_rows else None,
+                    "runs": _runs(refs),
+                })
+                new_rows += seg_rows
+                rows += len(refs)
+        finally:
+            wb.close()
+
+        manifest = {
+            "version": ARCHIVE_VERSION,
+            "stem": stem,
+            "parent": parent,
+            "depth": depth,
+            "rows": rows,
+            "new_rows": new_rows,
+            "tabs": tabs,
+            "source_stamp": stamp,
+            "source_bytes": xlsx_path.stat().st_size,
+            "archived_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        }
+        _write_json(self.manifest_path(stem), manifest)
+        self.manifest_path(stem).with_suffix(".view").unlink(missing_ok=True)
+        # Segments of the copy this one replaces (re-download of the newest day)
+        for tab in (existing or {}).get("tabs", []):
+            if tab["segment"]:
+                (self.root / tab["segment"]).unlink(missing_ok=True)
+        return manifest
+
+    @staticmethod
+    def _add_rows(batch, keys, sorted_hashes, order, pending, refs, seg_rows, flush) -> int:
+        """Hash a batch of rows, queue the ones the parent lacks for the segment, append their refs."""
+        if not batch:
+            return seg_rows
+        hashes = np.array([_row_hash(keys, row) for row in batch], dtype=f"S{HASH_BYTES}")
+        if sorted_hashes is not None and len(sorted_hashes):
+            pos = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+            parent_pos = np.where(sorted_hashes[pos] == hashes, order[pos], -1)
+        else:
+            parent_pos = np.full(len(hashes), -1)
+        out = np.empty(len(batch), dtype=np.int64)
+        for i in np.flatnonzero(parent_pos < 0):
+            row = batch[i]
+            pending["_hash"].append(hashes[i].ljust(HASH_BYTES, b"\0"))
+            for c, key in enumerate(keys):
+                value = row[c] if c < len(row) else None
+                pending[key].append(None if value is None else str(value))
+            out[i] = -(seg_rows + 1)
+            seg_rows += 1
+            flush()
+        found_rows = parent_pos >= 0
+        out[found_rows] = parent_pos[found_rows]
+        refs.append(out)
+        return seg_rows
+
+    # -----------------------------------------------------------------------
+    # Reading
+    # -----------------------------------------------------------------------
+
+    def iter_tab_chunks(self, stem: str, tab: int = 0, keys: list = None, chunk_rows: int = None):
+        """
+        Rows of one tab of a version in order, as ({key: [values]}, hashes) chunks
+        of up to chunk_rows rows. keys limits the columns read (None = all).
+        """
+        resolved = self.resolve(stem)
+        spec = resolved.manifest["tabs"][tab]
+        keys = spec["keys"] if keys is None else keys
+        chunk_rows = chunk_rows or int(self.settings["CHUNK_ROWS"])
+        seg_idx, seg_row = resolved.tabs[tab]
+        files, cache = {}, {}
+
+        def segment(i: int) -> pq.ParquetFile:
+            if i not in files:
+                files[i] = pq.ParquetFile(self.root / resolved.segments[i])
+            return files[i]
+
+        def row_group(i: int, rg: int) -> pa.Table:
+            if (i, rg) not in cache:
+                if len(cache) >= ROW_GROUP_CACHE:
+                    cache.pop(next(iter(cache)))
+                present = [k for k in ["_hash"] + keys if k in segment(i).schema_arrow.names]
+                cache[(i, rg)] = segment(i).read_row_group(rg, columns=present)
+            return cache[(i, rg)]
+
+        for start in range(0, len(seg_idx), chunk_rows):
+            idx, row = seg_idx[start:start + chunk_rows], seg_row[start:start + chunk_rows]
+            hashes = np.empty(len(idx), dtype=f"S{HASH_BYTES}")
+            columns = {k: [None] * len(idx) for k in keys}
+            for i in np.unique(idx):
+                # Every row group but the last is full
+                per_group = segment(int(i)).metadata.row_group(0).num_rows
+                in_seg = np.flatnonzero(idx == i)
+                groups = row[in_seg] // per_group
+                for rg in np.unique(groups):
+                    sel = in_seg[groups == rg]
+                    table = row_group(int(i), int(rg))
+                    take = pa.array(row[sel] - rg * per_group)
+                    hashes[sel] = _hash_array(table.column("_hash").take(take))
+                    for k in keys:
+                        if k in table.column_names:
+                            values = table.column(k).take(take).to_pylist()
+                            column = columns[k]
+                            for j, v in zip(sel, values):
+                                column[j] = v
+            yield columns, hashes
+
+    def materialize(self, stem: str, out_path: Path) -> Path:
+        """Write version `stem` as an xlsx (write-only workbook, tab by tab)."""
+        manifest = self.manifest(stem)
+        if manifest is None:
+            raise FileNotFoundError(f"{stem} is not in the archive {self.root}")
+        out_path = Path(out_path)
+        tmp = out_path.with_name(out_path.name + ".tmp")
+        wb = Workbook(write_only=True)
+        for t, spec in enumerate(manifest["tabs"]):
+            ws = wb.create_sheet(title=spec["title"])
+            if spec["header"]:
+                ws.append(spec["header"])
+            keys = spec["keys"]
+            for columns, hashes in self.iter_tab_chunks(stem, t):
+                for row in zip(*(columns[k] for k in keys)) if keys else ([] for _ in hashes):
+                    row = list(row)
+                    while row and row[-1] is None:
+                        row.pop()
+                    ws.append(row)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        wb.save(tmp)
+        os.replace(tmp, out_path)
+        # Marks the file as a view of this version, so eviction may remove it again
+        self.manifest_path(stem).with_suffix(".view").write_text(_stamp(out_path), encoding="utf-8")
+        return out_path
+
+    def is_archived(self, xlsx_path: Path) -> bool:
+        """True when xlsx_path is exactly what the archive holds for its date (archived or materialised)."""
+        manifest = self.manifest(xlsx_path.stem)
+        if manifest is None or not xlsx_path.exists():
+            return False
+        stamp = _stamp(xlsx_path)
+        view = self.manifest_path(xlsx_path.stem).with_suffix(".view")
+        return stamp == manifest["source_stamp"] or (view.exists() and view.read_text(encoding="utf-8") == stamp)
+
+    def evict(self, output_dir: Path, prefix: str, keep: Path = None, today=None) -> list:
+        """
+        Remove archived dated xlsx (and their export sidecars) older than
+        KEEP_DAYS (at least today's stay), except `keep`.
+        """
+        today = today or datetime.now().date()
+        cutoff = today - timedelta(days=max(1, int(self.settings["KEEP_DAYS"])) - 1)
+        removed = []
+        for path in Path(output_dir).glob(f"{prefix}*.xlsx"):
+            day = _stem_date(path.stem)
+            if day is None or day >= cutoff or path == keep or not self.is_archived(path):
+                continue
+            path.unlink()
+            path.with_name(path.name + ".rev.json").unlink(missing_ok=True)
+            removed.append(path)
+        return removed
+
+    def stats(self) -> list:
+        out = []
+        for stem in self.versions():
+            manifest = self.manifest(stem)
+            seg_bytes = sum((self.root / t["segment"]).stat().st_size for t in manifest["tabs"] if t["segment"])
+            out.append({"stem": stem, "parent": manifest["parent"], "rows": manifest["rows"],
+                        "new_rows": manifest["new_rows"], "segment_bytes": seg_bytes,
+                        "source_bytes": manifest["source_bytes"]})
+        return out
+
+
+def _runs(refs: np.ndarray) -> list:
+    """Run-length encode refs (parent position >= 0, -(segment row + 1) < 0) as [kind, start, count]."""
+    if not len(refs):
+        return []
+    from_parent = refs >= 0
+    values = np.where(from_parent, refs, -refs - 1)
+    breaks = np.flatnonzero((from_parent[1:] != from_parent[:-1]) | (values[1:] != values[:-1] + 1)) + 1
+    starts = np.concatenate([[0], breaks])
+    counts = np.diff(np.concatenate([starts, [len(refs)]]))
+    return [["p" if from_parent[s] else "n", int(values[s]), int(c)] for s, c in zip(starts, counts)]
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+
+def archive_snapshot(xlsx_path: Path, config: dict) -> dict:
+    """Archive a freshly downloaded dated snapshot, then evict old archived xlsx next to it."""
+    xlsx_path = Path(xlsx_path)
+    archive = SnapshotArchive.for_output_dir(xlsx_path.parent, config)
+    with _lock:
+        manifest = archive.add(xlsx_path)
+        # The snapshot just downloaded is about to be read, whatever its date
+        prefix = DATED_STEM.match(xlsx_path.stem).group("prefix")
+        for path in archive.evict(xlsx_path.parent, prefix, keep=xlsx_path):
+            print(f"[INFO] Evicted archived snapshot {path.name}")
+    return manifest
+
+
+def snapshot_path(output_dir, stem: str, config: dict) -> Path:
+    """
+    OUTPUT_DIR/<stem>.xlsx, materialised from the archive when it was evicted.
+    Raises FileNotFoundError when neither exists.
+    """
+    path = Path(output_dir) / f"{stem}.xlsx"
+    if path.exists():
+        return path
+    archive = SnapshotArchive.for_output_dir(output_dir, config)
+    with _lock:
+        if not path.exists():
+            archive.materialize(stem, path)
+    return path
+
+
+def is_manifest(path) -> bool:
+    path = Path(path)
+    return path.suffix == MANIFEST_SUFFIX and path.parent.name == "versions"
+
+
+def snapshot_of(manifest_path: Path) -> Path:
+    """The dated xlsx a version manifest stands for (OUTPUT_DIR/<stem>.xlsx)."""
+    manifest_path = Path(manifest_path)
+    return manifest_path.parent.parent.parent / f"{manifest_path.stem}.xlsx"
+
+
+def archived_only(folder, config: dict) -> list:
+    """
+    Version manifests under `folder` (recursively) whose dated xlsx is no
+    longer on disk, for source scans that glob *.xlsx: lead_loader reads them
+    like the xlsx.
+    """
+    settings = archive_settings(config)
+    return [path for path in Path(folder).rglob(f"{settings['DIR']}/versions/*{MANIFEST_SUFFIX}")
+            if _stem_date(path.stem) and not snapshot_of(path).exists()]
+
+
+def iter_manifest_chunks(manifest_path: Path, usecols=None, chunk_rows: int = None):
+    """
+    lead_loader.iter_sheet_chunks() for an archived version: the first tab as
+    {header: [values]} chunks, only headers in usecols, fully empty rows skipped.
+    """
+    manifest_path = Path(manifest_path)
+    archive = SnapshotArchive(manifest_path.parent.parent, {**DEFAULT_SNAPSHOT_ARCHIVE})
+    manifest = archive.manifest(manifest_path.stem)
+    if manifest is None:
+        raise FileNotFoundError(f"{manifest_path} is not an archive version")
+    spec = manifest["tabs"][0] if manifest["tabs"] else {"header": [], "keys": []}
+    picked = [(h, k) for h, k in zip(spec["header"], spec["keys"])
+              if h is not None and (usecols is None or h in usecols)]
+    if not manifest["tabs"] or not spec["rows"]:
+        yield {h: [] for h, _ in picked}
+        return
+    keys = [k for _, k in picked]
+    for columns, hashes in archive.iter_tab_chunks(manifest_path.stem, 0, keys, chunk_rows):
+        keep = hashes != EMPTY_ROW_HASH
+        yield {h: [v for v, k in zip(columns[key], keep) if k] for h, key in picked}
+
+
+def main() -> int:
+    from main import load_config
+
+    parser = argparse.ArgumentParser(description="Deduplicated archive of the daily sheet snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="Archive every dated xlsx in OUTPUT_DIR (oldest first), then evict")
+    sub.add_parser("list", help="Archived versions and their sizes")
+    p = sub.add_parser("materialize", help="Write leads_DDMMYYYY.xlsx back from the archive")
+    p.add_argument("date", help="DDMMYYYY")
+    args = parser.parse_args()
+
+    config = load_config()
+    output_dir = Path(config.get("OUTPUT_DIR", "leads_agent_excel_files"))
+    prefix = config.get("OUTPUT_PREFIX", "leads_")
+    archive = SnapshotArchive.for_output_dir(output_dir, config)
+    if args.command == "import":
+        paths = sorted((p for p in output_dir.glob(f"{prefix}*.xlsx") if _stem_date(p.stem)),
+                       key=lambda p: _stem_date(p.stem))
+        for path in paths:
+            manifest = archive_snapshot(path, config) if path.exists() else None
+            if manifest:
+                print(f"[OK] {path.name}: {manifest['rows']} rows, {manifest['new_rows']} new")
+    elif args.command == "list":
+        for s in archive.stats():
+            print(f"{s['stem']}  parent={s['parent'] or '-':<16} rows={s['rows']:<8} new={s['new_rows']:<8} "
+                  f"archived={s['segment_bytes'] / 1e6:.2f} MB  xlsx={s['source_bytes'] / 1e6:.2f} MB")
+    else:
+        path = snapshot_path(output_dir, f"{prefix}{args.date}", config)
+        print(f"[OK] Materialised {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+"""
+Structured bounce summaries.
+
+Instead of free text with max_tokens=2048, the model is constrained by a GBNF
+grammar to a small JSON object:
+
+    {"cause": "...", "category": "mailbox_full", "action": "..."}
+
+`cause` and `action` are capped at a per-field token budget (enforced as a
+character cap in the grammar), `category` is a fixed enum, and the completion
+budget is the sum of the field budgets, so decoding stops as soon as the object
+is closed instead of rambling or echoing the prompt.
+"""
+import json
+import re
+
+CATEGORIES = [
+    "invalid_address",
+    "mailbox_full",
+    "policy_block",
+    "spam_block",
+    "domain_error",
+    "temporary_failure",
+    "other",
+]
+
+DEFAULT_STRUCTURED_SUMMARY = {
+    "ENABLED": True,
+    "CAUSE_TOKENS": 40,
+    "ACTION_TOKENS": 30,
+}
+
+# Rough English average for BPE vocabularies; used to turn token budgets into grammar char caps
+CHARS_PER_TOKEN = 4
+# Keys, quotes, punctuation and the category value
+OVERHEAD_TOKENS = 24
+
+STOP_SEQUENCES = ["\n\n"]
+
+MISSING_VALUES = {"", "n/a", "nan", "none", "null"}
+
+
+def build_summary_grammar(cause_tokens: int, action_tokens: int) -> str:
+    """GBNF grammar for {"cause", "category", "action"} with bounded string fields."""
+    categories = " | ".join(f'"\\"{c}\\""' for c in CATEGORIES)
+    return f"""root ::= "{{" ws "\\"cause\\":" ws cause "," ws "\\"category\\":" ws category "," ws "\\"action\\":" ws action ws "}}"
+cause ::= "\\"" char{{1,{cause_tokens * CHARS_PER_TOKEN}}} "\\""
+action ::= "\\"" char{{1,{action_tokens * CHARS_PER_TOKEN}}} "\\""
+category ::= {categories}
+char ::= [^"\\\\\\n]
+ws ::= " "?
+"""
+
+
+def max_summary_tokens(cause_tokens: int, action_tokens: int) -> int:
+    return cause_tokens + action_tokens + OVERHEAD_TOKENS
+
+
+def build_structured_query(status, bounce_code, bounce_reason, gmail_excerpt: str = "") -> str:
+    """
+    Prompt with only the delivery facts the model needs. Lead identity is
+    already printed in the report, so it is left out to avoid it being echoed.
+    """
+    cause = "one sentence naming the concrete delivery failure"
+    if known_bounce_code(bounce_code):
+        cause += ", quoting the bounce code"
+    query = f"""Explain why this email was not delivered.
+
+Status: {status}
+Bounce Code: {bounce_code}
+Bounce Reason: {bounce_reason}
+"""
+    if gmail_excerpt:
+        query += f"Gmail excerpt: {gmail_excerpt}\n"
+    query += f"""
+Answer as JSON with:
+- cause: {cause}
+- category: one of {", ".join(CATEGORIES)}
+- action: one short sentence on what to do next
+"""
+    return query
+
+
+def parse_structured_summary(text: str) -> dict:
+    """
+    Parse the model output into {"cause", "category", "action"}.
+    Falls back to field-wise extraction, then to the raw text as the cause.
+    """
+    text = (text or "").strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = {}
+        for field in ("cause", "category", "action"):
+            m = re.search(rf'"{field}"\s*:\s*"([^"]*)', text)
+            if m:
+                data[field] = m.group(1)
+        if not data:
+            data = {"cause": text}
+
+    category = str(data.get("category", "other")).strip().lower()
+    return {
+        "cause": str(data.get("cause", "")).strip(),
+        "category": category if category in CATEGORIES else "other",
+        "action": str(data.get("action", "")).strip(),
+    }
+
+
+def known_bounce_code(bounce_code) -> str:
+    """The bounce code as text, or "" when the sheet has none."""
+    if isinstance(bounce_code, float) and bounce_code.is_integer():
+        bounce_code = int(bounce_code)  # 550 read as 550.0 from the sheet
+    code = str(bounce_code if bounce_code is not None else "").strip()
+    return "" if code.lower() in MISSING_VALUES else code
+
+
+def validate_summary(summary, bounce_code=None) -> list:
+    """
+    Problems that make a summary worth regenerating with a bigger model
+    (model_router.routed): an empty cause, or a known bounce code (e.g.
+    "550 5.1.1") that neither the cause nor the action mentions. Works on
+    structured dicts and free-form text.
+    """
+    if isinstance(summary, dict):
+        cause, text = summary.get("cause", ""), f"{summary.get('cause', '')} {summary.get('action', '')}"
+    else:
+        cause = text = str(summary or "")
+    problems = []
+    if not cause.strip():
+        problems.append("empty_cause")
+    code = known_bounce_code(bounce_code)
+    if code and not any(part in text for part in code.split()):
+        problems.append("missing_bounce_code")
+    return problems
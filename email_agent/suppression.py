@@ -0,0 +1,263 @@
+"""
+Pre-send recipient filtering with a persistent suppression index.
+
+send_emails_to_leads used to send to every non-empty address in the sheet,
+including ones that hard-bounced in earlier campaigns. Before any email is
+rendered, filter_recipients() now drops, with vectorised pandas operations:
+
+- addresses that are not syntactically valid (RFC 5322 dot-atom subset);
+- duplicates (case-insensitive, first row wins);
+- addresses in the suppression index;
+- addresses already in today's send journal (a re-run after a crash does not
+  send twice).
+
+The suppression index (SUPPRESSION.INDEX_FILE) is a set of address hashes
+kept on disk. It is refreshed incrementally from every source file whose
+mtime changed since it was last read:
+
+- bounce_log.jsonl files (bounces parsed from Gmail DSNs, see bounce_ingest);
+- downloaded lead sheets (*.xlsx with bounce_code; versions in the snapshot
+  archive once the xlsx was evicted);
+- generated reports (report_*.txt, CATEGORY lines of structured summaries).
+
+Only hard bounces suppress: status codes starting with one of
+HARD_BOUNCE_CODES (bad mailbox / address) or report CATEGORIES.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lead_loader import iter_sheet_chunks
+from snapshot_archive import archived_only
+from telemetry import METRICS
+
+DEFAULT_SUPPRESSION = {
+    "ENABLED": True,
+    "INDEX_FILE": "leads_agent_excel_files/suppression_index.json",
+    # Scanned recursively (campaign subfolders included)
+    "SOURCE_DIRS": ["leads_agent_excel_files", "excel_leads_daily_list"],
+    # RFC 3463: 5.1.x = bad destination mailbox/address, 5.2.1 = mailbox disabled
+    "HARD_BOUNCE_CODES": ["5.1.", "5.2.1"],
+    "CATEGORIES": ["invalid_address"],
+}
+
+INDEX_VERSION = 1
+
+# Pragmatic RFC 5322 dot-atom: local@domain.tld, no quoted local parts or IP literals
+EMAIL_SYNTAX = (
+    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}"
+)
+
+REPORT_ENTRY = re.compile(r"^EMAIL: (?P<email>.*?)$.*?^CATEGORY: (?P<category>\w+)$", re.MULTILINE | re.DOTALL)
+ENTRY_SEPARATOR = "-" * 117
+
+_lock = threading.Lock()
+
+
+def suppression_settings(config: dict) -> dict:
+    return {**DEFAULT_SUPPRESSION, **config.get("SUPPRESSION", {})}
+
+
+def normalize_email(value) -> str:
+    return "" if value is None or pd.isna(value) else str(value).strip().lower()
+
+
+def email_hash(email: str) -> str:
+    return hashlib.sha256(email.encode("utf-8")).hexdigest()[:16]
+
+
+def _is_hard_bounce(code, prefixes: list) -> bool:
+    code = normalize_email(code)
+    return bool(code) and any(code.startswith(p) for p in prefixes)
+
+
+# ---------------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------------
+
+def _from_bounce_log(path: Path, settings: dict) -> dict:
+    out = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if _is_hard_bounce(row.get("bounce_code"), settings["HARD_BOUNCE_CODES"]):
+                out[normalize_email(row.get("email"))] = row.get("bounce_code")
+    return out
+
+
+def _from_sheet(path: Path, settings: dict, email_col: str) -> dict:
+    out = {}
+    for chunk in iter_sheet_chunks(path, usecols={email_col, "bounce_code"}):
+        for email, code in zip(chunk.get(email_col, []), chunk.get("bounce_code", [])):
+            if _is_hard_bounce(code, settings["HARD_BOUNCE_CODES"]):
+                out[normalize_email(email)] = str(code)
+    return out
+
+
+def _from_report(path: Path, settings: dict) -> dict:
+    categories = {c.lower() for c in settings["CATEGORIES"]}
+    out = {}
+    for entry in path.read_text(encoding="utf-8").split(ENTRY_SEPARATOR):
+        m = REPORT_ENTRY.search(entry)
+        if m and m.group("category").lower() in categories:
+            out[normalize_email(m.group("email"))] = m.group("category").lower()
+    return out
+
+
+def _sources(settings: dict, config: dict) -> list:
+    files = []
+    for folder in settings["SOURCE_DIRS"]:
+        folder = Path(folder)
+        if not folder.exists():
+            continue
+        files += [(p, "bounce_log") for p in folder.rglob("bounce_log*.jsonl")]
+        files += [(p, "sheet") for p in folder.rglob("*.xlsx") if "exports" not in p.parts]
+        # Snapshots evicted by the snapshot archive are read from it
+        files += [(p, "sheet") for p in archived_only(folder, config)]
+        files += [(p, "report") for p in folder.rglob("report_*.txt")]
+    return files
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+def _load_index(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"version": INDEX_VERSION, "sources": {}, "entries": {}}
+    if data.get("version") != INDEX_VERSION:
+        return {"version": INDEX_VERSION, "sources": {}, "entries": {}}
+    return data
+
+
+def refresh_index(config: dict) -> set:
+    """
+    Re-read every source whose size/mtime changed, save the index and return
+    the set of suppressed address hashes.
+    """
+    settings = suppression_settings(config)
+    email_col = config.get("EMAIL_CONFIG", {}).get("EMAIL_COLUMN", "email")
+    path = Path(settings["INDEX_FILE"])
+
+    with _lock, METRICS.timer("suppression_refresh"):
+        index = _load_index(path)
+        changed = 0
+        for source, kind in _sources(settings, config):
+            stat = source.stat()
+            stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+            key = str(source)
+            if index["sources"].get(key) == stamp:
+                continue
+            try:
+                if kind == "bounce_log":
+                    found = _from_bounce_log(source, settings)
+                elif kind == "sheet":
+                    found = _from_sheet(source, settings, email_col)
+                else:
+                    found = _from_report(source, settings)
+            except Exception as e:
+                print(f"[ERROR] Suppression index: could not read {source}: {e}")
+                continue
+            for email, reason in found.items():
+                if email:
+                    index["entries"][email_hash(email)] = {"reason": reason, "source": source.name}
+            index["sources"][key] = stamp
+            changed += 1
+
+        if changed:
+            index["updated_at"] = datetime.now().astimezone().isoformat(timespec="seconds")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(json.dumps(index), encoding="utf-8")
+            os.replace(tmp, path)
+    METRICS.set_gauge("suppression_index_size", len(index["entries"]))
+    return set(index["entries"])
+
+
+# ---------------------------------------------------------------------------
+# Filtering
+# ---------------------------------------------------------------------------
+
+class SeenAddresses:
+    """
+    Addresses kept by earlier chunks of a streamed sheet (streaming.py), as a
+    sorted array of 64-bit address hashes: 8 bytes per address instead of a
+    Python str in a set.
+    """
+
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def check_and_add(self, emails) -> np.ndarray:
+        """Boolean mask: which of `emails` (normalised) were added by an earlier call. Adds them all."""
+        hashes = np.fromiter((int(email_hash(e), 16) for e in emails), dtype=np.uint64, count=len(emails))
+        if len(self._hashes):
+            pos = np.minimum(np.searchsorted(self._hashes, hashes), len(self._hashes) - 1)
+            seen = self._hashes[pos] == hashes
+        else:
+            seen = np.zeros(len(hashes), dtype=bool)
+        self._hashes = np.union1d(self._hashes, hashes)
+        return seen
+
+
+def filter_recipients(df: pd.DataFrame, email_column: str, config: dict, already_sent: set = None,
+                      seen: SeenAddresses = None, suppressed_hashes: set = None) -> tuple:
+    """
+    (rows to send to, skipped counts). Counts are per reason, in the order
+    empty -> invalid -> duplicate -> suppressed -> already_sent.
+
+    When the sheet is filtered chunk by chunk, `seen` carries the addresses of
+    earlier chunks for the duplicate check, and `suppressed_hashes` (from
+    refresh_index) saves re-reading the index for every chunk.
+    """
+    skipped = {"empty": 0, "invalid": 0, "duplicate": 0, "suppressed": 0, "already_sent": 0}
+    if email_column not in df.columns:
+        return df.iloc[0:0], skipped
+
+    emails = df[email_column].astype("string").str.strip().str.lower().fillna("")
+    keep = emails != ""
+    skipped["empty"] = int((~keep).sum())
+
+    valid = emails.str.fullmatch(EMAIL_SYNTAX).fillna(False).astype(bool)
+    skipped["invalid"] = int((keep & ~valid).sum())
+    keep &= valid
+
+    duplicate = emails.duplicated(keep="first")
+    if seen is not None:
+        first = keep & ~duplicate
+        duplicate[first] = seen.check_and_add(emails[first])
+    skipped["duplicate"] = int((keep & duplicate).sum())
+    keep &= ~duplicate
+
+    if suppression_settings(config)["ENABLED"]:
+        if suppressed_hashes is None:
+            suppressed_hashes = refresh_index(config)
+        if suppressed_hashes:
+            suppressed = emails.where(keep, "").map(lambda e: bool(e) and email_hash(e) in suppressed_hashes)
+            skipped["suppressed"] = int(suppressed.sum())
+            keep &= ~suppressed.astype(bool)
+
+    if already_sent:
+        sent = emails.isin(already_sent)
+        skipped["already_sent"] = int((keep & sent).sum())
+        keep &= ~sent
+
+    for reason, count in skipped.items():
+        if count:
+            METRICS.inc("recipients_skipped_total", count, reason=reason)
+    return df[keep], skipped
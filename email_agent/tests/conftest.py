@@ -0,0 +1,40 @@
+"""
+main.py reads config.json from the working directory at import, so the tests
+run in a throwaway working directory with the offline config the benchmarks
+use (benchmarks/run_pipeline.py). Run from email_agent/:
+
+    python -m pytest tests
+"""
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+TESTS_DIR = Path(__file__).resolve().parent
+AGENT_DIR = TESTS_DIR.parent
+FIXTURES = TESTS_DIR / "fixtures"
+sys.path.insert(0, str(AGENT_DIR))
+sys.path.insert(0, str(AGENT_DIR / "benchmarks"))
+# telemetry.py, hw_profile.py, ... (main.py appends this too)
+sys.path.append(str(AGENT_DIR.parent))
+
+from run_pipeline import _prepare_workdir  # noqa: E402
+
+_WORKDIR = Path(tempfile.mkdtemp(prefix="email_agent_tests_"))
+_prepare_workdir(_WORKDIR, datetime.now().strftime("%d%m%Y"), gmail_pull=False)
+os.chdir(_WORKDIR)
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def config(tmp_path):
+    """The test config.json, writing everything under a per-test OUTPUT_DIR."""
+    cfg = json.loads((_WORKDIR / "config.json").read_text(encoding="utf-8"))
+    cfg["OUTPUT_DIR"] = str(tmp_path / "leads_agent_excel_files")
+    return cfg
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from bounce_clustering import clustering_settings, cluster_leads
+
+
+def _embed_all_alike(calls):
+    """Every text gets the same vector, so only the bounce_code partition can keep leads apart."""
+    def embed(texts):
+        calls.append(list(texts))
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+    return embed
+
+
+def test_cluster_leads_never_groups_across_bounce_codes():
+    filtered = pd.DataFrame({
+        "bounce_code": ["5.2.2", "5.1.1", "5.2.2", "5.2.2", "5.1.1"],
+        "bounce_reason": ["mailbox full", "no such user a@x.com", "quota exceeded",
+                          "mailbox full", "no such user b@x.com"],
+    }, index=[10, 11, 12, 13, 14])
+    calls = []
+    clusters = cluster_leads(filtered, "bounce_reason", _embed_all_alike(calls), threshold=0.9)
+    assert clusters == [[10, 12, 13], [11, 14]]
+    # Only 5.2.2 has two distinct texts; 5.1.1 differs by address alone and needs no embedding
+    assert calls == [["5.2.2 mailbox full", "5.2.2 quota exceeded"]]
+
+
+def test_cluster_leads_single_text_per_code_needs_no_model():
+    filtered = pd.DataFrame({"bounce_code": ["5.1.1", "5.2.2"], "bounce_reason": ["gone", "full"]})
+    assert cluster_leads(filtered, "bounce_reason", None, threshold=0.9) == [[0], [1]]
+
+
+def test_clustering_is_off_without_an_embedding_model():
+    assert clustering_settings({})["ENABLED"] is False
+    assert clustering_settings({"EMBEDDING_MODEL_PATH": "bge-small.gguf"})["ENABLED"] is True
+    assert clustering_settings({"ENABLED": True})["ENABLED"] is True
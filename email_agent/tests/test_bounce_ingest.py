@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from conftest import FIXTURES
+from bounce_ingest import (
+    append_journal, bounce_settings, ingest_bounces, journal_path, load_bounce_log, merge_bounce_log, parse_dsn,
+)
+from fakes import FakeGmailService
+from telemetry import METRICS
+
+
+def _dsn(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+def _deliver(gmail: FakeGmailService, name: str, sender: str = None) -> str:
+    """Put a fixture message in the fake inbox and the mailbox history."""
+    gmail.history_id += 1
+    message_id = f"msg{gmail.history_id:04d}"
+    gmail.inbox[message_id] = {
+        "from": sender or "Mail Delivery Subsystem <mailer-daemon@googlemail.com>",
+        "raw": _dsn(name) if name.endswith(".eml") else name.encode(),
+        "internalDate": str(int(time.time() * 1000)),
+    }
+    gmail.history.append((message_id, gmail.history_id))
+    return message_id
+
+
+def _journal(config: dict, *entries) -> None:
+    date_str = datetime.now().strftime("%d%m%Y")
+    append_journal(journal_path(Path(config["OUTPUT_DIR"]), date_str), [
+        {"email": email, "lead_id": lead_id, "gmail_msg_id": msg_id, "sent_at": sent_at}
+        for email, lead_id, msg_id, sent_at in entries
+    ])
+
+
+# ---------------------------------------------------------------------------
+# parse_dsn
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("name, email, status, diagnostic", [
+    ("gmail_5_1_1.eml", "test1@gmail.com", "5.1.1", "550-5.1.1 The email account that you tried to reach does not exist"),
+    ("gmail_5_2_2.eml", "test2@gmail.com", "5.2.2", "552-5.2.2 The recipient's inbox is out of storage space"),
+])
+def test_parse_dsn_gmail_failure(name, email, status, diagnostic):
+    [failure] = parse_dsn(_dsn(name))
+    assert failure["email"] == email
+    assert failure["status"] == status
+    assert failure["action"] == "failed"
+    # 'smtp; ' is stripped and the folded Diagnostic-Code comes back as one line
+    assert failure["diagnostic"].startswith(diagnostic)
+    assert "\n" not in failure["diagnostic"]
+
+
+def test_parse_dsn_delayed_is_not_a_bounce():
+    assert parse_dsn(_dsn("gmail_4_4_1_delayed.eml")) == []
+
+
+def test_parse_dsn_without_delivery_status_uses_x_failed_recipients():
+    [failure] = parse_dsn(_dsn("exim_x_failed_recipients.eml"))
+    assert failure["email"] == "eva.brown@business.net"
+    assert failure["status"] == "5.1.1"
+    assert "User unknown" in failure["diagnostic"]
+
+
+def test_parse_dsn_mailer_daemon_notice_without_recipients():
+    assert parse_dsn(_dsn("mailer_daemon_notice.eml")) == []
+
+
+# ---------------------------------------------------------------------------
+# ingest_bounces
+# ---------------------------------------------------------------------------
+
+def test_ingest_bounces_matches_journal_and_skips_the_rest(config):
+    _journal(config,
+             ("test1@gmail.com", "1", "19c3cade56d76d8b", "2026-02-08T15:25:55+05:30"),
+             ("test2@gmail.com", "2", "19c3caf48d8eb6f0", "2026-02-08T15:27:26+05:30"),
+             ("chloe.smith@example.com", "3", "19c3cb0aaf2a03ab", "2026-02-08T15:28:57+05:30"))
+    gmail = FakeGmailService(sender="sender@example.com")
+    for name in ("gmail_5_1_1.eml", "gmail_5_2_2.eml", "gmail_4_4_1_delayed.eml",
+                 "exim_x_failed_recipients.eml", "mailer_daemon_notice.eml"):
+        _deliver(gmail, name)
+    METRICS.reset()
+
+    # First run: no historyId yet, so the mailer-daemon search is used
+    bounces = ingest_bounces(config, gmail=gmail)
+
+    assert {(b["email"], b["gmail_msg_id"], b["bounce_code"]) for b in bounces} == {
+        ("test1@gmail.com", "19c3cade56d76d8b", "5.1.1"),
+        ("test2@gmail.com", "19c3caf48d8eb6f0", "5.2.2"),
+    }
+    # eva.brown bounced but was never sent from this journal
+    assert METRICS.counter_total("bounces_unmatched_total") == 1
+    settings = bounce_settings(config)
+    assert len(settings["LOG_FILE"].read_text(encoding="utf-8").splitlines()) == 2
+    assert json.loads(settings["STATE_FILE"].read_text(encoding="utf-8"))["history_id"] == str(gmail.history_id)
+    assert gmail.calls.get("history.list", 0) == 0
+
+
+def test_ingest_bounces_resumes_from_history(config):
+    _journal(config,
+             ("test1@gmail.com", "1", "19c3cade56d76d8b", "2026-02-08T15:25:55+05:30"),
+             ("test2@gmail.com", "2", "19c3caf48d8eb6f0", "2026-02-08T15:27:26+05:30"))
+    gmail = FakeGmailService(sender="sender@example.com")
+    _deliver(gmail, "gmail_5_1_1.eml")
+    assert len(ingest_bounces(config, gmail=gmail)) == 1
+
+    # Nothing new: one history page, no message fetched
+    gets = gmail.calls.get("messages.get", 0)
+    assert ingest_bounces(config, gmail=gmail) == []
+    assert gmail.calls.get("messages.get", 0) == gets
+
+    # A reply from a person and a new DSN: only the DSN is fetched in full
+    _deliver(gmail, "Subject: Re: Quick question\r\n\r\nThanks!\r\n", sender="Bob <test2@gmail.com>")
+    _deliver(gmail, "gmail_5_2_2.eml")
+    [bounce] = ingest_bounces(config, gmail=gmail)
+    assert bounce["email"] == "test2@gmail.com"
+    assert gmail.calls["history.list"] == 2
+    assert len(bounce_settings(config)["LOG_FILE"].read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_ingest_bounces_unmatched_recipient_is_not_logged(config):
+    gmail = FakeGmailService(sender="sender@example.com")
+    _deliver(gmail, "gmail_5_1_1.eml")
+    METRICS.reset()
+    assert ingest_bounces(config, gmail=gmail) == []
+    assert METRICS.counter_total("bounces_unmatched_total") == 1
+    assert not bounce_settings(config)["LOG_FILE"].exists() or \
+        bounce_settings(config)["LOG_FILE"].read_text(encoding="utf-8") == ""
+
+
+def test_concurrent_ingest_logs_each_bounce_once(config):
+    # The bounce watcher and verify ingesting for the same campaign at the same time
+    _journal(config,
+             ("test1@gmail.com", "1", "19c3cade56d76d8b", "2026-02-08T15:25:55+05:30"),
+             ("test2@gmail.com", "2", "19c3caf48d8eb6f0", "2026-02-08T15:27:26+05:30"))
+    gmail = FakeGmailService(latency_s=0.01, sender="sender@example.com")
+    _deliver(gmail, "gmail_5_1_1.eml")
+    _deliver(gmail, "gmail_5_2_2.eml")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ingest_bounces(config, gmail=gmail)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(len(r) for r in results) == [0, 0, 0, 2]
+    assert len(bounce_settings(config)["LOG_FILE"].read_text(encoding="utf-8").splitlines()) == 2
+
+
+# ---------------------------------------------------------------------------
+# merge_bounce_log
+# ---------------------------------------------------------------------------
+
+def _write_log(config: dict, *rows) -> None:
+    append_journal(bounce_settings(config)["LOG_FILE"], [{
+        "email": email, "lead_id": None, "gmail_msg_id": msg_id, "sent_at": sent_at, "bounce_code": code,
+        "bounce_reason": f"{code} bounced", "bounced_at": sent_at, "dsn_msg_id": f"dsn-{msg_id}",
+    } for email, msg_id, sent_at, code in rows])
+
+
+def _sheet(rows) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=["email", "sent_at", "gmail_msg_id"])
+    df["sent_at"] = pd.to_datetime(df["sent_at"], utc=True).dt.tz_convert("Asia/Kolkata")
+    return df
+
+
+def test_merge_bounce_log_matches_by_gmail_msg_id(config):
+    _write_log(config, ("a@x.com", "m1", "2026-02-08T10:00:03+05:30", "5.1.1"))
+    merged = merge_bounce_log(_sheet([("a@x.com", "2026-02-08T10:00:00+05:30", "m1"),
+                                      ("b@x.com", "2026-02-08T10:01:00+05:30", "m2")]), config)
+    assert merged["bounce_code"].tolist()[0] == "5.1.1"
+    assert pd.isna(merged["bounce_code"].tolist()[1])
+    assert merged["sent_at"].iloc[0] == pd.Timestamp("2026-02-08T10:00:00+05:30")
+
+
+def test_merge_bounce_log_ignores_an_old_bounce_of_a_re_added_lead(config):
+    # Bounced weeks ago, re-added to the sheet and not sent yet / sent again since
+    _write_log(config, ("a@x.com", "old", "2026-01-10T10:00:00+05:30", "5.1.1"))
+    merged = merge_bounce_log(_sheet([("a@x.com", None, None),
+                                      ("a@x.com", "2026-02-08T10:00:00+05:30", "new")]), config)
+    # No match: the rows come back untouched
+    assert "bounce_code" not in merged.columns and "bounce_reason" not in merged.columns
+    assert merged["sent_at"].isna().tolist() == [True, False]
+
+
+def test_merge_bounce_log_falls_back_to_email_and_send_day(config):
+    _write_log(config, ("a@x.com", "m1", "2026-02-08T10:00:03+05:30", "5.2.2"))
+    sheet = _sheet([("A@x.com", "2026-02-08T10:00:00+05:30", None),
+                    ("a@x.com", "2026-02-09T10:00:00+05:30", None)])
+    merged = merge_bounce_log(sheet, config)
+    assert merged["bounce_code"].tolist()[0] == "5.2.2"
+    assert pd.isna(merged["bounce_code"].tolist()[1])
+
+
+def test_load_bounce_log_keeps_every_bounced_send(config):
+    _write_log(config,
+               ("a@x.com", "m1", "2026-01-10T10:00:00+05:30", "5.1.1"),
+               ("a@x.com", "m2", "2026-02-08T10:00:00+05:30", "5.2.2"),
+               ("a@x.com", "m2", "2026-02-08T10:00:00+05:30", "5.2.2"))
+    assert load_bounce_log(config)["gmail_msg_id"].tolist() == ["m1", "m2"]
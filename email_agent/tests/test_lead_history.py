@@ -0,0 +1,81 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from bounce_ingest import append_journal, bounce_settings
+from lead_history import LeadHistory
+
+
+@pytest.fixture
+def history(config, tmp_path):
+    config["LEAD_HISTORY"] = {"DB_FILE": str(tmp_path / "history.sqlite"), "SOURCE_DIRS": [config["OUTPUT_DIR"]]}
+    Path(config["OUTPUT_DIR"]).mkdir(parents=True, exist_ok=True)
+    db = LeadHistory.from_config(config)
+    yield db
+    db.close()
+
+
+def _sheet(config, *rows, day="08022026"):
+    path = Path(config["OUTPUT_DIR"]) / f"leads_{day}.xlsx"
+    pd.DataFrame(rows, columns=["lead_id", "email", "sent_at", "gmail_msg_id", "status"]).to_excel(path, index=False)
+    # A new mtime even within the same clock tick, so ingest() reads it again
+    os.utime(path, ns=(path.stat().st_mtime_ns + 1_000_000, path.stat().st_mtime_ns + 1_000_000))
+
+
+def _bounce_log(config, *rows):
+    """The send journal's sent_at is a few seconds off the sheet's."""
+    append_journal(bounce_settings(config)["LOG_FILE"], [{
+        "email": email, "lead_id": None, "gmail_msg_id": msg_id, "sent_at": sent_at, "bounce_code": code,
+        "bounce_reason": f"{code} bounced", "bounced_at": "2026-02-08T16:00:00+05:30", "dsn_msg_id": f"dsn-{email}",
+    } for email, msg_id, sent_at, code in rows])
+
+
+def _sends(history):
+    return history.query("SELECT email, sent_at, gmail_msg_id, bounce_code FROM sends ORDER BY email, sent_at")
+
+
+def test_bounce_log_updates_the_send_with_the_same_gmail_msg_id(config, history):
+    _sheet(config, ("1", "a@x.com", "2026-02-08T15:25:55+05:30", "m1", "sent"),
+           ("2", "b@x.com", "2026-02-08T15:26:10+05:30", "m2", "sent"))
+    _bounce_log(config, ("a@x.com", "m1", "2026-02-08T15:25:58+05:30", "5.1.1"))
+    history.ingest(config)
+
+    sends = _sends(history)
+    assert sends["email"].tolist() == ["a@x.com", "b@x.com"]
+    assert sends["bounce_code"].tolist()[0] == "5.1.1"
+    assert sends["sent_at"].tolist()[0] == "2026-02-08 09:55:55"
+    assert history.bounce_counts(days=100000).to_dict("records") == [{"sends": 2, "bounces": 1}]
+
+
+def test_bounce_log_falls_back_to_email_and_sent_date(config, history):
+    _sheet(config, ("1", "a@x.com", "2026-02-08T15:25:55+05:30", None, "sent"))
+    _bounce_log(config, ("a@x.com", "m1", "2026-02-08T15:25:58+05:30", "5.2.2"))
+    history.ingest(config)
+
+    sends = _sends(history)
+    assert len(sends) == 1
+    assert sends[["gmail_msg_id", "bounce_code"]].values.tolist() == [["m1", "5.2.2"]]
+
+
+def test_bounce_of_another_send_that_day_stays_separate(config, history):
+    _sheet(config, ("1", "a@x.com", "2026-02-08T09:00:00+05:30", "m0", "sent"))
+    _bounce_log(config, ("a@x.com", "m1", "2026-02-08T15:25:58+05:30", "5.1.1"))
+    history.ingest(config)
+
+    sends = _sends(history)
+    assert sends["gmail_msg_id"].tolist() == ["m0", "m1"]
+    assert sends["bounce_code"].isna().tolist() == [True, False]
+
+
+def test_bounce_ingested_before_its_sheet_is_folded_into_the_send(config, history):
+    _bounce_log(config, ("a@x.com", "m1", "2026-02-08T15:25:58+05:30", "5.1.1"))
+    history.ingest(config)
+    assert len(_sends(history)) == 1
+
+    _sheet(config, ("1", "a@x.com", "2026-02-08T15:25:55+05:30", "m1", "sent"))
+    history.ingest(config)
+    sends = _sends(history)
+    assert sends[["sent_at", "bounce_code"]].values.tolist() == [["2026-02-08 09:55:55", "5.1.1"]]
+    assert history.bounce_counts(days=100000).to_dict("records") == [{"sends": 1, "bounces": 1}]
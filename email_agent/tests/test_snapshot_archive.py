@@ -0,0 +1,255 @@
+import os
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from lead_loader import iter_sheet_chunks
+from snapshot_archive import SnapshotArchive, _runs, iter_manifest_chunks
+
+HEADER = ["lead_id", "email", "status", "bounce_code"]
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    path = tmp_path / "leads_agent_excel_files"
+    path.mkdir()
+    return path
+
+
+def _archive(out_dir, **settings) -> SnapshotArchive:
+    # Small row groups, so reads cross row group and chunk boundaries
+    config = {"SNAPSHOT_ARCHIVE": {"ENABLED": True, "CHUNK_ROWS": 4, **settings}}
+    return SnapshotArchive.for_output_dir(out_dir, config)
+
+
+def _leads(n: int, start: int = 0) -> list:
+    return [[str(i), f"lead{i}@example.com", "SENT", None] for i in range(start, start + n)]
+
+
+def _write(out_dir, day: str, tabs: dict) -> Path:
+    """leads_<day>.xlsx with {title: rows} tabs, the first row of each being its header."""
+    path = out_dir / f"leads_{day}.xlsx"
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, rows in tabs.items():
+        ws = wb.create_sheet(title=title)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    # A distinct stamp even when rewritten within one mtime tick
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    return path
+
+
+def _read(path: Path) -> dict:
+    """{title: rows} with trailing empty cells dropped, as materialize() writes them."""
+    wb = load_workbook(path, read_only=True)
+    try:
+        tabs = {}
+        for ws in wb.worksheets:
+            rows = []
+            for row in ws.iter_rows(values_only=True):
+                row = list(row)
+                while row and row[-1] is None:
+                    row.pop()
+                rows.append(row)
+            tabs[ws.title] = rows
+        return tabs
+    finally:
+        wb.close()
+
+
+def _round_trip(archive: SnapshotArchive, tmp_path, stem: str) -> dict:
+    return _read(archive.materialize(stem, tmp_path / "views" / f"{stem}.xlsx"))
+
+
+def _read_tabs(tabs: dict) -> dict:
+    out = {}
+    for title, rows in tabs.items():
+        trimmed = []
+        for row in rows:
+            row = list(row)
+            while row and row[-1] is None:
+                row.pop()
+            trimmed.append(row)
+        out[title] = trimmed
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Versions
+# ---------------------------------------------------------------------------
+
+def test_child_stores_only_rows_its_parent_lacks(out_dir, tmp_path):
+    archive = _archive(out_dir)
+    day1 = {"Sheet1": [HEADER] + _leads(10), "Notes": [["note"], ["first"]]}
+    day2_rows = _leads(10)
+    day2_rows[3] = ["3", "lead3@example.com", "FAILED", "5.1.1"]  # edited
+    del day2_rows[7]                                              # removed
+    day2_rows[0], day2_rows[1] = day2_rows[1], day2_rows[0]       # reordered
+    day2_rows += [[], _leads(1, start=10)[0]]                     # an empty row, a new lead
+    day2 = {"Sheet1": [HEADER] + day2_rows, "Notes": [["note"], ["first"]]}
+
+    archive.add(_write(out_dir, "08022026", day1))
+    manifest = archive.add(_write(out_dir, "09022026", day2))
+
+    assert manifest["parent"] == "leads_08022026" and manifest["depth"] == 1
+    # The edited lead, the new lead and the empty row; the Notes tab is unchanged
+    assert manifest["new_rows"] == 3
+    assert manifest["tabs"][1]["segment"] is None
+    assert _round_trip(archive, tmp_path, "leads_08022026") == _read_tabs(day1)
+    assert _round_trip(archive, tmp_path, "leads_09022026") == _read_tabs(day2)
+
+
+def test_max_chain_starts_a_new_base_version(out_dir, tmp_path):
+    archive = _archive(out_dir, MAX_CHAIN=2)
+    days = ["08022026", "09022026", "10022026", "11022026", "12022026"]
+    contents = {}
+    for n, day in enumerate(days):
+        contents[day] = {"Sheet1": [HEADER] + _leads(6 + n)}
+        archive.add(_write(out_dir, day, contents[day]))
+
+    manifests = [archive.manifest(f"leads_{day}") for day in days]
+    assert [m["depth"] for m in manifests] == [0, 1, 2, 0, 1]
+    assert [m["parent"] for m in manifests] == [None, "leads_08022026", "leads_09022026", None, "leads_11022026"]
+    # A base version stores every row again
+    assert manifests[3]["new_rows"] == manifests[3]["rows"]
+    for day in days:
+        assert _round_trip(archive, tmp_path, f"leads_{day}") == _read_tabs(contents[day])
+
+
+def test_rearchiving_the_newest_day_replaces_it(out_dir, tmp_path):
+    archive = _archive(out_dir)
+    archive.add(_write(out_dir, "08022026", {"Sheet1": [HEADER] + _leads(5)}))
+    first = archive.add(_write(out_dir, "09022026", {"Sheet1": [HEADER] + _leads(5) + _leads(2, start=5)}))
+    old_segment = out_dir / "archive" / first["tabs"][0]["segment"]
+    assert old_segment.exists()
+
+    # Same day downloaded again later with more edits
+    latest = {"Sheet1": [HEADER] + _leads(5) + _leads(4, start=5)}
+    second = archive.add(_write(out_dir, "09022026", latest))
+
+    assert second["parent"] == "leads_08022026" and second["new_rows"] == 4
+    assert not old_segment.exists()
+    assert _round_trip(archive, tmp_path, "leads_09022026") == _read_tabs(latest)
+
+
+def test_a_day_later_versions_build_on_is_kept(out_dir, tmp_path, capsys):
+    archive = _archive(out_dir)
+    day1 = {"Sheet1": [HEADER] + _leads(5)}
+    archive.add(_write(out_dir, "08022026", day1))
+    archive.add(_write(out_dir, "09022026", {"Sheet1": [HEADER] + _leads(6)}))
+
+    archive.add(_write(out_dir, "08022026", {"Sheet1": [HEADER] + _leads(2)}))
+
+    assert "keeping the archived copy" in capsys.readouterr().out
+    assert _round_trip(archive, tmp_path, "leads_08022026") == _read_tabs(day1)
+
+
+# ---------------------------------------------------------------------------
+# _runs
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("refs, runs", [
+    ([], []),
+    ([0], [["p", 0, 1]]),
+    ([-1], [["n", 0, 1]]),
+    ([0, 1, 2, 3], [["p", 0, 4]]),
+    ([-1, -2, -3], [["n", 0, 3]]),
+    # Parent rows out of order, or repeated, start new runs
+    ([5, 6, 2, 3], [["p", 5, 2], ["p", 2, 2]]),
+    ([3, 2, 1], [["p", 3, 1], ["p", 2, 1], ["p", 1, 1]]),
+    ([4, 4], [["p", 4, 1], ["p", 4, 1]]),
+    # Parent row 0 next to segment row 0 (-1) are different runs
+    ([0, -1, 1, -2], [["p", 0, 1], ["n", 0, 1], ["p", 1, 1], ["n", 1, 1]]),
+    ([-1, -2, 0, 1, -3], [["n", 0, 2], ["p", 0, 2], ["n", 2, 1]]),
+])
+def test_runs(refs, runs):
+    assert _runs(np.array(refs, dtype=np.int64)) == runs
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def _concat(chunks) -> dict:
+    out = {}
+    for chunk in chunks:
+        for name, values in chunk.items():
+            out.setdefault(name, []).extend(values)
+    return out
+
+
+@pytest.mark.parametrize("usecols", [None, ["email", "bounce_code"], ["missing"]])
+def test_manifest_chunks_match_sheet_chunks(out_dir, usecols):
+    archive = _archive(out_dir)
+    archive.add(_write(out_dir, "08022026", {"Sheet1": [HEADER] + _leads(7)}))
+    rows = _leads(7)
+    rows[2] = ["2", "lead2@example.com", "FAILED", "5.2.2"]
+    rows[4:4] = [[], [None, None, None, None]]
+    rows.append(["99", None, None, None])
+    path = _write(out_dir, "09022026", {"Sheet1": [HEADER] + rows, "Other": [["x"], ["y"]]})
+    archive.add(path)
+
+    manifest_path = archive.manifest_path("leads_09022026")
+    for chunk_rows in (3, 100):
+        assert _concat(iter_manifest_chunks(manifest_path, usecols, chunk_rows)) == \
+            _concat(iter_sheet_chunks(path, usecols, chunk_rows))
+
+
+def test_manifest_chunks_of_a_header_only_sheet(out_dir):
+    archive = _archive(out_dir)
+    path = _write(out_dir, "08022026", {"Sheet1": [HEADER]})
+    archive.add(path)
+    assert list(iter_manifest_chunks(archive.manifest_path("leads_08022026"))) == \
+        list(iter_sheet_chunks(path)) == [{h: [] for h in HEADER}]
+
+
+# ---------------------------------------------------------------------------
+# Eviction
+# ---------------------------------------------------------------------------
+
+def test_evict_removes_only_unchanged_archived_days(out_dir, tmp_path):
+    archive = _archive(out_dir, KEEP_DAYS=2)
+    paths = {day: _write(out_dir, day, {"Sheet1": [HEADER] + _leads(3 + n)})
+             for n, day in enumerate(["05022026", "06022026", "07022026", "08022026", "09022026"])}
+    for path in paths.values():
+        archive.add(path)
+    # Edited after it was archived: the archive no longer holds what is on disk
+    _write(out_dir, "06022026", {"Sheet1": [HEADER] + _leads(9)})
+    # Never archived
+    unarchived = _write(out_dir, "04022026", {"Sheet1": [HEADER] + _leads(2)})
+
+    removed = archive.evict(out_dir, "leads_", keep=paths["07022026"], today=date(2026, 2, 9))
+
+    assert removed == [paths["05022026"]]
+    assert not paths["05022026"].exists()
+    assert paths["06022026"].exists() and unarchived.exists()
+    assert paths["07022026"].exists()                                  # keep
+    assert paths["08022026"].exists() and paths["09022026"].exists()   # last KEEP_DAYS days
+
+
+def test_evict_removes_a_materialised_view_unless_it_changed(out_dir):
+    archive = _archive(out_dir, KEEP_DAYS=1)
+    path = _write(out_dir, "05022026", {"Sheet1": [HEADER] + _leads(3)})
+    archive.add(path)
+    assert archive.evict(out_dir, "leads_", today=date(2026, 2, 9)) == [path]
+
+    # Materialised back on demand, then evictable again
+    archive.materialize("leads_05022026", path)
+    assert archive.evict(out_dir, "leads_", today=date(2026, 2, 9)) == [path]
+
+    # A view someone wrote to is not the archived version any more
+    archive.materialize("leads_05022026", path)
+    wb = load_workbook(path)
+    wb.active.append(["99", "new@example.com"])
+    wb.save(path)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert archive.evict(out_dir, "leads_", today=date(2026, 2, 9)) == []
+    assert path.exists()
+
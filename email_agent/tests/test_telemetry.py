@@ -0,0 +1,22 @@
+from telemetry import Metrics
+
+
+def test_since_reports_only_what_was_recorded_after_the_checkpoint():
+    metrics = Metrics()
+    metrics.inc("emails_sent_total", 3, campaign="a")
+    metrics.observe("llm_request", 2.0, route="report_summary")
+    run_start = metrics.checkpoint()
+
+    # Another campaign keeps recording while this run is measured
+    metrics.inc("emails_sent_total", 2, campaign="a")
+    metrics.inc("emails_sent_total", campaign="b")
+    metrics.observe("llm_request", 1.0, route="report_summary")
+    metrics.set_gauge("leads_in_sheet", 40)
+
+    run = metrics.since(run_start)
+    assert run.counter_total("emails_sent_total", campaign="a") == 2
+    assert run.counter_total("emails_sent_total") == 3
+    assert run.export_state()["timers"] == {("llm_request", (("route", "report_summary"),)): [1, 1.0, 2.0]}
+    assert run.started_at == run_start["at"]
+    # The shared registry is left as it was
+    assert metrics.counter_total("emails_sent_total") == 6
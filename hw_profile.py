@@ -0,0 +1,319 @@
+"""
+Hardware profiles for llama.cpp settings.
+
+CodingBot and SummaryBot used to hardcode n_threads=12, n_gpu_layers=-1 and
+flash_attn=True for one Ryzen/RTX desktop. `tune` measures prefill and decode
+speed for candidate thread counts, batch sizes and flash attention on this
+machine, estimates the largest context whose KV cache fits in memory, and
+stores the result per host + model hash:
+
+    python hw_profile.py tune --model Qwen2.5-Coder-32B-Instruct-Q4_K_M.gguf
+    python hw_profile.py show
+
+Both bots call llama_settings() at startup; without a stored profile it falls
+back to settings derived from the CPU count and GPU offload support.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_PATH = Path(__file__).resolve().parent / "hw_profiles.json"
+
+# Bytes hashed from each end of the GGUF; enough to tell quantisations/fine-tunes apart
+HASH_SAMPLE_BYTES = 1 << 20
+
+TUNABLE_KEYS = ("n_threads", "n_threads_batch", "n_batch", "n_ubatch", "flash_attn", "n_gpu_layers")
+
+# Memory left for the OS, the Python process and llama.cpp scratch buffers when sizing the KV cache
+MEMORY_HEADROOM_BYTES = 2 << 30
+
+
+def host_key() -> str:
+    return f"{platform.node()}/{platform.machine()}/{os.cpu_count()}"
+
+
+def model_hash(model_path: str) -> str:
+    """Cheap fingerprint: size plus the first and last HASH_SAMPLE_BYTES of the file."""
+    size = os.path.getsize(model_path)
+    h = hashlib.sha256(str(size).encode())
+    with open(model_path, "rb") as f:
+        h.update(f.read(HASH_SAMPLE_BYTES))
+        if size > HASH_SAMPLE_BYTES:
+            f.seek(max(HASH_SAMPLE_BYTES, size - HASH_SAMPLE_BYTES))
+            h.update(f.read(HASH_SAMPLE_BYTES))
+    return h.hexdigest()[:16]
+
+
+def _usable_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def gpu_offload_supported() -> bool:
+    try:
+        from llama_cpp import llama_supports_gpu_offload
+        return bool(llama_supports_gpu_offload())
+    except (ImportError, AttributeError):
+        return False
+
+
+def default_settings() -> dict:
+    """Untuned settings: full offload + flash attention on GPU builds, CPU-only otherwise."""
+    gpu = gpu_offload_supported()
+    # Hyper-threads rarely help decode; assume two per physical core
+    threads = max(1, _usable_cpus() // 2)
+    return {
+        "n_threads": threads,
+        "n_threads_batch": _usable_cpus(),
+        "n_batch": 512,
+        "n_ubatch": 512,
+        "n_gpu_layers": -1 if gpu else 0,
+        "flash_attn": gpu,
+    }
+
+
+def _load_profiles(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def load_profile(model_path: str, path: Path = PROFILE_PATH):
+    """Stored profile for this host and model, or None."""
+    profiles = _load_profiles(Path(path))
+    if not profiles or not os.path.exists(model_path):
+        return None
+    return profiles.get(f"{host_key()}|{model_hash(model_path)}")
+
+
+def llama_settings(model_path: str, path: Path = PROFILE_PATH) -> dict:
+    """
+    Llama() keyword arguments for this machine: the tuned profile when one
+    exists, otherwise default_settings(). Includes "n_ctx" only when the
+    profile has a memory-based context cap (callers treat it as an upper bound).
+    """
+    settings = default_settings()
+    profile = load_profile(model_path, path)
+    if profile:
+        settings.update({k: v for k, v in profile["settings"].items() if k in TUNABLE_KEYS})
+        if profile.get("max_ctx"):
+            settings["n_ctx"] = profile["max_ctx"]
+    return settings
+
+
+# ---------------------------------------------------------------------------
+# Tuning
+# ---------------------------------------------------------------------------
+
+def _available_memory() -> int:
+    """Bytes of RAM available to a new process (MemAvailable), 0 if unknown."""
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def kv_bytes_per_token(model_path: str) -> tuple:
+    """
+    (f16 KV cache bytes per context token, trained context length) from the
+    GGUF metadata; (None, None) if the metadata lacks the attention shape.
+    """
+    from llama_cpp import Llama
+
+    llm = Llama(model_path=model_path, vocab_only=True, verbose=False)
+    try:
+        meta = llm.metadata
+    finally:
+        if hasattr(llm, "close"):
+            llm.close()
+    arch = meta.get("general.architecture", "llama")
+    try:
+        layers = int(meta[f"{arch}.block_count"])
+        embd = int(meta[f"{arch}.embedding_length"])
+        heads = int(meta[f"{arch}.attention.head_count"])
+        kv_heads = int(meta.get(f"{arch}.attention.head_count_kv", heads))
+    except (KeyError, ValueError):
+        return None, None
+    train_ctx = meta.get(f"{arch}.context_length")
+    # K and V, one f16 vector of embd * kv_heads / heads values per layer
+    return 2 * layers * (embd * kv_heads // heads) * 2, int(train_ctx) if train_ctx else None
+
+
+def max_context(model_path: str, gpu_offload: bool) -> int:
+    """
+    Largest n_ctx (a multiple of 1024) whose KV cache fits in the RAM left
+    beside the weights; None when offloaded to a GPU (VRAM is not measured)
+    or the model's shape is unknown.
+    """
+    if gpu_offload:
+        return None
+    per_token, train_ctx = kv_bytes_per_token(model_path)
+    available = _available_memory()
+    if not per_token or not available:
+        return None
+    # The GGUF is mmapped: its pages compete with the KV cache for the same RAM
+    budget = available - os.path.getsize(model_path) - MEMORY_HEADROOM_BYTES
+    n_ctx = max(1024, budget // per_token // 1024 * 1024)
+    return min(n_ctx, train_ctx) if train_ctx else n_ctx
+
+
+def _bench_tokens(llm, n: int) -> list:
+    text = " ".join(f"Lead {i} bounced with 550 5.1.1 user unknown at example{i % 7}.com." for i in range(n))
+    return llm.tokenize(text.encode("utf-8"), add_bos=True)[:n]
+
+
+def _measure(model_path: str, params: dict, prefill_tokens: int, decode_tokens: int) -> dict:
+    """Load with params, time one prefill of prefill_tokens and decode_tokens single-token steps."""
+    from llama_cpp import Llama
+
+    t0 = time.perf_counter()
+    llm = Llama(model_path=model_path, verbose=False, **params)
+    load_s = time.perf_counter() - t0
+    try:
+        prompt = _bench_tokens(llm, prefill_tokens)
+        llm.reset()
+        t0 = time.perf_counter()
+        llm.eval(prompt)
+        prefill_s = time.perf_counter() - t0
+
+        token = prompt[-1]
+        t0 = time.perf_counter()
+        for _ in range(decode_tokens):
+            llm.eval([token])
+        decode_s = time.perf_counter() - t0
+    finally:
+        if hasattr(llm, "close"):
+            llm.close()
+    return {
+        "load_s": round(load_s, 3),
+        "prefill_tokens_per_s": round(len(prompt) / prefill_s, 2) if prefill_s else 0.0,
+        "decode_tokens_per_s": round(decode_tokens / decode_s, 2) if decode_s else 0.0,
+    }
+
+
+def _thread_candidates() -> list:
+    cpus = _usable_cpus()
+    return sorted({n for n in (1, 2, 4, 6, 8, 12, 16, 24, 32, 48, 64, 96, 128) if n <= cpus} | {cpus, max(1, cpus // 2)})
+
+
+def tune(model_path: str, threads: list = None, batches: list = None,
+         prefill_tokens: int = 512, decode_tokens: int = 32, path: Path = PROFILE_PATH) -> dict:
+    """
+    Coordinate search, one dimension at a time starting from default_settings():
+    n_threads (decode), n_threads_batch (prefill), n_batch/n_ubatch (prefill),
+    then flash_attn. n_ctx is not measured (decode speed barely depends on the
+    unused KV size); max_context() caps it by memory instead. Saves and
+    returns the profile.
+    """
+    best = default_settings()
+    batches = batches or [(128, 128), (256, 256), (512, 512), (1024, 512), (2048, 512)]
+    # Batch candidates only differ on prompts at least as long as the largest batch
+    batch_prefill = max([prefill_tokens] + [b for b, _ in batches])
+    base_ctx = max(2048, batch_prefill + decode_tokens + 64)
+    measurements = {}
+
+    def run(label, prefill=prefill_tokens, **overrides):
+        params = {**best, "n_ctx": base_ctx, **overrides}
+        try:
+            result = _measure(model_path, params, prefill, decode_tokens)
+        except Exception as e:
+            print(f"[ERROR] {label}: {e}")
+            return None
+        measurements[label] = {**overrides, **result}
+        print(f"[INFO] {label:<28} prefill {result['prefill_tokens_per_s']:>9.1f} tok/s  "
+              f"decode {result['decode_tokens_per_s']:>7.2f} tok/s")
+        return result
+
+    def pick(results, metric):
+        results = [(value, r) for value, r in results if r]
+        return max(results, key=lambda x: x[1][metric])[0] if results else None
+
+    threads = threads or _thread_candidates()
+    found = pick([(n, run(f"n_threads={n}", n_threads=n, n_threads_batch=n)) for n in threads], "decode_tokens_per_s")
+    if found:
+        best["n_threads"] = found
+    found = pick([(n, run(f"n_threads_batch={n}", n_threads_batch=n)) for n in threads], "prefill_tokens_per_s")
+    if found:
+        best["n_threads_batch"] = found
+
+    found = pick([((b, u), run(f"n_batch={b},n_ubatch={u}", prefill=batch_prefill, n_batch=b, n_ubatch=u))
+                  for b, u in batches], "prefill_tokens_per_s")
+    if found:
+        best["n_batch"], best["n_ubatch"] = found
+
+    found = pick([(fa, run(f"flash_attn={fa}", flash_attn=fa)) for fa in (False, True)], "decode_tokens_per_s")
+    if found is not None:
+        best["flash_attn"] = found
+
+    max_ctx = max_context(model_path, best["n_gpu_layers"] != 0)
+    if max_ctx:
+        print(f"[INFO] KV cache fits up to n_ctx={max_ctx} in available RAM")
+
+    profile = {
+        "host": host_key(),
+        "model": os.path.abspath(model_path),
+        "model_hash": model_hash(model_path),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "gpu_offload": gpu_offload_supported(),
+        "settings": best,
+        "max_ctx": max_ctx,
+        "measurements": measurements,
+    }
+    profiles = _load_profiles(Path(path))
+    profiles[f"{profile['host']}|{profile['model_hash']}"] = profile
+    Path(path).write_text(json.dumps(profiles, indent=2), encoding="utf-8")
+    return profile
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tune llama.cpp settings for this machine")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_tune = sub.add_parser("tune", help="Benchmark candidate settings and save the best profile")
+    p_tune.add_argument("--model", required=True, help="GGUF model file")
+    p_tune.add_argument("--threads", type=int, nargs="+", default=None)
+    p_tune.add_argument("--batch", type=int, nargs="+", default=None, help="n_batch candidates (n_ubatch = min(n_batch, 512))")
+    p_tune.add_argument("--prefill-tokens", type=int, default=512)
+    p_tune.add_argument("--decode-tokens", type=int, default=32)
+    p_tune.add_argument("--profile-file", type=Path, default=PROFILE_PATH)
+
+    p_show = sub.add_parser("show", help="Print stored profiles")
+    p_show.add_argument("--profile-file", type=Path, default=PROFILE_PATH)
+
+    args = parser.parse_args()
+    if args.command == "show":
+        profiles = _load_profiles(args.profile_file)
+        if not profiles:
+            print(f"[INFO] No profiles in {args.profile_file}")
+        for key, profile in profiles.items():
+            print(f"{key}  {profile['model']}\n  {json.dumps(profile['settings'])}")
+        return 0
+
+    if not os.path.exists(args.model):
+        print(f"[ERROR] Model not found: {os.path.abspath(args.model)}")
+        return 1
+    batches = [(b, min(b, 512)) for b in args.batch] if args.batch else None
+    profile = tune(args.model, threads=args.threads, batches=batches,
+                   prefill_tokens=args.prefill_tokens, decode_tokens=args.decode_tokens, path=args.profile_file)
+    print(f"[OK] Profile saved to {args.profile_file}: {json.dumps(profile['settings'])}, max_ctx {profile['max_ctx']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
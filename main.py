@@ -1,11 +1,39 @@
 import signal
 import sys
 import os
+import contextlib
+import time
+import threading
+import uuid
 from llama_cpp import Llama
 import streamlit as st
+from telemetry import METRICS, count_prompt_tokens, instrument_completion
+from speculative import DEFAULT_SPECULATIVE, build_draft_model
+from hw_profile import llama_settings
+from response_cache import DEFAULT_RESPONSE_CACHE, ResponseCache
+from cancellation import cancellable
+from batching import DEFAULT_BATCHING, BatchScheduler, SchedulerBusy
+from model_router import model_route
+
+# Model per task (model_router.py); the email agent routes its bounce summaries the same way
+MODEL_ROUTES = {"coding_chat": {"MODEL_PATH": "Qwen2.5-Coder-32B-Instruct-Q4_K_M.gguf"}}
+# Speculative decoding (opt-in). MODE "prompt_lookup" needs no extra model;
+# "draft_model" runs DRAFT_MODEL_PATH (a small GGUF with the same tokenizer) as drafter.
+# Enabling it caps CodingBot's context at N_CTX (4096 tokens): older turns are dropped
+# from the chat memory once the conversation no longer fits.
+SPECULATIVE_DECODING = {**DEFAULT_SPECULATIVE, "ENABLED": False}
+# Response cache (opt-in): repeated questions are answered from response_cache.sqlite3.
+# Set EMBEDDING_MODEL_PATH to a small embedding GGUF to also match reworded questions.
+RESPONSE_CACHE = {**DEFAULT_RESPONSE_CACHE, "ENABLED": False}
+# Continuous batching (opt-in): all sessions share one model and up to MAX_CONCURRENCY
+# answers are decoded together. Speculative decoding does not apply to batched answers.
+BATCHING = {**DEFAULT_BATCHING, "ENABLED": False}
 
 class CodingBot:
-    def __init__(self, model_path: str, n_ctx: int = 16384):
+    max_tokens = 2048  # answer budget, kept free in the context window
+
+    def __init__(self, model_path: str, n_ctx: int = 16384, speculative: dict = None, cache: dict = None,
+                 scheduler: BatchScheduler = None, user_id: str = "default"):
         # 1. Path Verification
         if not os.path.exists(model_path):
             st.error(f"[-] ERROR: File not found at {os.path.abspath(model_path)}")
@@ -16,36 +44,130 @@ class CodingBot:
         self.history = [
             {"role": "system", "content": "You are a precise coding assistant specializing in Python and Quantitative Finance."}
         ]
-        # 3. Model Initialization
-        self.llm = Llama(
-            model_path=model_path,
-            n_gpu_layers=-1,  # Offload to RTX 5070
-            n_ctx=n_ctx,  # Expanded Context Window
-            n_threads=12,  # Ryzen 7 9800X3D optimization
-            flash_attn=True,  # Blackwell architecture support
-            verbose=False
-        )
+        # 3. Shared batch scheduler: the model is loaded once for all sessions
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.llm = self.draft_model = None
+        if scheduler is None:
+            # 4. Hardware profile (python hw_profile.py tune --model ...); CPU-only defaults if untuned
+            settings = llama_settings(model_path)
+            n_ctx = min(n_ctx, settings.pop("n_ctx", n_ctx))
+            # 5. Optional speculative decoding
+            self.draft_model = build_draft_model(speculative, route="coding_chat")
+            if self.draft_model is not None:
+                # Draft verification keeps logits for every context position (n_ctx x vocab floats)
+                n_ctx = min(n_ctx, {**DEFAULT_SPECULATIVE, **speculative}["N_CTX"])
+            # 6. Model Initialization
+            with METRICS.timer("llm_model_load", route="coding_chat"):
+                self.llm = Llama(
+                    model_path=model_path,
+                    n_ctx=n_ctx,  # Expanded Context Window (capped by the tuned profile)
+                    draft_model=self.draft_model,
+                    verbose=False,
+                    **settings  # n_threads, n_batch, n_ubatch, n_gpu_layers, flash_attn
+                )
+        # 7. Optional response cache
+        self.cache = ResponseCache(model_path, cache) if cache and cache.get("ENABLED") else None
+        self.last_cache_hit = None  # CacheHit of the latest answer, None if it was generated
+        # 8. Stop control: set from another thread/rerun to end the current answer after the next token
+        self.cancel_event = threading.Event()
         st.success("[+] Bot initialized with memory. Ready to chat!")
 
+    def cancel(self) -> None:
+        """Stop the answer being generated; the partial answer stays in history."""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the latest answer was stopped before it finished."""
+        return self.cancel_event.is_set()
+
     def chat(self, user_query: str):
+        self.cancel_event.clear()
+        # Answer from the cache when this question was already asked in the same context
+        hit = self.cache.lookup(self.history, user_query) if self.cache is not None else None
+        self.last_cache_hit = hit
+        context = list(self.history)
         # Add user input to history
         self.history.append({"role": "user", "content": user_query})
-        # Generate response using FULL context
-        response_stream = self.llm.create_chat_completion(
-            messages=self.history,
-            stream=True,
-            temperature=0.2,
-            max_tokens=2048
-        )
+        if hit is not None:
+            replayed = ""
+            try:
+                for content in cancellable(self.cache.replay(hit), self.cancel_event, route="coding_chat"):
+                    replayed += content
+                    yield content
+            finally:
+                self.history.append({"role": "assistant", "content": replayed})
+            return
+        # Generate response using FULL context (as much of it as fits the model's window)
+        self._fit_history()
+        try:
+            stream = self._generate()
+        except SchedulerBusy:
+            # Nothing was generated: take the question back so it can simply be asked again
+            self.history.pop()
+            raise
+        response_stream = cancellable(stream, self.cancel_event, route="coding_chat")
         full_response = ""
-        for chunk in response_stream:
-            if 'content' in chunk['choices'][0]['delta']:
-                content = chunk['choices'][0]['delta']['content']
+        chunks = []
+        t0 = time.perf_counter()
+        try:
+            for content in response_stream:
                 full_response += content
+                chunks.append(content)
                 yield content  # Yield for streaming in Streamlit
-       
-        # Add assistant response to history
-        self.history.append({"role": "assistant", "content": full_response})
+        finally:
+            # Add assistant response to history, partial if stopped (Stop button, closed session):
+            # the next prompt then begins with the tokens already in the KV cache
+            response_stream.close()
+            stream.close()  # also when the stream was never started
+            self.history.append({"role": "assistant", "content": full_response})
+        # Only complete answers are worth serving again
+        if self.cache is not None and not self.cancelled:
+            self.cache.store(context, user_query, chunks, time.perf_counter() - t0)
+
+    def _fit_history(self) -> None:
+        """Drop the oldest exchanges until the prompt plus an answer fit in n_ctx."""
+        if self.llm is None:
+            return
+        budget = self.llm.n_ctx() - self.max_tokens
+        # ~8 chat-template tokens per message on top of the message bodies
+        while len(self.history) > 2 and count_prompt_tokens(self.llm, self.history) + 8 * len(self.history) > budget:
+            del self.history[1:3]  # oldest user turn and its answer; the system prompt stays
+            METRICS.inc("chat_history_trimmed_total", route="coding_chat")
+
+    def _generate(self):
+        """Stream answer text for the current history, batched with other sessions when shared."""
+        if self.scheduler is not None:
+            # Queued now (waits in this user's queue when every slot is busy), so a full
+            # queue raises SchedulerBusy here rather than once streaming has started
+            return self.scheduler.generate(self.user_id, self.history, max_tokens=self.max_tokens, temperature=0.2)
+        return self._generate_local()
+
+    def _generate_local(self):
+        if self.draft_model is not None:
+            self.draft_model.start()
+        stream = instrument_completion(
+            self.llm.create_chat_completion(
+                messages=self.history,
+                stream=True,
+                temperature=0.2,
+                max_tokens=self.max_tokens
+            ),
+            route="coding_chat",
+            prompt_tokens=count_prompt_tokens(self.llm, self.history),
+        )
+        try:
+            for chunk in stream:
+                if 'content' in chunk['choices'][0]['delta']:
+                    yield chunk['choices'][0]['delta']['content']
+        finally:
+            stream.close()
+
+@st.cache_resource
+def shared_scheduler(model_path: str) -> BatchScheduler:
+    """One BatchScheduler per server process, shared by every browser session."""
+    return BatchScheduler(model_path, BATCHING)
 
 def run_app():
     # Custom CSS for dark-themed futuristic CLI look with updated background and glowing white outlines
@@ -87,8 +209,10 @@ def run_app():
 
     # Initialize session state
     if 'bot' not in st.session_state:
-        abs_path = os.path.abspath("Qwen2.5-Coder-32B-Instruct-Q4_K_M.gguf")
-        st.session_state.bot = CodingBot(model_path=abs_path)
+        abs_path = model_route(MODEL_ROUTES, "coding_chat", "Qwen2.5-Coder-32B-Instruct-Q4_K_M.gguf")["MODEL_PATH"]
+        scheduler = shared_scheduler(abs_path) if BATCHING["ENABLED"] and os.path.exists(abs_path) else None
+        st.session_state.bot = CodingBot(model_path=abs_path, speculative=SPECULATIVE_DECODING, cache=RESPONSE_CACHE,
+                                         scheduler=scheduler, user_id=uuid.uuid4().hex)
     if 'messages' not in st.session_state:
         st.session_state.messages = []
 
@@ -99,11 +223,24 @@ def run_app():
             st.session_state.bot.history = [st.session_state.bot.history[0]]
             st.session_state.messages = []
             st.success("Memory cleared!")
+        # Ends the current answer after its next token; the partial answer is kept
+        st.button("Stop Generating", on_click=st.session_state.bot.cancel)
+        if st.session_state.bot.cache is not None and st.button("Clear Response Cache"):
+            st.session_state.bot.cache.clear()
+            st.success("Response cache cleared!")
+        with st.expander("Metrics"):
+            st.json(METRICS.summary()["llm"])
+            if st.session_state.bot.scheduler is not None:
+                gauges = METRICS.summary()["gauges"]
+                st.json({name: gauges.get(name, {}).get("all", 0)
+                         for name in ("batch_queue_depth", "batch_active_sequences", "batch_decode_tokens_per_second")})
 
     # Display chat history with Markdown support
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+            if message.get("note"):
+                st.caption(message["note"])
 
     # User input
     if prompt := st.chat_input("Type your query here (or 'q' to quit)..."):
@@ -120,10 +257,36 @@ def run_app():
         with st.chat_message("assistant"):
             response_container = st.empty()
             streamed_response = ""
-            for chunk in st.session_state.bot.chat(prompt):
-                streamed_response += chunk
-                response_container.markdown(streamed_response)
-            st.session_state.messages.append({"role": "assistant", "content": streamed_response})
+            bot = st.session_state.bot
+            # Clicking Stop (or closing the tab) interrupts this run at the next Streamlit call;
+            # closing the generator then stops decoding and keeps the partial answer
+            interrupted = True
+            busy = False
+            message = None
+            with contextlib.closing(bot.chat(prompt)) as stream:
+                try:
+                    for chunk in stream:
+                        streamed_response += chunk
+                        response_container.markdown(streamed_response)
+                    interrupted = False
+                except SchedulerBusy:
+                    busy = True
+                    st.warning("Every answer slot and the queue are busy - please ask again in a moment.")
+                finally:
+                    if busy:
+                        # bot.chat took the question back out of its history; nothing to keep here either
+                        st.session_state.messages.pop()
+                    else:
+                        message = {"role": "assistant", "content": streamed_response}
+                        hit = bot.last_cache_hit
+                        if bot.cancelled or interrupted:
+                            message["note"] = "⏹ Stopped - partial answer kept in memory"
+                        elif hit is not None:
+                            match = "exact match" if hit.kind == "exact" else f"similar question, {hit.similarity:.0%} match"
+                            message["note"] = f"⚡ Served from cache ({match}) - no model time"
+                        st.session_state.messages.append(message)
+            if message is not None and message.get("note"):
+                st.caption(message["note"])
 
 if __name__ == "__main__":
     run_app()
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Task -> model routing with an optional quality gate.
+
+CodingBot and the email agent's bounce summaries used to load the same
+Qwen2.5-Coder-32B GGUF, although a two-sentence bounce explanation does not
+need a 32B model on CPU. MODEL_ROUTES maps each task ("report_summary",
+"coding_chat") to its own GGUF:
+
+    "MODEL_ROUTES": {
+        "report_summary": {"MODEL_PATH": "qwen2.5-3b-instruct-q4_k_m.gguf", "VALIDATE": true}
+    }
+
+A task without a route uses the caller's default model. With VALIDATE, the
+small model's output is checked by the caller's validator (e.g. "the cause
+names the bounce code", "the cause is not empty") and a failing output is
+regenerated by ESCALATE_MODEL_PATH, which defaults to the caller's default
+(big) model.
+
+Per route: model_route_latency (labels route, tier = primary/escalated),
+model_route_requests_total and model_route_escalations_total (label reason).
+"""
+import os
+import time
+
+from telemetry import METRICS
+
+DEFAULT_MODEL_ROUTE = {
+    "MODEL_PATH": None,           # None = the caller's default model
+    "ESCALATE_MODEL_PATH": None,  # None = the caller's default model
+    "VALIDATE": True,             # regenerate outputs failing the validator with the escalation model
+}
+
+
+def model_route(routes: dict, task: str, default_model_path: str) -> dict:
+    """
+    Settings for `task` with absolute paths. ESCALATE_MODEL_PATH is None when
+    there is nothing to escalate to (VALIDATE off, or the route already uses
+    the escalation model).
+    """
+    route = {**DEFAULT_MODEL_ROUTE, **((routes or {}).get(task) or {})}
+    route["MODEL_PATH"] = os.path.abspath(route["MODEL_PATH"] or default_model_path)
+    escalate = os.path.abspath(route["ESCALATE_MODEL_PATH"] or default_model_path)
+    route["ESCALATE_MODEL_PATH"] = escalate if route["VALIDATE"] and escalate != route["MODEL_PATH"] else None
+    return route
+
+
+def routed(task: str, generate, validate=None, escalate=None):
+    """
+    Return generate(); when validate(result) lists problems and `escalate` is
+    given, return escalate() instead. Both callables take no arguments.
+    """
+    t0 = time.perf_counter()
+    result = generate()
+    METRICS.observe("model_route_latency", time.perf_counter() - t0, route=task, tier="primary")
+    METRICS.inc("model_route_requests_total", route=task, tier="primary")
+    if escalate is None or validate is None:
+        return result
+    problems = validate(result)
+    if not problems:
+        return result
+    for problem in problems:
+        METRICS.inc("model_route_escalations_total", route=task, reason=problem)
+    t0 = time.perf_counter()
+    result = escalate()
+    METRICS.observe("model_route_latency", time.perf_counter() - t0, route=task, tier="escalated")
+    METRICS.inc("model_route_requests_total", route=task, tier="escalated")
+    return result
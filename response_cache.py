@@ -0,0 +1,204 @@
+"""
+On-disk response cache for CodingBot (opt-in).
+
+The team asks the same questions repeatedly ("rolling Sharpe in pandas", ...)
+and each one costs a full 32B generation. ResponseCache sits in front of
+CodingBot.chat:
+
+- exact hits: the key is a hash of the model file, the normalised system
+  prompt, the last HISTORY_MESSAGES messages of the conversation and the
+  normalised query (case, whitespace and trailing punctuation ignored);
+- near-duplicate hits (when EMBEDDING_MODEL_PATH is set): queries asked in the
+  same context (model + system prompt + history window) are compared by the
+  cosine similarity of their embeddings; the closest one at or above
+  THRESHOLD is served;
+- storage is one SQLite file with LRU eviction beyond MAX_ENTRIES (by last use);
+- a hit is replayed chunk by chunk at the speed it was originally generated
+  (REPLAY_SPEED = 1.0), so the UI streams as usual, with no model time.
+
+Hits and misses are counted as METRICS.cache("response_cache", ...).
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from hw_profile import model_hash
+from telemetry import METRICS
+
+DEFAULT_RESPONSE_CACHE = {
+    "ENABLED": False,
+    "PATH": "response_cache.sqlite3",
+    "MAX_ENTRIES": 1000,          # least recently used entries are evicted beyond this
+    "HISTORY_MESSAGES": 2,        # earlier messages that are part of the key (0 = query only)
+    "EMBEDDING_MODEL_PATH": None, # small embedding GGUF for near-duplicates; None = exact matches only
+    "THRESHOLD": 0.92,            # cosine similarity for a near-duplicate hit
+    "REPLAY_SPEED": 1.0,          # 1.0 = original generation speed, 0 = instant
+}
+
+WHITESPACE = re.compile(r"\s+")
+TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_text(text: str) -> str:
+    return WHITESPACE.sub(" ", str(text or "")).strip().lower()
+
+
+def normalize_query(query: str) -> str:
+    return TRAILING_PUNCTUATION.sub("", normalize_text(query))
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CacheHit:
+    def __init__(self, kind: str, chunks: list, seconds: float, similarity: float = 1.0):
+        self.kind = kind  # "exact" or "similar"
+        self.chunks = chunks
+        self.seconds = seconds
+        self.similarity = similarity
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+class ResponseCache:
+    def __init__(self, model_path: str, settings: dict = None):
+        self.settings = {**DEFAULT_RESPONSE_CACHE, **(settings or {})}
+        self.path = self.settings["PATH"]
+        # Different weights (re-quantised, re-downloaded, same name and size) must not share answers
+        self.model_id = model_hash(model_path)
+        self._embedder = None
+        self._embedder_lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    context TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    embedding BLOB,
+                    chunks TEXT NOT NULL,
+                    seconds REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_context ON responses (context)")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # One connection per call (Streamlit reruns happen on different threads); commits on success
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # -----------------------------------------------------------------------
+    # Keys and embeddings
+    # -----------------------------------------------------------------------
+
+    def _context(self, history: list) -> str:
+        """Hash of model, system prompt and the history window before the query."""
+        system = [normalize_text(m["content"]) for m in history[:1] if m["role"] == "system"]
+        window = int(self.settings["HISTORY_MESSAGES"])
+        turns = history[len(system):]
+        turns = turns[-window:] if window > 0 else []
+        return _digest([self.model_id, system, [[m["role"], normalize_text(m["content"])] for m in turns]])
+
+    def _embed(self, text: str):
+        model_path = self.settings["EMBEDDING_MODEL_PATH"]
+        if not model_path:
+            return None
+        with self._embedder_lock:
+            if self._embedder is None:
+                from llama_cpp import LLAMA_POOLING_TYPE_MEAN, Llama
+                from hw_profile import llama_settings
+
+                settings = llama_settings(model_path)
+                settings.pop("n_ctx", None)
+                with METRICS.timer("llm_model_load", route="response_cache_embedding"):
+                    self._embedder = Llama(model_path=model_path, n_ctx=512, embedding=True,
+                                           pooling_type=LLAMA_POOLING_TYPE_MEAN, verbose=False, **settings)
+            with METRICS.timer("response_cache_embedding"):
+                return np.asarray(self._embedder.embed(text, normalize=True), dtype=np.float32)
+
+    # -----------------------------------------------------------------------
+    # Lookup / store
+    # -----------------------------------------------------------------------
+
+    def lookup(self, history: list, query: str):
+        """
+        A CacheHit for `query` asked after `history` (the messages before it),
+        or None.
+        """
+        context = self._context(history)
+        query = normalize_query(query)
+        key = _digest([context, query])
+        with METRICS.timer("response_cache_lookup"), self._connect() as db:
+            row = db.execute("SELECT key, chunks, seconds FROM responses WHERE key = ?", (key,)).fetchone()
+            kind, similarity = "exact", 1.0
+            if row is None and self.settings["EMBEDDING_MODEL_PATH"]:
+                candidates = db.execute(
+                    "SELECT key, chunks, seconds, embedding FROM responses WHERE context = ? AND embedding IS NOT NULL",
+                    (context,)).fetchall()
+                vector = self._embed(query) if candidates else None
+                # Entries embedded by a different EMBEDDING_MODEL_PATH have another width
+                candidates = [c for c in candidates if vector is not None and len(c[3]) == vector.nbytes]
+                if candidates:
+                    sims = np.stack([np.frombuffer(c[3], dtype=np.float32) for c in candidates]) @ vector
+                    best = int(np.argmax(sims))
+                    if sims[best] >= float(self.settings["THRESHOLD"]):
+                        row, kind, similarity = candidates[best][:3], "similar", float(sims[best])
+            if row is not None:
+                db.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), row[0]))
+
+        METRICS.cache("response_cache", hit=row is not None)
+        if row is None:
+            return None
+        METRICS.inc("response_cache_hits_total", kind=kind)
+        return CacheHit(kind, json.loads(row[1]), row[2], similarity)
+
+    def store(self, history: list, query: str, chunks: list, seconds: float) -> None:
+        """Save a generated answer (as streamed chunks) and evict least recently used entries."""
+        if not chunks:
+            return
+        context = self._context(history)
+        query = normalize_query(query)
+        vector = self._embed(query)
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, context, query, embedding, chunks, seconds, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (_digest([context, query]), context, query, None if vector is None else vector.tobytes(),
+                 json.dumps(chunks), float(seconds), now, now))
+            db.execute(
+                "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (int(self.settings["MAX_ENTRIES"]),))
+            size = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        METRICS.set_gauge("response_cache_entries", size)
+
+    def replay(self, hit: CacheHit):
+        """Yield the cached chunks, paced like the original generation (REPLAY_SPEED)."""
+        speed = float(self.settings["REPLAY_SPEED"])
+        delay = hit.seconds / len(hit.chunks) / speed if speed > 0 and hit.chunks else 0.0
+        for chunk in hit.chunks:
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    def clear(self) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM responses")
+        METRICS.set_gauge("response_cache_entries", 0)
@@ -0,0 +1,114 @@
+"""
+Speculative decoding helpers for SummaryBot and CodingBot.
+
+Two draft sources, both plugged into Llama(draft_model=...):
+- prompt lookup (n-gram): proposes the continuation of the latest n-gram's
+  earlier occurrence in the context. No extra model, ideal when the answer
+  copies spans from the prompt (lead IDs, emails, bounce codes/reasons).
+- a small draft GGUF sharing the target model's tokenizer, run greedily.
+
+The target model verifies every drafted token, so greedy (temperature 0)
+output is unchanged; only the number of target decode steps drops.
+
+Note: llama-cpp-python keeps logits for every context position when a draft
+model is set (n_ctx x n_vocab floats), so use a modest n_ctx with it.
+"""
+import numpy as np
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+from telemetry import METRICS
+
+DEFAULT_SPECULATIVE = {
+    "ENABLED": False,
+    "MODE": "prompt_lookup",  # or "draft_model"
+    "NUM_PRED_TOKENS": 10,
+    "MAX_NGRAM_SIZE": 3,
+    "DRAFT_MODEL_PATH": None,
+    "N_CTX": 4096,
+}
+
+
+class GGUFDraftModel(LlamaDraftModel):
+    """Greedy drafts from a small GGUF model with the same vocabulary as the target."""
+
+    def __init__(self, model_path: str, num_pred_tokens: int = 10, n_ctx: int = 4096, n_threads: int = None):
+        self.num_pred_tokens = num_pred_tokens
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+
+    def __call__(self, input_ids, /, **kwargs):
+        draft = []
+        # generate() reuses the KV cache for the shared prefix, so only new tokens are evaluated
+        gen = self.llm.generate(input_ids.tolist(), temp=0.0, top_k=1, reset=True)
+        try:
+            for token in gen:
+                if token == self.llm.token_eos():
+                    break
+                draft.append(token)
+                if len(draft) >= self.num_pred_tokens:
+                    break
+        finally:
+            gen.close()
+        return np.array(draft, dtype=np.intc)
+
+
+class AcceptanceTracker(LlamaDraftModel):
+    """
+    Wraps a draft model and measures how many drafted tokens the target accepts.
+
+    Llama.generate() calls the draft model again once the previous draft is
+    verified, with the context grown by (accepted drafts + 1 sampled token), so
+    acceptance is derived from the difference between consecutive calls. The
+    last draft of each completion is unresolved and not counted.
+    """
+
+    def __init__(self, inner: LlamaDraftModel, route: str):
+        self.inner = inner
+        self.route = route
+        self.drafted = 0
+        self.accepted = 0
+        self._pending = None  # (context length, tokens drafted)
+
+    def start(self) -> None:
+        """Call before each completion so rounds are not matched across requests."""
+        self._pending = None
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    def __call__(self, input_ids, /, **kwargs):
+        n = len(input_ids)
+        if self._pending is not None:
+            prev_len, drafted = self._pending
+            if n > prev_len:
+                accepted = min(drafted, n - prev_len - 1)
+                self.drafted += drafted
+                self.accepted += accepted
+                METRICS.inc("llm_draft_tokens_total", drafted, route=self.route)
+                METRICS.inc("llm_draft_accepted_tokens_total", accepted, route=self.route)
+                METRICS.set_gauge("llm_draft_acceptance_rate", self.acceptance_rate, route=self.route)
+        draft = self.inner(input_ids, **kwargs)
+        self._pending = (n, len(draft))
+        return draft
+
+
+def build_draft_model(settings: dict, route: str, n_threads: int = None):
+    """
+    Return an AcceptanceTracker for the configured draft source, or None when disabled.
+    """
+    settings = {**DEFAULT_SPECULATIVE, **(settings or {})}
+    if not settings["ENABLED"]:
+        return None
+
+    if settings["MODE"] == "draft_model":
+        if not settings["DRAFT_MODEL_PATH"]:
+            raise ValueError("SPECULATIVE_DECODING.MODE 'draft_model' needs DRAFT_MODEL_PATH")
+        inner = GGUFDraftModel(settings["DRAFT_MODEL_PATH"], num_pred_tokens=settings["NUM_PRED_TOKENS"],
+                               n_ctx=settings["N_CTX"], n_threads=n_threads)
+    elif settings["MODE"] == "prompt_lookup":
+        inner = LlamaPromptLookupDecoding(max_ngram_size=settings["MAX_NGRAM_SIZE"],
+                                          num_pred_tokens=settings["NUM_PRED_TOKENS"])
+    else:
+        raise ValueError(f"Unknown SPECULATIVE_DECODING.MODE: {settings['MODE']}")
+    return AcceptanceTracker(inner, route)
@@ -0,0 +1,272 @@
+"""
+In-process metrics shared by the CodingBot app and email_agent.
+
+Counters, gauges and timers live in one thread-safe registry (METRICS) and can be
+exported as a Prometheus text-format file plus a JSON run summary:
+
+    with METRICS.timer("pipeline_stage", stage="sheet_download"):
+        ...
+    METRICS.inc("google_api_calls_total", api="gmail", method="messages.send")
+    METRICS.write_run_artifacts(Path("excel_leads_daily_list/report_08022026"))
+
+METRICS is process-wide: campaigns running side by side record into it at
+the same time, so one run's figures are METRICS.since(checkpoint) rather
+than a reset().
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._span_listeners = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new run: drop all recorded values."""
+        with self._lock:
+            self._counters = {}
+            self._gauges = {}
+            self._timers = {}  # key -> [count, sum, max]
+            self.started_at = datetime.now().astimezone()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = float(value)
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            stats = self._timers.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter()
+            self.observe(name, t1 - t0, **labels)
+            for listener in self._span_listeners:
+                listener(name, labels, t0, t1)
+
+    def add_span_listener(self, listener) -> None:
+        """Call listener(name, labels, start, end) (perf_counter seconds) after every timer() block."""
+        self._span_listeners = self._span_listeners + [listener]
+
+    def remove_span_listener(self, listener) -> None:
+        self._span_listeners = [l for l in self._span_listeners if l is not listener]
+
+    def export_state(self) -> dict:
+        """Raw recorded values, e.g. to ship from a worker process and merge() in the parent."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timers": {k: list(v) for k, v in self._timers.items()},
+            }
+
+    def merge(self, state: dict) -> None:
+        """Add counters/timers from export_state(); gauges take the incoming value."""
+        with self._lock:
+            for key, value in state["counters"].items():
+                self._counters[key] = self._counters.get(key, 0.0) + value
+            self._gauges.update(state["gauges"])
+            for key, (count, total, mx) in state["timers"].items():
+                stats = self._timers.setdefault(key, [0, 0.0, 0.0])
+                stats[0] += count
+                stats[1] += total
+                stats[2] = max(stats[2], mx)
+
+    def checkpoint(self) -> dict:
+        """Current values, to measure one run with since() without resetting what concurrent runs record."""
+        state = self.export_state()
+        state["at"] = datetime.now().astimezone()
+        return state
+
+    def since(self, checkpoint: dict) -> "Metrics":
+        """
+        A registry with what was recorded after checkpoint(): counters and
+        timer counts/sums as differences, gauges and timer maxima as they are now.
+        """
+        state = self.export_state()
+        run = Metrics()
+        run.started_at = checkpoint["at"]
+        for key, value in state["counters"].items():
+            base = checkpoint["counters"].get(key, 0.0)
+            if value > base:
+                run._counters[key] = value - base
+        run._gauges = state["gauges"]
+        for key, (count, total, mx) in state["timers"].items():
+            base_count, base_total, _ = checkpoint["timers"].get(key, (0, 0.0, 0.0))
+            if count > base_count:
+                run._timers[key] = [count - base_count, total - base_total, mx]
+        return run
+
+    def cache(self, cache: str, hit: bool) -> None:
+        self.inc("cache_hits_total" if hit else "cache_misses_total", cache=cache)
+
+    def counter_total(self, name: str, **labels) -> float:
+        """Sum of a counter over every label set that includes `labels`."""
+        want = set(labels.items())
+        with self._lock:
+            return sum(v for (n, lbl), v in self._counters.items() if n == name and want <= set(lbl))
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timers = {k: list(v) for k, v in self._timers.items()}
+
+        def grouped(items):
+            out = {}
+            for (name, labels), value in sorted(items.items()):
+                out.setdefault(name, []).append((labels, value))
+            return out
+
+        for name, series in grouped(counters).items():
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{_fmt_labels(lbl)} {value:g}" for lbl, value in series]
+        for name, series in grouped(gauges).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines += [f"{name}{_fmt_labels(lbl)} {value:g}" for lbl, value in series]
+        for name, series in grouped(timers).items():
+            lines.append(f"# TYPE {name}_seconds summary")
+            for lbl, (count, total, _) in series:
+                lines.append(f"{name}_seconds_sum{_fmt_labels(lbl)} {total:.6f}")
+                lines.append(f"{name}_seconds_count{_fmt_labels(lbl)} {count}")
+            lines.append(f"# TYPE {name}_seconds_max gauge")
+            lines += [f"{name}_seconds_max{_fmt_labels(lbl)} {mx:.6f}" for lbl, (_, _, mx) in series]
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """JSON-friendly run summary, with derived LLM throughput figures."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timers = {k: list(v) for k, v in self._timers.items()}
+
+        def label_str(labels):
+            return ",".join(f"{k}={v}" for k, v in labels) or "all"
+
+        out = {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "timers": {},
+            "counters": {},
+            "gauges": {},
+        }
+        for (name, labels), (count, total, mx) in sorted(timers.items()):
+            out["timers"].setdefault(name, {})[label_str(labels)] = {
+                "count": count, "total_s": round(total, 4),
+                "mean_s": round(total / count, 4) if count else 0.0, "max_s": round(mx, 4),
+            }
+        for (name, labels), value in sorted(counters.items()):
+            out["counters"].setdefault(name, {})[label_str(labels)] = value
+        for (name, labels), value in sorted(gauges.items()):
+            out["gauges"].setdefault(name, {})[label_str(labels)] = value
+
+        llm = {}
+        for route in sorted({dict(lbl).get("route") for (n, lbl) in counters if n == "llm_requests_total"}):
+            def total(metric):
+                return sum(v for (n, lbl), v in counters.items() if n == metric and dict(lbl).get("route") == route)
+            prefill_s, decode_s = total("llm_prefill_seconds_total"), total("llm_decode_seconds_total")
+            requests = total("llm_requests_total")
+            llm[route] = {
+                "requests": requests,
+                "prompt_tokens": total("llm_prompt_tokens_total"),
+                "generated_tokens": total("llm_generated_tokens_total"),
+                "mean_ttft_s": round(prefill_s / requests, 4) if requests else 0.0,
+                "prefill_tokens_per_s": round(total("llm_prompt_tokens_total") / prefill_s, 2) if prefill_s else 0.0,
+                "decode_tokens_per_s": round(total("llm_decode_tokens_total") / decode_s, 2) if decode_s else 0.0,
+            }
+            drafted = total("llm_draft_tokens_total")
+            if drafted:
+                llm[route]["draft_tokens"] = drafted
+                llm[route]["draft_acceptance_rate"] = round(total("llm_draft_accepted_tokens_total") / drafted, 4)
+        out["llm"] = llm
+        return out
+
+    def write_run_artifacts(self, path_stem: Path) -> tuple:
+        """
+        Write <stem>.prom (Prometheus text format) and <stem>.metrics.json next to a report.
+        """
+        path_stem = Path(path_stem)
+        path_stem.parent.mkdir(parents=True, exist_ok=True)
+        prom_path = path_stem.with_name(path_stem.name + ".prom")
+        json_path = path_stem.with_name(path_stem.name + ".metrics.json")
+        prom_path.write_text(self.to_prometheus(), encoding="utf-8")
+        json_path.write_text(json.dumps(self.summary(), indent=2), encoding="utf-8")
+        return prom_path, json_path
+
+
+METRICS = Metrics()
+
+
+def count_prompt_tokens(llm, messages: list) -> int:
+    """Approximate prompt length: tokens of every message body (template tokens excluded)."""
+    return sum(len(llm.tokenize(m["content"].encode("utf-8"), add_bos=False)) for m in messages)
+
+
+def instrument_completion(stream, route: str, prompt_tokens: int = 0, metrics: Metrics = METRICS):
+    """
+    Wrap a create_chat_completion(stream=True) iterator and record time to first
+    token, prefill/decode throughput and token counts under the given route.
+    Each streamed content delta is counted as one generated token.
+    """
+    t0 = time.perf_counter()
+    t_first = None
+    generated = 0
+    try:
+        for chunk in stream:
+            delta = chunk["choices"][0].get("delta", {})
+            if delta.get("content"):
+                if t_first is None:
+                    t_first = time.perf_counter()
+                generated += 1
+            yield chunk
+    finally:
+        t_end = time.perf_counter()
+        metrics.inc("llm_requests_total", route=route)
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens, route=route)
+        metrics.inc("llm_generated_tokens_total", generated, route=route)
+        metrics.observe("llm_generation", t_end - t0, route=route)
+        if t_first is not None:
+            ttft = t_first - t0
+            decode_s = t_end - t_first
+            metrics.observe("llm_time_to_first_token", ttft, route=route)
+            metrics.inc("llm_prefill_seconds_total", ttft, route=route)
+            metrics.inc("llm_decode_seconds_total", decode_s, route=route)
+            metrics.inc("llm_decode_tokens_total", generated - 1, route=route)
+            if ttft > 0 and prompt_tokens:
+                metrics.set_gauge("llm_prefill_tokens_per_second", prompt_tokens / ttft, route=route)
+            if decode_s > 0 and generated > 1:
+                metrics.set_gauge("llm_decode_tokens_per_second", (generated - 1) / decode_s, route=route)